@@ -0,0 +1,236 @@
+"""Graph analytics: degree distribution, components, PageRank and betweenness.
+
+Metrics are computed with NumPy/SciPy sparse matrices built from the edge
+list of the graph index (see graph_index), copied out of its ``array``
+columns in a few memcpys, so no ORM objects are involved.  Results are
+cached per user and version number; any edit writes a new version, so a
+cached result is served until the graph changes.
+
+Betweenness is estimated from a sample of ``ANALYTICS_BETWEENNESS_SAMPLES``
+source entities (exact when the graph has fewer entities), with Brandes'
+algorithm run level by level for a batch of sources at once as sparse
+matrix products.  Sampling stops at ``ANALYTICS_TIMEOUT_SECONDS``; the
+estimate then rests on the sources done so far.
+"""
+
+import os
+import time
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+from scipy import sparse
+from scipy.sparse.csgraph import connected_components
+from sqlalchemy.orm import Session
+
+from cache import LRUCache
+from graph_index import UserGraph
+from graph_index import index as graph_index
+from graph_queries import load_rows
+from models import Entity
+
+ANALYTICS_CACHE_SIZE = int(os.getenv("ANALYTICS_CACHE_SIZE", "256"))
+ANALYTICS_BETWEENNESS_SAMPLES = int(os.getenv("ANALYTICS_BETWEENNESS_SAMPLES", "64"))
+ANALYTICS_TIMEOUT_SECONDS = float(os.getenv("ANALYTICS_TIMEOUT_SECONDS", "10"))
+
+PAGERANK_DAMPING = 0.85
+PAGERANK_TOLERANCE = 1e-6
+PAGERANK_MAX_ITERATIONS = 100
+
+# Cells of each (entities x sources) matrix of a betweenness batch
+BETWEENNESS_BATCH_CELLS = 1_000_000
+MAX_BETWEENNESS_BATCH = 64
+
+_cache = LRUCache(ANALYTICS_CACHE_SIZE)
+
+
+def edge_list(graph: UserGraph) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """Live entity IDs and the (source, target) positions of live relations among them."""
+    with graph.lock:
+        node_ids = np.frombuffer(graph.node_ids.tobytes(), dtype=np.int64)
+        node_alive = np.frombuffer(bytes(graph.node_alive), dtype=np.uint8).astype(bool)
+        sources = np.frombuffer(graph.rel_src.tobytes(), dtype=np.int64)
+        targets = np.frombuffer(graph.rel_tgt.tobytes(), dtype=np.int64)
+        rel_alive = np.frombuffer(bytes(graph.rel_alive), dtype=np.uint8).astype(bool)
+    # Renumber live entities 0..n-1
+    position = np.cumsum(node_alive) - 1
+    return node_ids[node_alive], position[sources[rel_alive]], position[targets[rel_alive]]
+
+
+def pagerank(
+    count: int,
+    sources: np.ndarray,
+    targets: np.ndarray,
+    damping: float = PAGERANK_DAMPING,
+    tolerance: float = PAGERANK_TOLERANCE,
+    max_iterations: int = PAGERANK_MAX_ITERATIONS,
+) -> Tuple[np.ndarray, int]:
+    """PageRank by power iteration; parallel relations add weight, dangling entities link to all."""
+    out_degree = np.bincount(sources, minlength=count).astype(float)
+    transition = sparse.csr_matrix(
+        (1.0 / out_degree[sources], (targets, sources)), shape=(count, count)
+    )
+    dangling = out_degree == 0
+    rank = np.full(count, 1.0 / count)
+    for iteration in range(1, max_iterations + 1):
+        updated = damping * (transition @ rank + rank[dangling].sum() / count) + (1 - damping) / count
+        error = np.abs(updated - rank).sum()
+        rank = updated
+        if error < tolerance:  # L1 change of the whole vector
+            break
+    return rank, iteration
+
+
+def betweenness(
+    count: int,
+    sources: np.ndarray,
+    targets: np.ndarray,
+    samples: int = ANALYTICS_BETWEENNESS_SAMPLES,
+    deadline: Optional[float] = None,
+    seed: int = 0,
+) -> Tuple[Optional[np.ndarray], int]:
+    """Normalized betweenness of the undirected graph, estimated from sampled sources.
+
+    Returns the scores (None if not one batch finished in time) and the
+    number of sources they rest on.
+    """
+    deadline = deadline if deadline is not None else time.monotonic() + ANALYTICS_TIMEOUT_SECONDS
+    loops = sources == targets
+    ends = np.concatenate([sources[~loops], targets[~loops]]), np.concatenate([targets[~loops], sources[~loops]])
+    adjacency = sparse.csr_matrix((np.ones(len(ends[0])), ends), shape=(count, count))
+    adjacency.data[:] = 1.0  # parallel relations are one edge
+
+    if samples >= count:
+        pivots = np.arange(count)
+    else:
+        pivots = np.random.default_rng(seed).choice(count, samples, replace=False)
+    batch_size = max(1, min(MAX_BETWEENNESS_BATCH, BETWEENNESS_BATCH_CELLS // max(count, 1)))
+    scores = np.zeros(count)
+    used = 0
+    for start in range(0, len(pivots), batch_size):
+        batch = _brandes_batch(adjacency, pivots[start:start + batch_size], deadline)
+        if batch is None:
+            break
+        scores += batch
+        used += len(pivots[start:start + batch_size])
+    if used == 0:
+        return None, 0
+    if count > 2:
+        # Each pair is counted from both ends; scale the sample up to all sources
+        scores *= count / used / ((count - 1) * (count - 2))
+    else:
+        scores[:] = 0.0
+    return scores, used
+
+
+def _brandes_batch(adjacency: sparse.csr_matrix, pivots: np.ndarray, deadline: float) -> Optional[np.ndarray]:
+    """Dependency scores from a batch of sources (one column each), or None past the deadline."""
+    count, columns = adjacency.shape[0], np.arange(len(pivots))
+    sigma = np.zeros((count, len(pivots)))
+    sigma[pivots, columns] = 1.0
+    depth = np.full((count, len(pivots)), -1, dtype=np.int32)
+    depth[pivots, columns] = 0
+
+    # Forward: shortest-path counts, one BFS level per product
+    frontier = sigma.copy()
+    level = 0
+    while True:
+        if time.monotonic() > deadline:
+            return None
+        reached = adjacency @ frontier
+        reached[depth >= 0] = 0.0
+        new = reached > 0
+        if not new.any():
+            break
+        level += 1
+        depth[new] = level
+        sigma += reached
+        frontier = reached
+
+    # Backward: accumulate dependencies from the deepest level up
+    delta = np.zeros_like(sigma)
+    for current in range(level, 0, -1):
+        if time.monotonic() > deadline:
+            return None
+        at_level = depth == current
+        weight = np.where(at_level, (1.0 + delta) / np.where(at_level, sigma, 1.0), 0.0)
+        delta += np.where(depth == current - 1, sigma * (adjacency @ weight), 0.0)
+    delta[pivots, columns] = 0.0
+    return delta.sum(axis=1)
+
+
+def _top(node_ids: np.ndarray, scores: np.ndarray, top: int) -> List[Tuple[int, float]]:
+    """Highest scores first, ties by entity ID."""
+    order = np.lexsort((node_ids, -scores))[:top]
+    return [(int(node_ids[i]), float(scores[i])) for i in order]
+
+
+def compute_analytics(graph: UserGraph, top: int = 10) -> Dict[str, Any]:
+    """Metrics of a graph, with entities given as (ID, score) pairs."""
+    node_ids, sources, targets = edge_list(graph)
+    count = len(node_ids)
+    result: Dict[str, Any] = {"entity_count": count, "relation_count": int(len(sources))}
+    if count == 0:
+        result.update(
+            degree={"distribution": [], "mean": 0.0, "max": 0, "top": []},
+            components={"count": 0, "largest": [], "isolated": 0},
+            pagerank={"top": [], "iterations": 0},
+            betweenness={"top": [], "samples": 0, "exact": True},
+        )
+        return result
+
+    degree = np.bincount(sources, minlength=count) + np.bincount(targets, minlength=count)
+    values, frequencies = np.unique(degree, return_counts=True)
+    result["degree"] = {
+        "distribution": [{"degree": int(v), "count": int(f)} for v, f in zip(values, frequencies)],
+        "mean": float(degree.mean()),
+        "max": int(degree.max()),
+        "top": _top(node_ids, degree.astype(float), top),
+    }
+
+    adjacency = sparse.csr_matrix((np.ones(len(sources)), (sources, targets)), shape=(count, count))
+    component_count, labels = connected_components(adjacency, directed=True, connection="weak")
+    sizes = np.sort(np.bincount(labels))[::-1]
+    result["components"] = {
+        "count": int(component_count),
+        "largest": [int(size) for size in sizes[:top]],
+        "isolated": int((degree == 0).sum()),
+    }
+
+    rank, iterations = pagerank(count, sources, targets)
+    result["pagerank"] = {"top": _top(node_ids, rank, top), "iterations": iterations}
+
+    scores, used = betweenness(count, sources, targets)
+    result["betweenness"] = {
+        "top": _top(node_ids, scores, top) if scores is not None else [],
+        "samples": used,
+        "exact": used == count,
+    }
+    return result
+
+
+def _with_names(database: Session, user_id: int, result: Dict[str, Any]) -> Dict[str, Any]:
+    """Replace (ID, score) pairs with entity ID, name and score."""
+    sections = [result[name]["top"] for name in ("degree", "pagerank", "betweenness")]
+    names = {
+        entity_id: entity.name
+        for entity_id, entity in load_rows(
+            database, Entity, user_id, sorted({entity_id for pairs in sections for entity_id, _ in pairs})
+        ).items()
+    }
+    for name in ("degree", "pagerank", "betweenness"):
+        result[name]["top"] = [
+            {"id": entity_id, "name": names.get(entity_id, ""), "score": score}
+            for entity_id, score in result[name]["top"]
+        ]
+    return result
+
+
+def get_analytics(database: Session, user_id: int, version_number: int, top: int = 10) -> Dict[str, Any]:
+    """Analytics of a user's graph at a version, computed once per version."""
+
+    def compute() -> Dict[str, Any]:
+        result = compute_analytics(graph_index.get(database, user_id), top)
+        return {"version_number": version_number, **_with_names(database, user_id, result)}
+
+    return _cache.get_or_compute((user_id, version_number, top), compute)
+
@@ -1,39 +1,112 @@
-from fastapi import APIRouter, Depends, HTTPException, Query
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, Response
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import StreamingResponse
+from sqlalchemy import delete
 from sqlalchemy.orm import Session
-from datetime import datetime
+from typing import Optional
+import json
+import logging
 import models
 import schemas
 from db import get_db
-from version_service import VersionService
+from version_service import VersionService, entity_record, relation_record, relation_type_record
+from version_pipeline import pipeline as version_pipeline
+from graph_service import current_version_number, etag_matches, graph_etag, load_graph
+from graph_index import index as graph_index
+from suggest_index import index as suggest_index
+from type_registry import cascade_delete_entity_type, recount_usage, rename_type
+from analytics_service import get_analytics
+from search_service import KINDS as SEARCH_KINDS, search
+from graph_queries import find_paths, neighborhood, neighborhood_response, parse_types, paths_response
+from change_feed import event_stream, feed as change_feed
+from batch_service import BatchError, apply_batch
+from export_service import MEDIA_TYPES, negotiate_encoding, stream_export, stream_rows
+from import_service import BulkImporter, ImportFormatError, JsonDocumentParser, NdjsonParser, record_import
 from auth import get_current_user
 
 router = APIRouter()
+logger = logging.getLogger(__name__)
+
+# Largest page the entity/relation listings return
+MAX_PAGE_SIZE = 1000
+
+# Bounds of neighbourhood queries
+MAX_NEIGHBORHOOD_DEPTH = 6
+MAX_NEIGHBORHOOD_NODES = 5000
+
+# Most suggestions per typeahead request
+MAX_SUGGESTIONS = 50
+
+# Bounds of search pages
+MAX_SEARCH_PAGE_SIZE = 100
+MAX_SEARCH_OFFSET = 1000
+
+# Bounds of path queries
+MAX_PATH_LENGTH = 12
+MAX_PATHS = 20
 
 # Helper functions
 
 def ensure_entity_type(database: Session, type_name: str, user_id: int):
+    """Register an entity type for the user; returns the new record if one was created."""
     if not type_name:
-        return
+        return None
     exists = database.query(models.EntityType).filter(
         models.EntityType.name == type_name,
         models.EntityType.user_id == user_id
     ).first()
     if not exists:
-        database.add(models.EntityType(name=type_name, user_id=user_id))
+        created = models.EntityType(name=type_name, user_id=user_id)
+        database.add(created)
+        return created
+    return None
 
 def ensure_relation_type(database: Session, type_name: str, user_id: int):
+    """Register a relation type for the user; returns the new record if one was created."""
     if not type_name:
-        return
+        return None
     exists = database.query(models.RelationType).filter(
         models.RelationType.name == type_name,
         models.RelationType.user_id == user_id
     ).first()
     if not exists:
-        database.add(models.RelationType(name=type_name, user_id=user_id))
+        created = models.RelationType(name=type_name, user_id=user_id)
+        database.add(created)
+        return created
+    return None
+
+def build_changes(section: str, op: str, records: list, changes: dict | None = None) -> dict:
+    """Add records to a version delta (see version_service for the delta format)."""
+    changes = changes if changes is not None else {}
+    if records:
+        changes.setdefault(section, {}).setdefault(op, []).extend(records)
+    return changes
+
+def record_change(database: Session, current_user: models.User, description: str, changes: dict):
+    """Queue an automatic version for a committed edit (written in the background)."""
+    version_pipeline.submit(current_user.id, description, changes)
+    # The edit is committed: an index that cannot follow it is reloaded on next use
+    for index in (graph_index, suggest_index):
+        try:
+            index.apply_changes(current_user.id, changes)
+        except Exception:
+            logger.exception("Failed to apply changes of user %s to an in-memory index", current_user.id)
+            index.invalidate(current_user.id)
+    if not version_pipeline.has_history(database, current_user.id):
+        version_pipeline.flush(database, current_user.id)
+
+def type_changes(changes: dict, entity_type=None, relation_type=None) -> dict:
+    """Add type records created by ensure_*_type to a version delta."""
+    if entity_type is not None:
+        build_changes("entity_types", "added", [{"name": entity_type.name}], changes)
+    if relation_type is not None:
+        build_changes("relation_types", "added", [relation_type_record(relation_type)], changes)
+    return changes
 
 # Type management (before entity/relation/{id} endpoints to avoid path conflicts)
 @router.get("/entities/types")
 def list_entity_types(
+    with_counts: bool = Query(False),
     database: Session = Depends(get_db),
     current_user: models.User = Depends(get_current_user)
 ):
@@ -44,10 +117,14 @@ def list_entity_types(
         derived = {e.type for e in database.query(models.Entity).filter(models.Entity.user_id == current_user.id).all()}
         for type_name in derived:
             ensure_entity_type(database, type_name, current_user.id)
+        database.flush()
+        recount_usage(database, current_user.id, (models.EntityType,))
         database.commit()
         types = database.query(models.EntityType).filter(
             models.EntityType.user_id == current_user.id
         ).order_by(models.EntityType.name).all()
+    if with_counts:
+        return [{"name": t.name, "count": t.usage_count} for t in types]
     return [t.name for t in types]
 
 @router.post("/entities/types")
@@ -67,6 +144,8 @@ def create_entity_type(
         raise HTTPException(status_code=409, detail="Type already exists")
     database.add(models.EntityType(name=name, user_id=current_user.id))
     database.commit()
+    changes = build_changes("entity_types", "added", [{"name": name}])
+    record_change(database, current_user, f"Added entity type: {name}", changes)
     return {"ok": True, "name": name}
 
 @router.delete("/entities/types/{type_name}/only")
@@ -81,14 +160,20 @@ def delete_entity_type_only(
     ).count()
     if in_use > 0:
         raise HTTPException(status_code=409, detail="Type is in use")
-    deleted = database.query(models.EntityType).filter(models.EntityType.name == type_name).delete(synchronize_session=False)
+    deleted = database.query(models.EntityType).filter(
+        models.EntityType.name == type_name,
+        models.EntityType.user_id == current_user.id
+    ).delete(synchronize_session=False)
     if deleted == 0:
         raise HTTPException(status_code=404, detail=f"Type '{type_name}' not found")
     database.commit()
+    changes = build_changes("entity_types", "removed", [type_name])
+    record_change(database, current_user, f"Deleted entity type: {type_name}", changes)
     return {"ok": True}
 
 @router.get("/relations/types")
 def list_relation_types(
+    with_counts: bool = Query(False),
     database: Session = Depends(get_db),
     current_user: models.User = Depends(get_current_user)
 ):
@@ -102,11 +187,15 @@ def list_relation_types(
         derived = {r.relation_type for r in database.query(models.Relation).filter(models.Relation.user_id == current_user.id).all()}
         for type_name in derived:
             ensure_relation_type(database, type_name, current_user.id)
+        database.flush()
+        recount_usage(database, current_user.id, (models.RelationType,))
         database.commit()
         types = database.query(models.RelationType).filter(
             models.RelationType.user_id == current_user.id
         ).order_by(models.RelationType.name).all()
     
+    if with_counts:
+        return [{"name": t.name, "count": t.usage_count} for t in types]
     return [t.name for t in types]
 
 @router.post("/relations/types")
@@ -124,8 +213,11 @@ def create_relation_type(
     ).first()
     if exists:
         raise HTTPException(status_code=409, detail="Type already exists")
-    database.add(models.RelationType(name=name, user_id=current_user.id))
+    relation_type = models.RelationType(name=name, user_id=current_user.id)
+    database.add(relation_type)
     database.commit()
+    changes = build_changes("relation_types", "added", [relation_type_record(relation_type)])
+    record_change(database, current_user, f"Added relation type: {name}", changes)
     return {"ok": True, "name": name}
 
 @router.delete("/relations/types/{type_name}/only")
@@ -147,8 +239,25 @@ def delete_relation_type_only(
     if deleted == 0:
         raise HTTPException(status_code=404, detail=f"Type '{type_name}' not found")
     database.commit()
+    changes = build_changes("relation_types", "removed", [type_name])
+    record_change(database, current_user, f"Deleted relation type: {type_name}", changes)
     return {"ok": True}
 
+def list_page(database: Session, model, user_id: int, response: Response, after, limit: int, skip: int = 0):
+    """One page of a user's rows ordered by ID, starting after the ``after`` cursor.
+
+    When more rows follow, the ID to pass as the next ``after`` is returned in
+    the X-Next-Cursor header, so the body stays a plain list.
+    """
+    query = database.query(model).filter(model.user_id == user_id)
+    if after is not None:
+        query = query.filter(model.id > after)
+    rows = query.order_by(model.id).offset(skip).limit(limit + 1).all()
+    if len(rows) > limit:
+        rows = rows[:limit]
+        response.headers["X-Next-Cursor"] = str(rows[-1].id)
+    return rows
+
 # Entity CRUD
 @router.post("/entities/", response_model=schemas.Entity)
 def create_entity(
@@ -156,7 +265,7 @@ def create_entity(
     database: Session = Depends(get_db),
     current_user: models.User = Depends(get_current_user)
 ):
-    ensure_entity_type(database, entity.type, current_user.id)
+    new_type = ensure_entity_type(database, entity.type, current_user.id)
     db_entity = models.Entity(
         **entity.model_dump(),
         user_id=current_user.id
@@ -165,17 +274,35 @@ def create_entity(
     database.commit()
     database.refresh(db_entity)
     # Auto-create version
-    VersionService.create_version(database, f"Added entity: {entity.name}", "system", current_user)
+    changes = build_changes("entities", "added", [entity_record(db_entity)])
+    type_changes(changes, entity_type=new_type)
+    record_change(database, current_user, f"Added entity: {entity.name}", changes)
     return db_entity
 
 @router.get("/entities/", response_model=list[schemas.Entity])
 def read_entities(
-    skip: int = 0,
-    limit: int = 100,
+    response: Response,
+    after: Optional[int] = Query(default=None, description="Cursor: return entities with a larger ID"),
+    limit: int = Query(default=100, ge=1, le=MAX_PAGE_SIZE),
+    stream_all: bool = Query(default=False, alias="all", description="Stream every entity instead of one page"),
+    skip: int = Query(default=0, ge=0, description="Deprecated; use after"),
+    database: Session = Depends(get_db),
+    current_user: models.User = Depends(get_current_user)
+):
+    """List entities by ID, one keyset page at a time (see list_page)."""
+    if stream_all:
+        return StreamingResponse(stream_rows(current_user.id, "entities"), media_type="application/json")
+    return list_page(database, models.Entity, current_user.id, response, after, limit, skip)
+
+@router.get("/entities/suggest", response_model=list[schemas.EntitySuggestion])
+def suggest_entities(
+    prefix: str = Query(..., min_length=1, max_length=200),
+    limit: int = Query(default=10, ge=1, le=MAX_SUGGESTIONS),
     database: Session = Depends(get_db),
     current_user: models.User = Depends(get_current_user)
 ):
-    return database.query(models.Entity).filter(models.Entity.user_id == current_user.id).offset(skip).limit(limit).all()
+    """Entities with a word of their name starting with a prefix, for pickers (see suggest_index)."""
+    return suggest_index.get(database, current_user.id).suggest(prefix, limit)
 
 @router.get("/entities/{entity_id}", response_model=schemas.Entity)
 def read_entity(
@@ -190,6 +317,59 @@ def read_entity(
         raise HTTPException(status_code=404, detail="Entity not found")
     return entity
 
+@router.get("/entities/{entity_id}/neighborhood", response_model=schemas.Neighborhood)
+def read_neighborhood(
+    entity_id: int,
+    depth: int = Query(default=1, ge=1, le=MAX_NEIGHBORHOOD_DEPTH),
+    types: Optional[list[str]] = Query(default=None, description="Relation types to follow (repeated or comma-separated)"),
+    direction: str = Query(default="both", pattern="^(out|in|both)$"),
+    limit: int = Query(default=500, ge=1, le=MAX_NEIGHBORHOOD_NODES, description="Maximum number of entities"),
+    database: Session = Depends(get_db),
+    current_user: models.User = Depends(get_current_user)
+):
+    """Entities within ``depth`` hops of an entity and the relations among them (see graph_queries)."""
+    graph = graph_index.get(database, current_user.id)
+    with graph.lock:
+        center = graph.index_of(entity_id)
+        if center is None:
+            raise HTTPException(status_code=404, detail="Entity not found")
+        result = neighborhood(graph, center, depth, direction, graph.type_ids(parse_types(types)), limit)
+    return {"center_id": entity_id, "depth": depth, **neighborhood_response(database, current_user.id, result)}
+
+@router.get("/search", response_model=schemas.SearchResults)
+def search_graph(
+    q: str = Query(..., min_length=1, max_length=200),
+    kind: str = Query(default="all", pattern="^(all|entity|relation)$"),
+    fuzzy: bool = Query(default=True, description="Also return rows resembling the query"),
+    limit: int = Query(default=20, ge=1, le=MAX_SEARCH_PAGE_SIZE),
+    offset: int = Query(default=0, ge=0, le=MAX_SEARCH_OFFSET),
+    database: Session = Depends(get_db),
+    current_user: models.User = Depends(get_current_user)
+):
+    """Entities (name, description) and relations (description) matching a query (see search_service)."""
+    kinds = SEARCH_KINDS if kind == "all" else (kind,)
+    return search(database, current_user.id, q, kinds, fuzzy, limit, offset)
+
+@router.get("/paths", response_model=schemas.PathResult)
+def read_paths(
+    source_id: int = Query(alias="from"),
+    target_id: int = Query(alias="to"),
+    max_len: int = Query(default=6, ge=0, le=MAX_PATH_LENGTH, description="Maximum number of relations on a path"),
+    relation_types: Optional[list[str]] = Query(default=None, description="Relation types to follow (repeated or comma-separated)"),
+    direction: str = Query(default="both", pattern="^(out|in|both)$"),
+    k: int = Query(default=1, ge=1, le=MAX_PATHS, description="Number of shortest simple paths"),
+    database: Session = Depends(get_db),
+    current_user: models.User = Depends(get_current_user)
+):
+    """Shortest paths between two entities (see graph_queries)."""
+    graph = graph_index.get(database, current_user.id)
+    with graph.lock:
+        source, target = graph.index_of(source_id), graph.index_of(target_id)
+        if source is None or target is None:
+            raise HTTPException(status_code=404, detail="Entity not found")
+        result = find_paths(graph, source, target, max_len, k, direction, graph.type_ids(parse_types(relation_types)))
+    return {"source_id": source_id, "target_id": target_id, **paths_response(database, current_user.id, result)}
+
 @router.put("/entities/{entity_id}", response_model=schemas.Entity)
 def update_entity(
     entity_id: int,
@@ -202,13 +382,15 @@ def update_entity(
     ).first()
     if db_entity is None:
         raise HTTPException(status_code=404, detail="Entity not found")
-    ensure_entity_type(database, entity.type, current_user.id)
+    new_type = ensure_entity_type(database, entity.type, current_user.id)
     for key, value in entity.model_dump().items():
         setattr(db_entity, key, value)
     database.commit()
     database.refresh(db_entity)
     # Auto-create version
-    VersionService.create_version(database, f"Updated entity: {entity.name}", "system", current_user)
+    changes = build_changes("entities", "changed", [entity_record(db_entity)])
+    type_changes(changes, entity_type=new_type)
+    record_change(database, current_user, f"Updated entity: {entity.name}", changes)
     return db_entity
 
 @router.delete("/entities/{entity_id}")
@@ -222,10 +404,14 @@ def delete_entity(
     ).first()
     if entity is None:
         raise HTTPException(status_code=404, detail="Entity not found")
+    # Relations attached to the entity are removed with it (ORM cascade)
+    relation_ids = sorted({r.id for r in entity.outgoing_relations + entity.incoming_relations})
     database.delete(entity)
     database.commit()
     # Auto-create version
-    VersionService.create_version(database, f"Deleted entity: {entity.name}", "system", current_user)
+    changes = build_changes("entities", "removed", [entity_id])
+    build_changes("relations", "removed", relation_ids, changes)
+    record_change(database, current_user, f"Deleted entity: {entity.name}", changes)
     return {"ok": True}
 
 # Relation CRUD
@@ -235,7 +421,7 @@ def create_relation(
     database: Session = Depends(get_db),
     current_user: models.User = Depends(get_current_user)
 ):
-    ensure_relation_type(database, relation.relation_type, current_user.id)
+    new_type = ensure_relation_type(database, relation.relation_type, current_user.id)
     db_relation = models.Relation(
         **relation.model_dump(),
         user_id=current_user.id
@@ -244,17 +430,25 @@ def create_relation(
     database.commit()
     database.refresh(db_relation)
     # Auto-create version
-    VersionService.create_version(database, f"Added relation: {relation.relation_type}", "system", current_user)
+    changes = build_changes("relations", "added", [relation_record(db_relation)])
+    type_changes(changes, relation_type=new_type)
+    record_change(database, current_user, f"Added relation: {relation.relation_type}", changes)
     return db_relation
 
 @router.get("/relations/", response_model=list[schemas.Relation])
 def read_relations(
-    skip: int = 0,
-    limit: int = 100,
+    response: Response,
+    after: Optional[int] = Query(default=None, description="Cursor: return relations with a larger ID"),
+    limit: int = Query(default=100, ge=1, le=MAX_PAGE_SIZE),
+    stream_all: bool = Query(default=False, alias="all", description="Stream every relation instead of one page"),
+    skip: int = Query(default=0, ge=0, description="Deprecated; use after"),
     database: Session = Depends(get_db),
     current_user: models.User = Depends(get_current_user)
 ):
-    return database.query(models.Relation).filter(models.Relation.user_id == current_user.id).offset(skip).limit(limit).all()
+    """List relations by ID, one keyset page at a time (see list_page)."""
+    if stream_all:
+        return StreamingResponse(stream_rows(current_user.id, "relations"), media_type="application/json")
+    return list_page(database, models.Relation, current_user.id, response, after, limit, skip)
 
 @router.get("/relations/{relation_id}", response_model=schemas.Relation)
 def read_relation(
@@ -281,13 +475,15 @@ def update_relation(
     ).first()
     if db_relation is None:
         raise HTTPException(status_code=404, detail="Relation not found")
-    ensure_relation_type(database, relation.relation_type, current_user.id)
+    new_type = ensure_relation_type(database, relation.relation_type, current_user.id)
     for key, value in relation.model_dump().items():
         setattr(db_relation, key, value)
     database.commit()
     database.refresh(db_relation)
     # Auto-create version
-    VersionService.create_version(database, f"Updated relation: {relation.relation_type}", "system", current_user)
+    changes = build_changes("relations", "changed", [relation_record(db_relation)])
+    type_changes(changes, relation_type=new_type)
+    record_change(database, current_user, f"Updated relation: {relation.relation_type}", changes)
     return db_relation
 
 @router.delete("/relations/{relation_id}")
@@ -304,10 +500,132 @@ def delete_relation(
     database.delete(relation)
     database.commit()
     # Auto-create version
-    VersionService.create_version(database, f"Deleted relation: {relation.relation_type}", "system", current_user)
+    changes = build_changes("relations", "removed", [relation_id])
+    record_change(database, current_user, f"Deleted relation: {relation.relation_type}", changes)
     return {"ok": True}
 
+# Batch operations
+@router.post("/batch", response_model=schemas.BatchResponse)
+def run_batch(
+    payload: schemas.BatchRequest,
+    database: Session = Depends(get_db),
+    current_user: models.User = Depends(get_current_user)
+):
+    """Apply entity/relation operations in one transaction, recorded as one version."""
+    try:
+        result = apply_batch(database, current_user.id, payload.operations)
+        database.commit()
+    except BatchError as e:
+        database.rollback()
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        database.rollback()
+        raise HTTPException(status_code=500, detail=f"Batch failed: {str(e)}")
+
+    if result["changes"]:
+        description = payload.description or f"Batch: {len(payload.operations)} operations"
+        record_change(database, current_user, description, result.pop("changes"))
+    return result
+
 # Data management
+@router.get("/graph")
+def read_graph(
+    request: Request,
+    encoding: str = Query(default="rows", pattern="^(rows|columnar)$"),
+    database: Session = Depends(get_db),
+    current_user: models.User = Depends(get_current_user)
+):
+    """Entities, relations and types in one response (see graph_service).
+
+    Answers 304 when If-None-Match carries the ETag of the current version,
+    without reading the graph.
+    """
+    version_number = current_version_number(database, current_user.id)
+    etag = graph_etag(current_user.id, version_number, encoding)
+    headers = {"ETag": etag, "Cache-Control": "private, no-cache"}
+    if etag_matches(request.headers.get("if-none-match"), etag):
+        return Response(status_code=304, headers=headers)
+    graph = load_graph(database, current_user.id, version_number, encoding)
+    return Response(json.dumps(graph, separators=(",", ":")), media_type="application/json", headers=headers)
+
+@router.get("/analytics", response_model=schemas.Analytics)
+def read_analytics(
+    request: Request,
+    response: Response,
+    top: int = Query(default=10, ge=1, le=100, description="Entities listed per ranking"),
+    database: Session = Depends(get_db),
+    current_user: models.User = Depends(get_current_user)
+):
+    """Degree distribution, components, PageRank and betweenness (see analytics_service).
+
+    Results are cached per version; 304 when If-None-Match carries the
+    ETag of the current version.
+    """
+    version_number = current_version_number(database, current_user.id)
+    etag = f'W/"analytics-{current_user.id}-{version_number}-{top}"'
+    headers = {"ETag": etag, "Cache-Control": "private, no-cache"}
+    if etag_matches(request.headers.get("if-none-match"), etag):
+        return Response(status_code=304, headers=headers)
+    response.headers.update(headers)
+    return get_analytics(database, current_user.id, version_number, top)
+
+def changes_payload(database: Session, user_id: int, since: int) -> dict:
+    """Net changes since a version number, or a full reload signal (see read_changes)."""
+    version_number = current_version_number(database, user_id)
+    changes = {} if since == version_number else None
+    if version_number and changes is None:
+        latest = database.query(models.Version).filter(
+            models.Version.user_id == user_id,
+            models.Version.version_number == version_number
+        ).one()
+        changes = VersionService.changes_since(database, user_id, since, latest)
+    return {"since": since, "version_number": version_number, "full_reload": changes is None, "changes": changes}
+
+@router.get("/changes", response_model=schemas.ChangeSet)
+def read_changes(
+    since: int = Query(..., ge=0, description="Version number the client is at"),
+    database: Session = Depends(get_db),
+    current_user: models.User = Depends(get_current_user)
+):
+    """Entities, relations and types added, changed or removed since a version.
+
+    ``changes`` has the sections and ops of a version delta (records for
+    added/changed, keys for removed).  ``full_reload`` is set instead when
+    the ``since`` version no longer exists, e.g. after compaction.
+    """
+    return changes_payload(database, current_user.id, since)
+
+@router.get("/changes/stream")
+async def stream_changes(
+    request: Request,
+    since: Optional[int] = Query(default=None, ge=0, description="Version number the client is at"),
+    database: Session = Depends(get_db),
+    current_user: models.User = Depends(get_current_user)
+):
+    """Server-sent events with every new version of the user (see change_feed).
+
+    With ``since`` (or a Last-Event-ID header after a reconnect) the first
+    event is a ``changes`` event catching the client up, as GET /changes would.
+    """
+    if since is None and request.headers.get("last-event-id", "").isdigit():
+        since = int(request.headers["last-event-id"])
+    # Subscribe first so no version is missed between the catch-up and the feed
+    subscription = change_feed.subscribe(current_user.id)
+    try:
+        initial = None
+        if since is not None:
+            initial = {"type": "changes", **await run_in_threadpool(changes_payload, database, current_user.id, since)}
+        # The stream can stay open for hours; do not hold a connection for it
+        await run_in_threadpool(database.rollback)
+    except Exception:
+        change_feed.unsubscribe(subscription)
+        raise
+    return StreamingResponse(
+        event_stream(change_feed, subscription, initial),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
 @router.post("/reset")
 def reset_data(
     database: Session = Depends(get_db),
@@ -320,7 +638,8 @@ def reset_data(
         database.query(models.EntityType).filter(models.EntityType.user_id == current_user.id).delete()
         database.query(models.RelationType).filter(models.RelationType.user_id == current_user.id).delete()
         database.commit()
-        # Auto-create version
+        # Auto-create version (full snapshot, after any pending automatic versions)
+        version_pipeline.flush(database, current_user.id)
         VersionService.create_version(database, "Data reset", "system", current_user)
         return {"ok": True, "message": "All data has been reset"}
     except Exception as e:
@@ -329,35 +648,29 @@ def reset_data(
 
 @router.get("/export")
 def export_data(
-    database: Session = Depends(get_db),
+    request: Request,
+    format: str = Query(default=None, pattern="^(json|ndjson)$"),
     current_user: models.User = Depends(get_current_user)
 ):
-    """Export all data for current user as JSON"""
-    try:
-        entities = database.query(models.Entity).filter(models.Entity.user_id == current_user.id).all()
-        relations = database.query(models.Relation).filter(models.Relation.user_id == current_user.id).all()
-        entity_type_records = database.query(models.EntityType).filter(models.EntityType.user_id == current_user.id).all()
-        relation_type_records = database.query(models.RelationType).filter(models.RelationType.user_id == current_user.id).all()
-
-        # Get entity types from records and existing entities
-        entity_types = {t.name for t in entity_type_records}
-        entity_types.update([e.type for e in entities])
-        
-        relation_types = {t.name for t in relation_type_records}
-        relation_types.update([r.relation_type for r in relations])
-        
-        data = {
-            "version": "1.0",
-            "exported_at": datetime.utcnow().isoformat() + "Z",
-            "entities": [schemas.Entity.model_validate(e).model_dump() for e in entities],
-            "relations": [schemas.Relation.model_validate(r).model_dump() for r in relations],
-            "entity_types": sorted(entity_types),
-            "relation_types": sorted(relation_types)
-        }
-        
-        return data
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Export failed: {str(e)}")
+    """Stream all data for current user as JSON or NDJSON (see export_service).
+
+    Without ``format``, NDJSON is chosen when the Accept header asks for it.
+    The body is compressed when Accept-Encoding allows gzip or zstd.
+    """
+    if format is None:
+        format = "ndjson" if "application/x-ndjson" in request.headers.get("accept", "") else "json"
+    encoding = negotiate_encoding(request.headers.get("accept-encoding"))
+    headers = {
+        "Content-Disposition": f'attachment; filename="relation-map-export.{format}"',
+        "Vary": "Accept, Accept-Encoding",
+    }
+    if encoding:
+        headers["Content-Encoding"] = encoding
+    return StreamingResponse(
+        stream_export(current_user.id, format, encoding),
+        media_type=MEDIA_TYPES[format],
+        headers=headers,
+    )
 
 @router.post("/import")
 def import_data(
@@ -368,74 +681,57 @@ def import_data(
 ):
     """Import data from JSON for current user"""
     try:
+        importer = BulkImporter(database, current_user.id)
         if mode == "replace":
             # Delete existing data for current user only
-            database.query(models.Relation).filter(models.Relation.user_id == current_user.id).delete()
-            database.query(models.Entity).filter(models.Entity.user_id == current_user.id).delete()
-            database.commit()
-        
-        # Import entities
-        entity_id_map = {}  # old_id -> new_id mapping
-        
-        for entity_data in data.entities:
-            entity_dict = entity_data.model_dump()
-            old_id = entity_dict.pop("id", None)
-            
-            new_entity = models.Entity(**entity_dict, user_id=current_user.id)
-            database.add(new_entity)
-            database.flush()
-            
-            if old_id is not None:
-                entity_id_map[old_id] = new_entity.id
-        
-        # Import relations
-        for relation_data in data.relations:
-            relation_dict = relation_data.model_dump()
-            relation_dict.pop("id", None)
-            
-            # Apply ID mapping
-            if relation_dict["source_id"] in entity_id_map:
-                relation_dict["source_id"] = entity_id_map[relation_dict["source_id"]]
-            if relation_dict["target_id"] in entity_id_map:
-                relation_dict["target_id"] = entity_id_map[relation_dict["target_id"]]
-            
-            new_relation = models.Relation(**relation_dict, user_id=current_user.id)
-            database.add(new_relation)
-
-        # Import entity types
-        entity_types = set(data.entity_types or [])
-        entity_types.update([e.type for e in data.entities])
-        
-        for type_name in entity_types:
-            existing = database.query(models.EntityType).filter(
-                (models.EntityType.name == type_name) & (models.EntityType.user_id == current_user.id)
-            ).first()
-            if not existing:
-                database.add(models.EntityType(name=type_name, user_id=current_user.id))
-
-        # Import relation types
-        relation_types = set(data.relation_types or [])
-        relation_types.update([r.relation_type for r in data.relations])
-
-        for type_name in relation_types:
-            existing = database.query(models.RelationType).filter(
-                (models.RelationType.name == type_name) & (models.RelationType.user_id == current_user.id)
-            ).first()
-            if not existing:
-                database.add(models.RelationType(name=type_name, user_id=current_user.id))
-        
+            importer.clear_existing()
+        importer.add_entities(entity.model_dump() for entity in data.entities)
+        importer.add_relations(relation.model_dump() for relation in data.relations)
+        importer.add_entity_types(data.entity_types or [])
+        importer.add_relation_types(data.relation_types or [])
+        result = importer.finish()
         database.commit()
-        
-        return {
-            "ok": True,
-            "imported_entities": len(data.entities),
-            "imported_relations": len(data.relations),
-            "skipped": 0
-        }
     except Exception as e:
         database.rollback()
         raise HTTPException(status_code=500, detail=f"Import failed: {str(e)}")
 
+    record_import(database, current_user, mode)
+    return {"ok": True, **result}
+
+@router.post("/import/stream")
+async def import_stream(
+    request: Request,
+    mode: str = Query(default="merge", pattern="^(merge|replace)$"),
+    format: str = Query(default="ndjson", pattern="^(ndjson|json)$"),
+    database: Session = Depends(get_db),
+    current_user: models.User = Depends(get_current_user)
+):
+    """Import NDJSON or an export JSON document, parsed and written as the body arrives.
+
+    Database work runs in the threadpool; only one batch of records is held in memory.
+    """
+    parser = NdjsonParser() if format == "ndjson" else JsonDocumentParser()
+    importer = BulkImporter(database, current_user.id)
+    try:
+        if mode == "replace":
+            await run_in_threadpool(importer.clear_existing)
+        async for chunk in request.stream():
+            records = parser.feed(chunk)
+            if records:
+                await run_in_threadpool(importer.add_records, records)
+        await run_in_threadpool(importer.add_records, parser.close())
+        result = await run_in_threadpool(importer.finish)
+        await run_in_threadpool(database.commit)
+    except ImportFormatError as e:
+        await run_in_threadpool(database.rollback)
+        raise HTTPException(status_code=400, detail=f"Import failed: {str(e)}")
+    except Exception as e:
+        await run_in_threadpool(database.rollback)
+        raise HTTPException(status_code=500, detail=f"Import failed: {str(e)}")
+
+    await run_in_threadpool(record_import, database, current_user, mode)
+    return {"ok": True, **result}
+
 @router.put("/entities/types/{old_type}")
 def rename_entity_type(
     old_type: str,
@@ -449,39 +745,27 @@ def rename_entity_type(
         if not normalized_new_type:
             raise HTTPException(status_code=400, detail="Type name is required")
 
-        # Filter by user_id
-        entities = database.query(models.Entity).filter(
-            models.Entity.type == old_type,
-            models.Entity.user_id == current_user.id
-        ).all()
-        count = len(entities)
-
-        existing_old_type = database.query(models.EntityType).filter(
-            models.EntityType.name == old_type,
-            models.EntityType.user_id == current_user.id
-        ).first()
-        
-        if count == 0 and not existing_old_type:
-            raise HTTPException(status_code=404, detail=f"No entities found with type '{old_type}'")
-
         # Check if normalized_new_type already exists for this user
         if normalized_new_type != old_type and database.query(models.EntityType).filter(
             models.EntityType.name == normalized_new_type,
             models.EntityType.user_id == current_user.id
         ).first():
             raise HTTPException(status_code=409, detail=f"Type '{normalized_new_type}' already exists")
-        
-        # Update all entities
-        for entity in entities:
-            entity.type = normalized_new_type
-
-        # Update or create EntityType record
-        if existing_old_type:
-            existing_old_type.name = normalized_new_type
-        else:
-            ensure_entity_type(database, normalized_new_type, current_user.id)
-        
+
+        # Update the entities and the EntityType record in place (one UPDATE each)
+        entities, renamed_type = rename_type(
+            database, models.EntityType, current_user.id, old_type, normalized_new_type
+        )
+        count = len(entities)
+        if renamed_type is None:
+            raise HTTPException(status_code=404, detail=f"No entities found with type '{old_type}'")
+
         database.commit()
+        changes = build_changes("entities", "changed", [entity_record(e) for e in entities])
+        if normalized_new_type != old_type:
+            build_changes("entity_types", "removed", [old_type], changes)
+            build_changes("entity_types", "added", [{"name": normalized_new_type}], changes)
+        record_change(database, current_user, f"Renamed entity type: {old_type} -> {normalized_new_type}", changes)
         return {"ok": True, "updated_count": count, "old_type": old_type, "new_type": normalized_new_type}
     except HTTPException:
         raise
@@ -497,39 +781,19 @@ def delete_entity_type(
 ):
     """Delete all entities with specified type (and their relations)"""
     try:
-        # Filter entities by type and user
-        entities = database.query(models.Entity).filter(
-            models.Entity.type == type_name,
-            models.Entity.user_id == current_user.id
-        ).all()
-        entity_ids = [e.id for e in entities]
-        
-        # Delete the EntityType itself (whether or not entities existed)
-        type_count = database.query(models.EntityType).filter(
-            models.EntityType.name == type_name
-        ).delete(synchronize_session=False)
-        
+        # Relations of the entities, the entities and the EntityType itself (one DELETE each)
+        entity_ids, relation_ids, type_count = cascade_delete_entity_type(database, current_user.id, type_name)
+        entities_deleted, relations_deleted = len(entity_ids), len(relation_ids)
+
         # If no entities and no type, return 404
         if not entity_ids and type_count == 0:
             raise HTTPException(status_code=404, detail=f"Entity type '{type_name}' not found")
-        
-        # Delete related relations first (only for this user's entities)
-        relations_deleted = 0
-        if entity_ids:
-            relations_deleted = database.query(models.Relation).filter(
-                models.Relation.user_id == current_user.id,
-                (models.Relation.source_id.in_(entity_ids)) | (models.Relation.target_id.in_(entity_ids))
-            ).delete(synchronize_session=False)
-            
-            # Delete entities
-            entities_deleted = database.query(models.Entity).filter(
-                models.Entity.type == type_name,
-                models.Entity.user_id == current_user.id
-            ).delete(synchronize_session=False)
-        else:
-            entities_deleted = 0
-        
+
         database.commit()
+        changes = build_changes("entities", "removed", entity_ids)
+        build_changes("relations", "removed", relation_ids, changes)
+        build_changes("entity_types", "removed", [type_name], changes)
+        record_change(database, current_user, f"Deleted entity type: {type_name}", changes)
         return {"ok": True, "deleted_entities": entities_deleted, "deleted_relations": relations_deleted, "deleted_type": type_count}
     except HTTPException:
         raise
@@ -550,32 +814,24 @@ def rename_relation_type(
         if not normalized_new_type:
             raise HTTPException(status_code=400, detail="Type name is required")
 
-        relations = database.query(models.Relation).filter(
-            (models.Relation.relation_type == old_type) & (models.Relation.user_id == current_user.id)
-        ).all()
-        count = len(relations)
-
-        existing_old_type = database.query(models.RelationType).filter(
-            (models.RelationType.name == old_type) & (models.RelationType.user_id == current_user.id)
-        ).first()
-        
-        if count == 0 and not existing_old_type:
-            raise HTTPException(status_code=404, detail=f"No relations found with type '{old_type}'")
-
         if normalized_new_type != old_type and database.query(models.RelationType).filter(
             (models.RelationType.name == normalized_new_type) & (models.RelationType.user_id == current_user.id)
         ).first():
             raise HTTPException(status_code=409, detail=f"Type '{normalized_new_type}' already exists")
-        
-        for relation in relations:
-            relation.relation_type = normalized_new_type
 
-        if existing_old_type:
-            existing_old_type.name = normalized_new_type
-        else:
-            ensure_relation_type(database, normalized_new_type, current_user.id)
-        
+        relations, renamed_type = rename_type(
+            database, models.RelationType, current_user.id, old_type, normalized_new_type
+        )
+        count = len(relations)
+        if renamed_type is None:
+            raise HTTPException(status_code=404, detail=f"No relations found with type '{old_type}'")
+
         database.commit()
+        changes = build_changes("relations", "changed", [relation_record(r) for r in relations])
+        if normalized_new_type != old_type:
+            build_changes("relation_types", "removed", [old_type], changes)
+            type_changes(changes, relation_type=renamed_type)
+        record_change(database, current_user, f"Renamed relation type: {old_type} -> {normalized_new_type}", changes)
         return {"ok": True, "updated_count": count, "old_type": old_type, "new_type": normalized_new_type}
     except HTTPException:
         raise
@@ -592,10 +848,15 @@ def delete_relation_type(
     """Delete all relations with specified type AND the type itself"""
     try:
         # Delete relations with this type
-        rel_count = database.query(models.Relation).filter(
-            models.Relation.relation_type == type_name,
-            models.Relation.user_id == current_user.id
-        ).delete(synchronize_session=False)
+        relation_filter = (
+            (models.Relation.relation_type == type_name)
+            & (models.Relation.user_id == current_user.id)
+        )
+        relation_ids = sorted(database.scalars(
+            delete(models.Relation).where(relation_filter).returning(models.Relation.id),
+            execution_options={"synchronize_session": False},
+        ).all())
+        rel_count = len(relation_ids)
         
         # Delete the RelationType itself (whether or not relations existed)
         type_count = database.query(models.RelationType).filter(
@@ -608,6 +869,9 @@ def delete_relation_type(
             raise HTTPException(status_code=404, detail=f"Relation type '{type_name}' not found")
         
         database.commit()
+        changes = build_changes("relations", "removed", relation_ids)
+        build_changes("relation_types", "removed", [type_name], changes)
+        record_change(database, current_user, f"Deleted relation type: {type_name}", changes)
         return {"ok": True, "deleted_relations": rel_count, "deleted_type": type_count}
     except HTTPException:
         raise
@@ -619,12 +883,17 @@ def delete_relation_type(
 # Version management
 @router.get("/versions", response_model=list[schemas.VersionListItem])
 def list_versions(
+    before: Optional[int] = Query(None, description="Only versions with a lower version number"),
+    limit: Optional[int] = Query(None, ge=1, le=1000),
     database: Session = Depends(get_db),
     current_user: models.User = Depends(get_current_user)
 ):
-    """Get all versions for current user in reverse chronological order."""
-    versions = VersionService.get_all_versions(database, current_user.id)
-    return versions
+    """Get versions for current user in reverse chronological order.
+
+    Pass the last ``version_number`` of a page as ``before`` to get the next page.
+    """
+    version_pipeline.flush(database, current_user.id)
+    return VersionService.list_versions(database, current_user.id, before, limit)
 
 
 @router.get("/versions/{version_id}", response_model=schemas.Version)
@@ -634,10 +903,52 @@ def get_version(
     current_user: models.User = Depends(get_current_user)
 ):
     """Get a specific version for current user."""
+    version_pipeline.flush(database, current_user.id)
     version = VersionService.get_version(database, version_id, current_user.id)
     if not version:
         raise HTTPException(status_code=404, detail="Version not found")
-    return version
+    return schemas.Version(
+        id=version.id,
+        version_number=version.version_number,
+        created_at=version.created_at,
+        description=version.description,
+        snapshot=VersionService.get_snapshot(database, version),
+        changes=version.changes,
+        created_by=version.created_by,
+    )
+
+
+@router.get("/versions/{version_id}/diff/{other_version_id}", response_model=schemas.VersionDiff)
+def diff_versions(
+    version_id: int,
+    other_version_id: int,
+    offset: int = Query(0, ge=0),
+    limit: int = Query(500, ge=1, le=5000),
+    database: Session = Depends(get_db),
+    current_user: models.User = Depends(get_current_user)
+):
+    """Get the changes from one version to another, one page at a time."""
+    version_pipeline.flush(database, current_user.id)
+    from_version = VersionService.get_version(database, version_id, current_user.id)
+    to_version = VersionService.get_version(database, other_version_id, current_user.id)
+    if not from_version or not to_version:
+        raise HTTPException(status_code=404, detail="Version not found")
+
+    items = VersionService.diff_versions(database, from_version, to_version)
+    summary = {}
+    for item in items:
+        ops = summary.setdefault(item["section"], {})
+        ops[item["op"]] = ops.get(item["op"], 0) + 1
+    end = offset + limit
+    return schemas.VersionDiff(
+        from_version_id=from_version.id,
+        to_version_id=to_version.id,
+        summary=summary,
+        total=len(items),
+        offset=offset,
+        items=items[offset:end],
+        next_offset=end if end < len(items) else None,
+    )
 
 
 @router.post("/versions/create-checkpoint", response_model=schemas.VersionListItem)
@@ -647,7 +958,16 @@ def create_checkpoint(
     current_user: models.User = Depends(get_current_user)
 ):
     """Create a checkpoint of the current state for current user."""
-    version = VersionService.create_version(database, description, "user", current_user)
+    version_pipeline.flush(database, current_user.id)
+    # A checkpoint does not change the graph: it is published as an empty delta
+    # and the in-memory indexes are kept, unless edits were never versioned
+    unchanged = (
+        version_pipeline.has_history(database, current_user.id)
+        and not version_pipeline.claim_snapshot(current_user.id)
+    )
+    version = VersionService.create_version(
+        database, description, "user", current_user, {} if unchanged else None, snapshot=True
+    )
     return version
 
 
@@ -660,6 +980,7 @@ def restore_version(
 ):
     """Restore to a specific version for current user."""
     try:
+        version_pipeline.flush(database, current_user.id)
         restored_version = VersionService.restore_version(database, version_id, create_backup, current_user.id)
         return {
             "ok": True,
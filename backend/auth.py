@@ -1,14 +1,19 @@
 """Authentication utilities for Relation Map API"""
 
 import os
+import threading
+import time
 from passlib.context import CryptContext
 from datetime import datetime, timedelta
 from jose import JWTError, jwt
 from typing import Optional
 from fastapi import HTTPException, status, Depends
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
-from sqlalchemy.orm import Session
+from sqlalchemy import event, inspect
+from sqlalchemy.orm import Session, make_transient_to_detached
+from cache import LRUCache
 from db import get_db
+from models import User
 
 # Password context
 pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
@@ -18,9 +23,19 @@ SECRET_KEY = os.getenv("SECRET_KEY", "your-secret-key-here-change-in-production"
 ALGORITHM = "HS256"
 ACCESS_TOKEN_EXPIRE_MINUTES = 60 * 24 * 7  # 7 days
 
+# Authenticated users are cached per process for a short time (size 0 disables the cache)
+USER_CACHE_SIZE = int(os.getenv("USER_CACHE_SIZE", "1024"))
+USER_CACHE_TTL_SECONDS = float(os.getenv("USER_CACHE_TTL_SECONDS", "60"))
+
 # HTTP Bearer security scheme
 security = HTTPBearer()
 
+# user ID -> (expiry on the monotonic clock, detached copy of the active user)
+user_cache = LRUCache(USER_CACHE_SIZE)
+# Bumped by every invalidation, so a lookup racing one does not cache what it read
+_cache_generation = 0
+_cache_lock = threading.Lock()
+
 def hash_password(password: str) -> str:
     """Hash a password using bcrypt"""
     return pwd_context.hash(password)
@@ -56,13 +71,57 @@ def decode_access_token(token: str) -> dict:
             headers={"WWW-Authenticate": "Bearer"},
         )
 
+def invalidate_user(user_id: int) -> None:
+    """Drop a user from the authenticated-user cache"""
+    global _cache_generation
+    with _cache_lock:
+        _cache_generation += 1
+        user_cache.pop(user_id)
+
+def _detached_copy(user: User) -> User:
+    copy = User(**{attribute.key: getattr(user, attribute.key) for attribute in inspect(User).column_attrs})
+    make_transient_to_detached(copy)
+    return copy
+
+def load_active_user(db: Session, user_id: int) -> Optional[User]:
+    """Get an active user by ID (None if missing or inactive), from the cache when possible"""
+    cached = user_cache.get(user_id)
+    if cached is not None and cached[0] > time.monotonic():
+        # Attach a copy of the cached row to this session without a query
+        return db.merge(cached[1], load=False)
+
+    generation = _cache_generation
+    user = db.query(User).filter(User.id == user_id).first()
+    if user is None or not user.is_active:
+        return None
+    with _cache_lock:
+        if generation == _cache_generation:
+            user_cache.put(user_id, (time.monotonic() + USER_CACHE_TTL_SECONDS, _detached_copy(user)))
+    return user
+
+@event.listens_for(Session, "after_flush")
+def _invalidate_flushed_users(session: Session, flush_context) -> None:
+    """Users updated (e.g. deactivated) or deleted leave the cache when flushed and again on commit"""
+    changed = {obj.id for obj in (*session.dirty, *session.deleted) if isinstance(obj, User)}
+    for user_id in changed:
+        invalidate_user(user_id)
+    if changed:
+        session.info.setdefault("changed_user_ids", set()).update(changed)
+
+@event.listens_for(Session, "after_commit")
+def _invalidate_committed_users(session: Session) -> None:
+    for user_id in session.info.pop("changed_user_ids", ()):
+        invalidate_user(user_id)
+
+@event.listens_for(Session, "after_rollback")
+def _forget_rolled_back_users(session: Session) -> None:
+    session.info.pop("changed_user_ids", None)
+
 def get_current_user(
     credentials: HTTPAuthorizationCredentials = Depends(security),
     db: Session = Depends(get_db)
 ):
     """Get current authenticated user from token"""
-    from models import User
-    
     token = credentials.credentials
     payload = decode_access_token(token)
     
@@ -82,8 +141,8 @@ def get_current_user(
         )
     
     # Use the injected database session
-    user = db.query(User).filter(User.id == user_id).first()
-    if user is None or not user.is_active:
+    user = load_active_user(db, user_id)
+    if user is None:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="User not found or inactive",
@@ -0,0 +1,242 @@
+"""Apply a batch of entity/relation operations in one transaction.
+
+Operations run in order.  Rows created by the batch can be referenced by
+later operations through their client-side ``temp_id``.  Relations are
+attached to their entity objects rather than to raw IDs, so inserts are
+batched by the unit of work at the end and relations follow their entities
+when those are deleted.  The caller commits; nothing is committed here.
+"""
+
+from typing import Any, Dict, List, Optional, Set, Tuple, Union
+
+from sqlalchemy import inspect
+from sqlalchemy.orm import Session, selectinload
+
+from models import Entity, EntityType, Relation, RelationType
+from version_service import entity_record, relation_record, relation_type_record
+
+ENTITY_FIELDS = ("name", "type", "description")
+RELATION_FIELDS = ("relation_type", "description")
+
+
+class BatchError(ValueError):
+    """An operation of the batch cannot be applied."""
+
+    def __init__(self, index: int, message: str):
+        super().__init__(f"Operation {index}: {message}")
+        self.index = index
+
+
+class BatchApplier:
+    """Applies operations for one user and tracks the resulting delta."""
+
+    def __init__(self, database: Session, user_id: int, operations: List[Any]):
+        self.database = database
+        self.user_id = user_id
+        self.operations = operations
+        self.entities: Dict[int, Entity] = {}
+        self.relations: Dict[int, Relation] = {}
+        self.temp_entities: Dict[str, Entity] = {}
+        self.temp_relations: Dict[str, Relation] = {}
+        self.created: List[Union[Entity, Relation]] = []
+        self.updated: List[Union[Entity, Relation]] = []
+        self.deleted_entity_ids: Set[int] = set()
+        self.deleted_relation_ids: Set[int] = set()
+        self.entity_type_names: Set[str] = set()
+        self.relation_type_names: Set[str] = set()
+        self.new_types: Tuple[List[EntityType], List[RelationType]] = ([], [])
+
+    def run(self) -> Dict[str, Any]:
+        self._prefetch()
+        for index, operation in enumerate(self.operations):
+            handler = getattr(self, f"_{operation.op}_{operation.kind}")
+            handler(index, operation)
+        self._flush()
+        return self._result(*self.new_types)
+
+    def _flush(self) -> None:
+        """Flush pending rows, registering their new types first so that they are counted."""
+        for registered, created in zip(self.new_types, self._ensure_types()):
+            registered.extend(created)
+        self.database.flush()
+
+    def _prefetch(self) -> None:
+        """Load every existing row the batch refers to in one query per table."""
+        entity_ids, relation_ids = set(), set()
+        for operation in self.operations:
+            if operation.op != "create" and isinstance(operation.id, int):
+                (entity_ids if operation.kind == "entity" else relation_ids).add(operation.id)
+            if operation.kind == "relation":
+                entity_ids.update(ref for ref in (operation.source_id, operation.target_id) if isinstance(ref, int))
+
+        if entity_ids:
+            query = self.database.query(Entity).options(
+                selectinload(Entity.outgoing_relations), selectinload(Entity.incoming_relations)
+            )
+            for entity in query.filter(Entity.id.in_(entity_ids), Entity.user_id == self.user_id):
+                self.entities[entity.id] = entity
+        if relation_ids:
+            query = self.database.query(Relation).filter(
+                Relation.id.in_(relation_ids), Relation.user_id == self.user_id
+            )
+            for relation in query:
+                self.relations[relation.id] = relation
+
+    def _entity(self, index: int, ref: Optional[Union[int, str]]) -> Entity:
+        entity = self.temp_entities.get(ref) if isinstance(ref, str) else self.entities.get(ref)
+        if entity is None or inspect(entity).deleted or inspect(entity).was_deleted:
+            raise BatchError(index, f"Entity {ref} not found")
+        return entity
+
+    def _relation(self, index: int, ref: Optional[Union[int, str]]) -> Relation:
+        relation = self.temp_relations.get(ref) if isinstance(ref, str) else self.relations.get(ref)
+        if relation is None or inspect(relation).deleted or inspect(relation).was_deleted:
+            raise BatchError(index, f"Relation {ref} not found")
+        return relation
+
+    def _register_temp_id(self, index: int, operation, row, registry: Dict[str, Any]) -> None:
+        if operation.temp_id is None:
+            return
+        if operation.temp_id in self.temp_entities or operation.temp_id in self.temp_relations:
+            raise BatchError(index, f"Duplicate temp_id {operation.temp_id}")
+        registry[operation.temp_id] = row
+
+    def _create_entity(self, index: int, operation) -> None:
+        if not operation.name or not operation.type:
+            raise BatchError(index, "Entity name and type are required")
+        entity = Entity(
+            name=operation.name, type=operation.type, description=operation.description, user_id=self.user_id
+        )
+        self.database.add(entity)
+        self._register_temp_id(index, operation, entity, self.temp_entities)
+        self.entity_type_names.add(entity.type)
+        self.created.append(entity)
+
+    def _update_entity(self, index: int, operation) -> None:
+        entity = self._entity(index, operation.id)
+        for field in ENTITY_FIELDS:
+            if field in operation.model_fields_set:
+                if field != "description" and not getattr(operation, field):
+                    raise BatchError(index, f"Entity {field} cannot be empty")
+                setattr(entity, field, getattr(operation, field))
+        self.entity_type_names.add(entity.type)
+        self.updated.append(entity)
+
+    def _delete_entity(self, index: int, operation) -> None:
+        entity = self._entity(index, operation.id)
+        if inspect(entity).pending:
+            self._flush()  # only persistent rows can be deleted
+        # Attached relations are deleted with the entity (ORM cascade)
+        for relation in list(entity.outgoing_relations) + list(entity.incoming_relations):
+            if inspect(relation).pending:
+                self._flush()
+            self.deleted_relation_ids.add(relation.id)
+        self.deleted_entity_ids.add(entity.id)
+        self.database.delete(entity)
+
+    def _create_relation(self, index: int, operation) -> None:
+        if operation.source_id is None or operation.target_id is None or not operation.relation_type:
+            raise BatchError(index, "Relation source_id, target_id and relation_type are required")
+        relation = Relation(
+            source=self._entity(index, operation.source_id),
+            target=self._entity(index, operation.target_id),
+            relation_type=operation.relation_type,
+            description=operation.description,
+            user_id=self.user_id,
+        )
+        self.database.add(relation)
+        self._register_temp_id(index, operation, relation, self.temp_relations)
+        self.relation_type_names.add(relation.relation_type)
+        self.created.append(relation)
+
+    def _update_relation(self, index: int, operation) -> None:
+        relation = self._relation(index, operation.id)
+        if inspect(relation).pending and {"source_id", "target_id"} & operation.model_fields_set:
+            # Moving an unsaved relation off an entity would delete it as an orphan
+            self._flush()
+        if "source_id" in operation.model_fields_set:
+            relation.source = self._entity(index, operation.source_id)
+        if "target_id" in operation.model_fields_set:
+            relation.target = self._entity(index, operation.target_id)
+        for field in RELATION_FIELDS:
+            if field in operation.model_fields_set:
+                if field != "description" and not getattr(operation, field):
+                    raise BatchError(index, f"Relation {field} cannot be empty")
+                setattr(relation, field, getattr(operation, field))
+        self.relation_type_names.add(relation.relation_type)
+        self.updated.append(relation)
+
+    def _delete_relation(self, index: int, operation) -> None:
+        relation = self._relation(index, operation.id)
+        if inspect(relation).pending:
+            self._flush()
+        self.deleted_relation_ids.add(relation.id)
+        self.database.delete(relation)
+
+    def _ensure_types(self):
+        """Register the types used by the batch that the user does not have yet."""
+        new_types = []
+        for model, names in ((EntityType, self.entity_type_names), (RelationType, self.relation_type_names)):
+            existing = set()
+            if names:
+                existing = {
+                    name for (name,) in self.database.query(model.name).filter(
+                        model.user_id == self.user_id, model.name.in_(names)
+                    )
+                }
+            created = [model(name=name, user_id=self.user_id) for name in sorted(names - existing)]
+            self.database.add_all(created)
+            new_types.append(created)
+        return new_types
+
+    def _result(self, new_entity_types, new_relation_types) -> Dict[str, Any]:
+        """The batch's net effect, as a version delta and as the endpoint response."""
+        def alive(row) -> bool:
+            return not inspect(row).was_deleted
+
+        created = [row for row in self.created if alive(row)]
+        created_rows = {id(row) for row in created}
+        updated = list({id(row): row for row in self.updated if alive(row) and id(row) not in created_rows}.values())
+
+        # Rows created and deleted within the batch have no net effect
+        created_ids = {(type(row), row.id) for row in self.created}
+        deleted_entity_ids = sorted(i for i in self.deleted_entity_ids if (Entity, i) not in created_ids)
+        deleted_relation_ids = sorted(i for i in self.deleted_relation_ids if (Relation, i) not in created_ids)
+
+        changes: Dict[str, Any] = {}
+
+        def add(section: str, op: str, records: list) -> None:
+            if records:
+                changes.setdefault(section, {})[op] = records
+
+        add("entities", "added", [entity_record(row) for row in created if isinstance(row, Entity)])
+        add("entities", "changed", [entity_record(row) for row in updated if isinstance(row, Entity)])
+        add("entities", "removed", deleted_entity_ids)
+        add("relations", "added", [relation_record(row) for row in created if isinstance(row, Relation)])
+        add("relations", "changed", [relation_record(row) for row in updated if isinstance(row, Relation)])
+        add("relations", "removed", deleted_relation_ids)
+        add("entity_types", "added", [{"name": row.name} for row in new_entity_types])
+        add("relation_types", "added", [relation_type_record(row) for row in new_relation_types])
+
+        return {
+            "changes": changes,
+            "id_map": {
+                temp_id: row.id
+                for registry in (self.temp_entities, self.temp_relations)
+                for temp_id, row in registry.items()
+                if alive(row)
+            },
+            "entities": [entity_record(row) for row in created + updated if isinstance(row, Entity)],
+            "relations": [relation_record(row) for row in created + updated if isinstance(row, Relation)],
+            "deleted_entity_ids": deleted_entity_ids,
+            "deleted_relation_ids": deleted_relation_ids,
+        }
+
+
+def apply_batch(database: Session, user_id: int, operations: List[Any]) -> Dict[str, Any]:
+    """Apply operations for a user without committing.
+
+    Returns the batch's delta under ``changes`` together with the temp ID
+    map and the affected rows; raises BatchError for an invalid operation.
+    """
+    return BatchApplier(database, user_id, operations).run()
@@ -0,0 +1,70 @@
+"""
+Benchmark: requests/sec on read endpoints with and without the
+authenticated-user cache (auth.user_cache).
+
+Usage (from the backend directory):
+    python benchmarks/bench_auth_cache.py [request_count ...]
+"""
+
+import os
+import sys
+import time
+
+os.environ.setdefault("JOB_WORKERS", "0")
+
+from common import BENCH_DATABASE_URL, create_user, make_session_factory, populate_graph, print_table
+from fastapi.testclient import TestClient
+
+import auth
+from auth import create_access_token
+from db import get_db
+from main import app
+
+DEFAULT_COUNTS = [2_000]
+ENDPOINTS = ["/api/auth/me", "/api/entities/types", "/api/entities/?limit=50"]
+
+
+def requests_per_second(client, path, count):
+    client.get(path)  # warm up (and fill the cache when it is enabled)
+    start = time.perf_counter()
+    for _ in range(count):
+        client.get(path)
+    return count / (time.perf_counter() - start)
+
+
+def run(counts):
+    SessionLocal = make_session_factory()
+    database = SessionLocal()
+    user_id = create_user(database, "auth-cache").id
+    populate_graph(database, user_id, 1_000)
+    database.close()
+
+    def bench_db():
+        session = SessionLocal()
+        try:
+            yield session
+        finally:
+            session.close()
+
+    app.dependency_overrides[get_db] = bench_db
+    client = TestClient(app, headers={"Authorization": f"Bearer {create_access_token({'sub': user_id})}"})
+    cache_size = auth.user_cache.max_entries
+    rows = []
+    try:
+        for count in counts:
+            for path in ENDPOINTS:
+                auth.user_cache.max_entries = 0
+                auth.user_cache.clear()
+                uncached = requests_per_second(client, path, count)
+                auth.user_cache.max_entries = cache_size
+                cached = requests_per_second(client, path, count)
+                rows.append((path, count, f"{uncached:,.0f}", f"{cached:,.0f}", f"{cached / uncached - 1:+.1%}"))
+    finally:
+        app.dependency_overrides.clear()
+
+    print(f"database: {BENCH_DATABASE_URL}")
+    print_table(["endpoint", "requests", "no cache req/s", "cache req/s", "change"], rows)
+
+
+if __name__ == "__main__":
+    run([int(arg) for arg in sys.argv[1:]] or DEFAULT_COUNTS)
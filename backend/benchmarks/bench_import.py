@@ -0,0 +1,110 @@
+"""
+Benchmark: BulkImporter throughput against import size, for a parsed body and
+for a streamed NDJSON body (with the peak memory allocated while streaming).
+
+Usage (from the backend directory):
+    python benchmarks/bench_import.py [entity_count ...]
+"""
+
+import json
+import sys
+import tracemalloc
+
+from common import create_user, make_session_factory, print_table, timed
+
+from import_service import BulkImporter, NdjsonParser
+
+DEFAULT_SIZES = [1_000, 10_000, 50_000]
+RELATIONS_PER_ENTITY = 2
+STREAM_CHUNK_BYTES = 64 * 1024
+
+
+def make_payload(size):
+    """Entities with file IDs and relations referencing them, as in an export."""
+    entities = [
+        {"id": i, "name": f"Entity {i}", "type": f"type-{i % 10}", "description": f"Imported entity {i}"}
+        for i in range(1, size + 1)
+    ]
+    relations = [
+        {
+            "source_id": i,
+            "target_id": (i * 7 + k) % size + 1,
+            "relation_type": f"relation-{k}",
+            "description": None,
+        }
+        for i in range(1, size + 1)
+        for k in range(RELATIONS_PER_ENTITY)
+    ]
+    return entities, relations
+
+
+def ndjson_chunks(entities, relations):
+    """Yield an NDJSON body in fixed-size chunks without building it in memory."""
+    pending = []
+    pending_bytes = 0
+    for kind, records in (("entity", entities), ("relation", relations)):
+        for record in records:
+            line = (json.dumps({"kind": kind, **record}) + "\n").encode()
+            pending.append(line)
+            pending_bytes += len(line)
+            if pending_bytes >= STREAM_CHUNK_BYTES:
+                yield b"".join(pending)
+                pending, pending_bytes = [], 0
+    if pending:
+        yield b"".join(pending)
+
+
+def import_stream(database, user_id, entities, relations):
+    importer = BulkImporter(database, user_id)
+    parser = NdjsonParser()
+    for chunk in ndjson_chunks(entities, relations):
+        importer.add_records(parser.feed(chunk))
+    importer.add_records(parser.close())
+    importer.finish()
+    database.commit()
+
+
+def run(sizes):
+    SessionLocal = make_session_factory()
+    rows = []
+    for size in sizes:
+        entities, relations = make_payload(size)
+        database = SessionLocal()
+        try:
+            user = create_user(database, f"import-{size}")
+            results = {}
+            with timed(results, "import"):
+                importer = BulkImporter(database, user.id)
+                importer.add_entities(entities)
+                importer.add_relations(relations)
+                importer.finish()
+                database.commit()
+
+            stream_user = create_user(database, f"import-stream-{size}")
+            with timed(results, "stream"):
+                import_stream(database, stream_user.id, entities, relations)
+
+            # Memory tracing slows the import down, so it gets a run of its own
+            traced_user = create_user(database, f"import-traced-{size}")
+            tracemalloc.start()
+            import_stream(database, traced_user.id, entities, relations)
+            _, peak = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+
+            imported_rows = len(entities) + len(relations)
+            rows.append((
+                size,
+                imported_rows,
+                f"{results['import']:.3f}",
+                f"{imported_rows / results['import']:,.0f}",
+                f"{imported_rows / results['stream']:,.0f}",
+                f"{peak / 1024 / 1024:.1f}",
+            ))
+        finally:
+            database.close()
+
+    print_table(["entities", "rows", "seconds", "rows/sec", "stream rows/sec", "stream peak MB"], rows)
+
+
+if __name__ == "__main__":
+    run([int(arg) for arg in sys.argv[1:]] or DEFAULT_SIZES)
@@ -0,0 +1,52 @@
+"""
+Benchmark: VersionService.restore_version against snapshot size.
+
+Usage (from the backend directory):
+    python benchmarks/bench_restore.py [entity_count ...]
+"""
+
+import sys
+from types import SimpleNamespace
+
+from common import create_user, make_session_factory, populate_graph, print_table, timed
+
+from models import Entity, Relation
+from version_service import VersionService
+
+DEFAULT_SIZES = [1_000, 10_000, 50_000]
+
+
+def run(sizes):
+    SessionLocal = make_session_factory()
+    rows = []
+    for size in sizes:
+        database = SessionLocal()
+        try:
+            user = create_user(database, f"restore-{size}")
+            populate_graph(database, user.id, size)
+            version = VersionService.create_version(database, "bench", "system", SimpleNamespace(id=user.id))
+
+            # Restore into an empty graph so every row is re-inserted
+            database.query(Relation).filter(Relation.user_id == user.id).delete()
+            database.query(Entity).filter(Entity.user_id == user.id).delete()
+            database.commit()
+
+            results = {}
+            with timed(results, "restore"):
+                VersionService.restore_version(database, version.id, create_backup=False, user_id=user.id)
+
+            restored_rows = size * 3
+            rows.append((
+                size,
+                restored_rows,
+                f"{results['restore']:.3f}",
+                f"{restored_rows / results['restore']:,.0f}",
+            ))
+        finally:
+            database.close()
+
+    print_table(["entities", "rows", "seconds", "rows/sec"], rows)
+
+
+if __name__ == "__main__":
+    run([int(arg) for arg in sys.argv[1:]] or DEFAULT_SIZES)
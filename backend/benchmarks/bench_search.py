@@ -0,0 +1,80 @@
+"""
+Benchmark: search latency (median and p99) against the number of entities,
+for word/prefix queries and for queries that fall through to fuzzy matching.
+
+Usage (from the backend directory):
+    python benchmarks/bench_search.py [entity_count ...]
+"""
+
+import random
+import sys
+import time
+
+from common import BENCH_DATABASE_URL, create_user, make_session_factory, print_table
+from sqlalchemy import insert
+
+from models import Entity
+from search_service import install_search_index, search
+
+DEFAULT_SIZES = [100_000, 1_000_000]
+QUERIES = 200
+INSERT_BATCH = 50_000
+
+FIRST_NAMES = [f"{a}{b}" for a in ("Al", "Be", "Ca", "Do", "El", "Fa", "Gi", "Ha", "Io", "Ju") for b in
+               ("bert", "lina", "rmen", "ris", "vira", "tima", "lda", "kon", "nes", "lia")]
+LAST_NAMES = [f"{a}{b}{c}" for a in ("Ka", "Mo", "Ri", "Ta", "Yo") for b in ("mura", "shi", "ka", "da") for c in
+              ("", "no", "moto", "gawa", "yama")]
+WORDS = ["guild", "harbor", "council", "river", "archive", "market", "forge", "temple", "school", "garden"]
+
+
+def populate(database, user_id, size, rng):
+    for start in range(0, size, INSERT_BATCH):
+        database.execute(insert(Entity), [
+            {
+                "name": f"{rng.choice(FIRST_NAMES)} {rng.choice(LAST_NAMES)} {i}",
+                "type": "person",
+                "description": f"Member of the {rng.choice(WORDS)} near the {rng.choice(WORDS)}",
+                "user_id": user_id,
+            }
+            for i in range(start, min(size, start + INSERT_BATCH))
+        ])
+    database.commit()
+
+
+def latencies(database, user_id, queries, **options):
+    samples = []
+    for query in queries:
+        start = time.perf_counter()
+        search(database, user_id, query, **options)
+        samples.append(time.perf_counter() - start)
+    samples.sort()
+    return samples[len(samples) // 2] * 1000, samples[int(len(samples) * 0.99)] * 1000
+
+
+def run(sizes):
+    SessionLocal = make_session_factory()
+    install_search_index(SessionLocal.kw["bind"])
+    rng = random.Random(7)
+    rows = []
+    for size in sizes:
+        database = SessionLocal()
+        try:
+            user = create_user(database, f"search-{size}")
+            populate(database, user.id, size, rng)
+            word_queries = [
+                f"{rng.choice(FIRST_NAMES)[:4]} {rng.choice(LAST_NAMES)}" for _ in range(QUERIES)
+            ]
+            # Fragments from inside surnames find no word match and fall through to fuzzy matching
+            fuzzy_queries = [rng.choice(LAST_NAMES)[1:] for _ in range(QUERIES)]
+            word = latencies(database, user.id, word_queries, fuzzy=False)
+            fuzzy = latencies(database, user.id, fuzzy_queries)
+            rows.append((size, f"{word[0]:.1f}", f"{word[1]:.1f}", f"{fuzzy[0]:.1f}", f"{fuzzy[1]:.1f}"))
+        finally:
+            database.close()
+
+    print(f"database: {BENCH_DATABASE_URL}")
+    print_table(["entities", "word p50 ms", "word p99 ms", "fuzzy p50 ms", "fuzzy p99 ms"], rows)
+
+
+if __name__ == "__main__":
+    run([int(arg) for arg in sys.argv[1:]] or DEFAULT_SIZES)
@@ -0,0 +1,87 @@
+"""
+Benchmark: renaming and cascade deleting a type against the number of rows
+using it, set-based (type_registry) versus loading the rows into the session.
+
+Usage (from the backend directory):
+    python benchmarks/bench_type_ops.py [entity_count ...]
+"""
+
+import sys
+
+from common import BENCH_DATABASE_URL, create_user, make_session_factory, populate_graph, print_table, timed
+
+from models import Entity, EntityType, Relation
+from type_registry import cascade_delete_entity_type, rename_type
+from version_service import entity_record
+
+DEFAULT_SIZES = [10_000, 100_000]
+
+
+def rename_loaded(database, user_id, old_name, new_name):
+    """Rename by loading every entity of the type and setting it row by row."""
+    entities = database.query(Entity).filter(Entity.type == old_name, Entity.user_id == user_id).all()
+    for entity in entities:
+        entity.type = new_name
+    database.query(EntityType).filter(EntityType.name == old_name, EntityType.user_id == user_id).one().name = new_name
+    database.commit()
+    return [entity_record(entity) for entity in entities]
+
+
+def delete_loaded(database, user_id, name):
+    """Cascade delete with the entity IDs passed back in IN (...) lists."""
+    entity_ids = [e.id for e in database.query(Entity).filter(Entity.type == name, Entity.user_id == user_id)]
+    relation_filter = (Relation.user_id == user_id) & (Relation.source_id.in_(entity_ids) | Relation.target_id.in_(entity_ids))
+    relation_ids = [row[0] for row in database.query(Relation.id).filter(relation_filter)]
+    database.query(Relation).filter(relation_filter).delete(synchronize_session=False)
+    database.query(Entity).filter(Entity.type == name, Entity.user_id == user_id).delete(synchronize_session=False)
+    database.query(EntityType).filter(EntityType.name == name, EntityType.user_id == user_id).delete(synchronize_session=False)
+    database.commit()
+    return entity_ids, relation_ids
+
+
+def prepare(SessionLocal, size, label):
+    database = SessionLocal()
+    user = create_user(database, f"types-{label}-{size}")
+    populate_graph(database, user.id, size)
+    database.add(EntityType(name="person", user_id=user.id, usage_count=size))
+    database.commit()
+    return database, user.id
+
+
+def run(sizes):
+    SessionLocal = make_session_factory()
+    rows = []
+    for size in sizes:
+        results = {}
+        for label in ("loaded", "set-based"):
+            database, user_id = prepare(SessionLocal, size, label)
+            try:
+                with timed(results, (label, "rename")):
+                    if label == "loaded":
+                        rename_loaded(database, user_id, "person", "human")
+                    else:
+                        rename_type(database, EntityType, user_id, "person", "human")
+                        database.commit()
+                database.expunge_all()
+                with timed(results, (label, "delete")):
+                    if label == "loaded":
+                        delete_loaded(database, user_id, "human")
+                    else:
+                        cascade_delete_entity_type(database, user_id, "human")
+                        database.commit()
+            finally:
+                database.close()
+        rows.append((
+            size,
+            f"{results['loaded', 'rename']:.3f}",
+            f"{results['set-based', 'rename']:.3f}",
+            f"{results['loaded', 'delete']:.3f}",
+            f"{results['set-based', 'delete']:.3f}",
+        ))
+
+    print(f"database: {BENCH_DATABASE_URL}")
+    print_table(["entities", "rename loaded s", "rename set s", "delete loaded s", "delete set s"], rows)
+
+
+if __name__ == "__main__":
+    run([int(arg) for arg in sys.argv[1:]] or DEFAULT_SIZES)
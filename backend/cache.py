@@ -0,0 +1,80 @@
+"""Small thread-safe in-process caches."""
+
+import threading
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Hashable, Optional
+
+
+class LRUCache:
+    """Least-recently-used cache holding at most ``max_entries`` values.
+
+    With ``max_weight`` and a ``weigher`` (e.g. an estimate of the value's
+    size in bytes), the least recently used values are also evicted while the
+    total weight exceeds ``max_weight``; the newest value is always kept.
+    Putting a value again re-weighs it after it has grown or shrunk.
+    """
+
+    def __init__(
+        self,
+        max_entries: int,
+        max_weight: Optional[int] = None,
+        weigher: Optional[Callable[[Any], int]] = None,
+    ):
+        self.max_entries = max_entries
+        self.max_weight = max_weight
+        self.weigher = weigher
+        self._entries: "OrderedDict[Hashable, Any]" = OrderedDict()
+        self._weights: Dict[Hashable, int] = {}
+        self._total_weight = 0
+        self._lock = threading.Lock()
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        with self._lock:
+            if key not in self._entries:
+                return default
+            self._entries.move_to_end(key)
+            return self._entries[key]
+
+    def put(self, key: Hashable, value: Any) -> None:
+        if self.max_entries <= 0:
+            return
+        weight = self.weigher(value) if self.weigher is not None else 0
+        with self._lock:
+            self._entries[key] = value
+            self._entries.move_to_end(key)
+            self._total_weight += weight - self._weights.get(key, 0)
+            self._weights[key] = weight
+            while len(self._entries) > self.max_entries or (
+                self.max_weight is not None and self._total_weight > self.max_weight and len(self._entries) > 1
+            ):
+                evicted, _ = self._entries.popitem(last=False)
+                self._total_weight -= self._weights.pop(evicted, 0)
+
+    def get_or_compute(self, key: Hashable, compute: Callable[[], Any]) -> Any:
+        """Return the cached value, computing and caching it on a miss."""
+        missing = object()
+        value = self.get(key, missing)
+        if value is missing:
+            value = compute()
+            self.put(key, value)
+        return value
+
+    def pop(self, key: Hashable, default: Optional[Any] = None) -> Any:
+        with self._lock:
+            self._total_weight -= self._weights.pop(key, 0)
+            return self._entries.pop(key, default)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._weights.clear()
+            self._total_weight = 0
+
+    @property
+    def total_weight(self) -> int:
+        with self._lock:
+            return self._total_weight
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._entries)
@@ -0,0 +1,127 @@
+"""In-process publish/subscribe for per-user change events.
+
+Every version written for a user (automatic, import, restore, checkpoint) is
+published as a ``version`` event carrying its version number, the number
+before it and its delta, so a client holding version ``previous_version_number``
+can apply the delta and any other client knows it has missed something and
+should resync through ``GET /api/changes``.  Automatic versions are written
+by the version pipeline, so events follow an edit by at most the debounce
+window.
+
+Publishing is thread-safe (versions are written from the threadpool and the
+pipeline thread); each subscriber is an asyncio queue on the event loop that
+serves its connection, so idle connections cost one queue and one task each.
+A subscriber that falls ``CHANGE_FEED_QUEUE_SIZE`` events behind gets a single
+``resync`` event instead.  ``ChangeFeed`` is the only interface callers use,
+so it can be swapped for a broker-backed implementation (e.g. Redis or
+Postgres LISTEN/NOTIFY) when running several processes.
+"""
+
+import asyncio
+import json
+import logging
+import os
+import threading
+from typing import Any, AsyncIterator, Dict, Optional, Set
+
+logger = logging.getLogger(__name__)
+
+# Events buffered per connection before it is told to resync
+CHANGE_FEED_QUEUE_SIZE = int(os.getenv("CHANGE_FEED_QUEUE_SIZE", "100"))
+# Comment lines sent on idle connections so proxies keep them open
+CHANGE_FEED_HEARTBEAT_SECONDS = float(os.getenv("CHANGE_FEED_HEARTBEAT_SECONDS", "15"))
+
+RESYNC_EVENT = {"type": "resync"}
+
+
+class Subscription:
+    """Events for one connection, delivered on the loop that created it."""
+
+    def __init__(self, user_id: int, queue_size: int = CHANGE_FEED_QUEUE_SIZE):
+        self.user_id = user_id
+        self.loop = asyncio.get_running_loop()
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=max(1, queue_size))
+
+    def offer(self, event: Dict[str, Any]) -> None:
+        """Queue an event (on the subscriber's loop); overflow turns into one resync."""
+        try:
+            self.queue.put_nowait(event)
+        except asyncio.QueueFull:
+            while not self.queue.empty():
+                self.queue.get_nowait()
+            self.queue.put_nowait(RESYNC_EVENT)
+
+    async def get(self) -> Dict[str, Any]:
+        return await self.queue.get()
+
+
+class ChangeFeed:
+    """Fans events out to the subscribers of each user."""
+
+    def __init__(self, queue_size: int = CHANGE_FEED_QUEUE_SIZE):
+        self.queue_size = queue_size
+        self._subscribers: Dict[int, Set[Subscription]] = {}
+        self._lock = threading.Lock()
+
+    def subscribe(self, user_id: int) -> Subscription:
+        """Register a subscriber; must be called from the event loop."""
+        subscription = Subscription(user_id, self.queue_size)
+        with self._lock:
+            self._subscribers.setdefault(user_id, set()).add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription: Subscription) -> None:
+        with self._lock:
+            subscribers = self._subscribers.get(subscription.user_id)
+            if subscribers is not None:
+                subscribers.discard(subscription)
+                if not subscribers:
+                    del self._subscribers[subscription.user_id]
+
+    def subscriber_count(self, user_id: int) -> int:
+        with self._lock:
+            return len(self._subscribers.get(user_id, ()))
+
+    def publish(self, user_id: int, event: Dict[str, Any]) -> None:
+        """Deliver an event to every subscriber of a user, from any thread."""
+        with self._lock:
+            subscribers = list(self._subscribers.get(user_id, ()))
+        for subscription in subscribers:
+            try:
+                subscription.loop.call_soon_threadsafe(subscription.offer, event)
+            except RuntimeError:  # the subscriber's loop is closed
+                self.unsubscribe(subscription)
+
+
+def format_event(event: Dict[str, Any]) -> bytes:
+    """Serialize an event for a text/event-stream response."""
+    lines = [f"event: {event['type']}"]
+    if "version_number" in event:
+        lines.append(f"id: {event['version_number']}")
+    lines.append("data: " + json.dumps(event, default=str))
+    return ("\n".join(lines) + "\n\n").encode()
+
+
+async def event_stream(
+    feed: ChangeFeed,
+    subscription: Subscription,
+    initial: Optional[Dict[str, Any]] = None,
+    heartbeat_seconds: float = CHANGE_FEED_HEARTBEAT_SECONDS,
+) -> AsyncIterator[bytes]:
+    """Server-sent events for a subscription until the client disconnects."""
+    try:
+        yield b"retry: 3000\n\n"
+        if initial is not None:
+            yield format_event(initial)
+        while True:
+            try:
+                event = await asyncio.wait_for(subscription.get(), timeout=heartbeat_seconds)
+            except asyncio.TimeoutError:
+                yield b": keep-alive\n\n"
+                continue
+            yield format_event(event)
+    finally:
+        feed.unsubscribe(subscription)
+
+
+feed = ChangeFeed()
@@ -0,0 +1,201 @@
+"""Streaming export of a user's graph.
+
+Rows are read with a server-side cursor (``yield_per``) as plain column
+tuples and serialized chunk by chunk, so memory use does not grow with the
+graph and the first bytes are sent before the whole graph has been read.
+Two formats are produced:
+
+* ``json`` - the document accepted by ``POST /import`` (same keys and order)
+* ``ndjson`` - one record per line, as accepted by ``POST /import/stream``
+
+Chunks can be compressed on the fly with gzip, or zstd when the optional
+``zstandard`` package is installed.
+"""
+
+import json
+import os
+import zlib
+from datetime import datetime
+from typing import Callable, Iterator, List, Optional
+
+from sqlalchemy import select, union
+from sqlalchemy.orm import Session
+
+import db
+from models import Entity, EntityType, Relation, RelationType
+
+try:
+    import zstandard
+except ImportError:  # zstd is optional
+    zstandard = None
+
+# Rows fetched from the cursor (and serialized) per chunk
+EXPORT_FETCH_SIZE = max(1, int(os.getenv("EXPORT_FETCH_SIZE", "2000")))
+
+EXPORT_VERSION = "1.0"
+
+MEDIA_TYPES = {"json": "application/json", "ndjson": "application/x-ndjson"}
+
+ENTITY_COLUMNS = (Entity.id, Entity.name, Entity.type, Entity.description)
+RELATION_COLUMNS = (Relation.id, Relation.source_id, Relation.target_id, Relation.relation_type, Relation.description)
+
+
+def available_encodings() -> List[str]:
+    """Content encodings the export can produce, preferred first."""
+    return (["zstd"] if zstandard is not None else []) + ["gzip"]
+
+
+def negotiate_encoding(accept_encoding: Optional[str]) -> Optional[str]:
+    """Pick a content encoding from an Accept-Encoding header (None for identity)."""
+    accepted = set()
+    for part in (accept_encoding or "").split(","):
+        name, _, params = part.strip().partition(";")
+        if params.strip().replace(" ", "") in ("q=0", "q=0.0"):
+            continue
+        accepted.add(name.strip().lower())
+    for encoding in available_encodings():
+        if encoding in accepted:
+            return encoding
+    return None
+
+
+def compress_chunks(chunks: Iterator[bytes], encoding: Optional[str]) -> Iterator[bytes]:
+    """Compress a stream of chunks incrementally."""
+    if encoding is None:
+        yield from chunks
+        return
+    if encoding == "gzip":
+        compressor = zlib.compressobj(6, zlib.DEFLATED, 31)  # 31: gzip container
+        compress, finish = compressor.compress, compressor.flush
+    else:
+        compressor = zstandard.ZstdCompressor().compressobj()
+        compress, finish = compressor.compress, compressor.flush
+    for chunk in chunks:
+        compressed = compress(chunk)
+        if compressed:
+            yield compressed
+    yield finish()
+
+
+class GraphExporter:
+    """Serializes one user's graph from a dedicated session.
+
+    ``on_rows`` is called with the number of entity/relation rows in each
+    chunk as it is read, for progress reporting.
+    """
+
+    def __init__(
+        self,
+        database: Session,
+        user_id: int,
+        fetch_size: int = EXPORT_FETCH_SIZE,
+        on_rows: Optional[Callable[[int], None]] = None,
+    ):
+        self.database = database
+        self.user_id = user_id
+        self.fetch_size = fetch_size
+        self.on_rows = on_rows
+
+    def _rows(self, columns):
+        model = columns[0].class_
+        statement = (
+            select(*columns)
+            .where(model.user_id == self.user_id)
+            .order_by(model.id)
+            .execution_options(yield_per=self.fetch_size)
+        )
+        for rows in self.database.execute(statement).partitions():
+            if self.on_rows is not None:
+                self.on_rows(len(rows))
+            yield rows
+
+    def entities(self) -> Iterator[List[dict]]:
+        for rows in self._rows(ENTITY_COLUMNS):
+            yield [{"id": r[0], "name": r[1], "type": r[2], "description": r[3]} for r in rows]
+
+    def relations(self) -> Iterator[List[dict]]:
+        for rows in self._rows(RELATION_COLUMNS):
+            yield [
+                {"id": r[0], "source_id": r[1], "target_id": r[2], "relation_type": r[3], "description": r[4]}
+                for r in rows
+            ]
+
+    def type_names(self, type_model, row_model, column) -> List[str]:
+        """Registered type names plus the ones used by rows, sorted."""
+        statement = union(
+            select(type_model.name).where(type_model.user_id == self.user_id),
+            select(column).where(row_model.user_id == self.user_id),
+        )
+        return sorted(name for (name,) in self.database.execute(statement))
+
+    def entity_types(self) -> List[str]:
+        return self.type_names(EntityType, Entity, Entity.type)
+
+    def relation_types(self) -> List[str]:
+        return self.type_names(RelationType, Relation, Relation.relation_type)
+
+    def json_chunks(self) -> Iterator[bytes]:
+        header = json.dumps({"version": EXPORT_VERSION, "exported_at": datetime.utcnow().isoformat() + "Z"})
+        yield (header[:-1] + ', "entities": [').encode()
+        yield from self._json_array(self.entities())
+        yield b'], "relations": ['
+        yield from self._json_array(self.relations())
+        yield (
+            '], "entity_types": ' + json.dumps(self.entity_types())
+            + ', "relation_types": ' + json.dumps(self.relation_types()) + "}"
+        ).encode()
+
+    @staticmethod
+    def _json_array(chunks: Iterator[List[dict]]) -> Iterator[bytes]:
+        separator = ""
+        for records in chunks:
+            yield (separator + ", ".join(map(json.dumps, records))).encode()
+            separator = ", "
+
+    def ndjson_chunks(self) -> Iterator[bytes]:
+        meta = {"kind": "meta", "version": EXPORT_VERSION, "exported_at": datetime.utcnow().isoformat() + "Z"}
+        lines = [json.dumps(meta)]
+        lines += [json.dumps({"kind": "entity_type", "name": name}) for name in self.entity_types()]
+        lines += [json.dumps({"kind": "relation_type", "name": name}) for name in self.relation_types()]
+        yield ("\n".join(lines) + "\n").encode()
+        for kind, chunks in (("entity", self.entities()), ("relation", self.relations())):
+            for records in chunks:
+                yield "".join(json.dumps({"kind": kind, **record}) + "\n" for record in records).encode()
+
+
+def use_snapshot_isolation(database: Session) -> None:
+    """Entities and relations are read by separate statements; keep them consistent."""
+    if database.get_bind().dialect.name == "postgresql":
+        database.connection(execution_options={"isolation_level": "REPEATABLE READ"})
+
+
+def stream_rows(user_id: int, section: str) -> Iterator[bytes]:
+    """Generate a JSON array of all of a user's entities or relations, chunk by chunk.
+
+    Used by the listing endpoints' ``all`` mode; like stream_export it reads
+    with a server-side cursor from its own session instead of OFFSET pages.
+    """
+    database = db.SessionLocal()
+    try:
+        exporter = GraphExporter(database, user_id)
+        yield b"["
+        yield from exporter._json_array(exporter.entities() if section == "entities" else exporter.relations())
+        yield b"]"
+    finally:
+        database.close()
+
+
+def stream_export(user_id: int, format: str = "json", encoding: Optional[str] = None) -> Iterator[bytes]:
+    """Generate an export for a streaming response.
+
+    The session is opened here rather than taken from the request, because
+    the body is produced after the endpoint has returned.
+    """
+    database = db.SessionLocal()
+    try:
+        use_snapshot_isolation(database)
+        exporter = GraphExporter(database, user_id)
+        chunks = exporter.ndjson_chunks() if format == "ndjson" else exporter.json_chunks()
+        yield from compress_chunks(chunks, encoding)
+    finally:
+        database.close()
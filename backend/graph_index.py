@@ -0,0 +1,355 @@
+"""In-memory adjacency index of each active user's graph.
+
+A UserGraph keeps entities and relations in flat ``array`` columns and the
+adjacency in CSR form (an offsets array per direction into an array of
+relation indexes), so a graph of a million relations takes tens of
+megabytes instead of a million ORM objects.  Entities and relations are
+addressed by dense indexes; IDs are mapped with a binary search over the
+sorted ID columns.
+
+Graphs are loaded lazily on first use and then kept current from the deltas
+of committed edits (``index.apply_changes``, called with every automatic
+version's delta).  Added relations go to a small overlay next to the CSR
+arrays and removed ones are only marked dead; once the overlay grows past
+``GRAPH_INDEX_COMPACT_RATIO`` of the graph, the arrays are rebuilt.  Edits
+without a delta (imports, restores, resets) drop the user's graph, which is
+reloaded on the next query.  Graphs are evicted least recently used once
+their estimated size exceeds ``GRAPH_INDEX_MEMORY_MB``.
+
+The index lives in the process; with several worker processes each keeps
+its own copy, updated only by the edits that process commits.  Callers hold
+``graph.lock`` while reading a graph so an edit is never applied halfway
+through a traversal.
+"""
+
+import os
+import threading
+from array import array
+from bisect import bisect_left
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Set, Tuple
+
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+
+from cache import LRUCache
+from models import Entity, Relation
+
+GRAPH_INDEX_MEMORY_MB = float(os.getenv("GRAPH_INDEX_MEMORY_MB", "256"))
+GRAPH_INDEX_MAX_USERS = int(os.getenv("GRAPH_INDEX_MAX_USERS", "1000"))
+# Share of overlay (added) and dead relations that triggers a rebuild of the arrays
+GRAPH_INDEX_COMPACT_RATIO = float(os.getenv("GRAPH_INDEX_COMPACT_RATIO", "0.1"))
+
+# Rows read per round trip when loading a graph
+LOAD_FETCH_SIZE = 10000
+MIN_COMPACT_THRESHOLD = 1024
+
+DIRECTIONS = ("out", "in", "both")
+
+# (relation id, source entity id, target entity id, relation type)
+RelationRow = Tuple[int, int, int, str]
+
+
+class UserGraph:
+    """Array-backed adjacency of one user's entities and relations."""
+
+    def __init__(self, entity_ids: Iterable[int] = (), relations: Iterable[RelationRow] = ()):
+        self.lock = threading.RLock()
+        self.type_names: List[str] = []
+        self._type_ids: Dict[str, int] = {}
+        self._build(list(entity_ids), [(rid, s, t, self.type_id(name, create=True)) for rid, s, t, name in relations])
+
+    # ----- Building -----
+
+    def _build(self, entity_ids: List[int], relations: List[Tuple[int, int, int, int]]) -> None:
+        """Lay out sorted ID columns and CSR adjacency; relations use entity IDs here."""
+        entity_ids = sorted(set(entity_ids))
+        self.node_ids = array("q", entity_ids)
+        self.node_alive = bytearray(b"\x01") * len(entity_ids)
+        self._sorted_nodes = len(entity_ids)
+        self._late_nodes: Dict[int, int] = {}
+
+        self.rel_ids = array("q")
+        self.rel_src = array("q")
+        self.rel_tgt = array("q")
+        self.rel_type = array("i")
+        for rid, source_id, target_id, type_id in sorted(relations):
+            source, target = self._find(self.node_ids, source_id, self._sorted_nodes), self._find(
+                self.node_ids, target_id, self._sorted_nodes
+            )
+            if source is None or target is None:
+                continue  # dangling endpoint (another user's entity)
+            self.rel_ids.append(rid)
+            self.rel_src.append(source)
+            self.rel_tgt.append(target)
+            self.rel_type.append(type_id)
+        self.rel_alive = bytearray(b"\x01") * len(self.rel_ids)
+        self._sorted_rels = len(self.rel_ids)
+        self._late_rels: Dict[int, int] = {}
+
+        self._base_nodes = len(self.node_ids)
+        self.out_offsets, self.out_edges = self._csr(self.rel_src)
+        self.in_offsets, self.in_edges = self._csr(self.rel_tgt)
+        self._extra_out: Dict[int, List[int]] = {}
+        self._extra_in: Dict[int, List[int]] = {}
+        self._overlay = 0
+        self._dead = 0
+
+    def _csr(self, endpoints: array) -> Tuple[array, array]:
+        """Counting sort of relation indexes by endpoint."""
+        offsets = array("q", [0]) * (self._base_nodes + 1)
+        for node in endpoints:
+            offsets[node + 1] += 1
+        for node in range(self._base_nodes):
+            offsets[node + 1] += offsets[node]
+        cursor = array("q", offsets)
+        edges = array("q", [0]) * len(endpoints)
+        for rel, node in enumerate(endpoints):
+            edges[cursor[node]] = rel
+            cursor[node] += 1
+        return offsets, edges
+
+    def compact(self) -> None:
+        """Rebuild the arrays without dead rows and overlay."""
+        entity_ids = [self.node_ids[i] for i in range(len(self.node_ids)) if self.node_alive[i]]
+        relations = [
+            (self.rel_ids[r], self.node_ids[self.rel_src[r]], self.node_ids[self.rel_tgt[r]], self.rel_type[r])
+            for r in range(len(self.rel_ids))
+            if self.rel_alive[r]
+        ]
+        self._build(entity_ids, relations)
+
+    # ----- Lookups -----
+
+    @staticmethod
+    def _find(ids: array, key: int, sorted_count: int) -> Optional[int]:
+        position = bisect_left(ids, key, 0, sorted_count)
+        if position < sorted_count and ids[position] == key:
+            return position
+        return None
+
+    def index_of(self, entity_id: int) -> Optional[int]:
+        """Index of a live entity, or None."""
+        index = self._late_nodes.get(entity_id)
+        if index is None:
+            index = self._find(self.node_ids, entity_id, self._sorted_nodes)
+        return index if index is not None and self.node_alive[index] else None
+
+    def relation_index_of(self, relation_id: int) -> Optional[int]:
+        index = self._late_rels.get(relation_id)
+        if index is None:
+            index = self._find(self.rel_ids, relation_id, self._sorted_rels)
+        return index if index is not None and self.rel_alive[index] else None
+
+    def type_id(self, name: str, create: bool = False) -> Optional[int]:
+        type_id = self._type_ids.get(name)
+        if type_id is None and create:
+            type_id = self._type_ids[name] = len(self.type_names)
+            self.type_names.append(name)
+        return type_id
+
+    def type_ids(self, names: Optional[Iterable[str]]) -> Optional[Set[int]]:
+        """Interned IDs of relation type names (None means every type)."""
+        if names is None:
+            return None
+        return {self._type_ids[name] for name in names if name in self._type_ids}
+
+    def neighbors(
+        self, node: int, direction: str = "both", type_ids: Optional[Set[int]] = None
+    ) -> Iterator[Tuple[int, int]]:
+        """(relation index, neighbor index) pairs of a node's live relations."""
+        if direction in ("out", "both"):
+            yield from self._adjacent(node, self.out_offsets, self.out_edges, self._extra_out, self.rel_tgt, type_ids)
+        if direction in ("in", "both"):
+            for rel, other in self._adjacent(node, self.in_offsets, self.in_edges, self._extra_in, self.rel_src, type_ids):
+                if direction == "in" or other != node:  # a self-loop was already listed as outgoing
+                    yield rel, other
+
+    def _adjacent(self, node, offsets, edges, extra, other_end, type_ids) -> Iterator[Tuple[int, int]]:
+        rels: Iterable[int] = ()
+        if node < self._base_nodes:
+            rels = edges[offsets[node]:offsets[node + 1]]
+        for group in (rels, extra.get(node, ())):
+            for rel in group:
+                if self.rel_alive[rel] and (type_ids is None or self.rel_type[rel] in type_ids):
+                    yield rel, other_end[rel]
+
+    def live_nodes(self) -> Iterator[int]:
+        return (i for i in range(len(self.node_ids)) if self.node_alive[i])
+
+    def live_relations(self) -> Iterator[int]:
+        return (r for r in range(len(self.rel_ids)) if self.rel_alive[r])
+
+    @property
+    def node_count(self) -> int:
+        return len(self.node_ids) - self.node_alive.count(0)
+
+    @property
+    def relation_count(self) -> int:
+        return len(self.rel_ids) - self.rel_alive.count(0)
+
+    @property
+    def nbytes(self) -> int:
+        """Rough memory footprint, for the index's memory budget."""
+        arrays = (
+            self.node_ids, self.rel_ids, self.rel_src, self.rel_tgt, self.rel_type,
+            self.out_offsets, self.out_edges, self.in_offsets, self.in_edges,
+        )
+        size = sum(a.itemsize * len(a) for a in arrays) + len(self.node_alive) + len(self.rel_alive)
+        # Dict and list entries of the overlay cost far more than array slots
+        size += 100 * (len(self._late_nodes) + len(self._late_rels)) + 80 * self._overlay
+        return size
+
+    # ----- Incremental updates -----
+
+    def apply_changes(self, changes: Dict[str, Any]) -> None:
+        """Apply a version delta; applying the same delta twice has no further effect."""
+        entities = changes.get("entities") or {}
+        relations = changes.get("relations") or {}
+        for record in entities.get("added", []):
+            if self.index_of(record["id"]) is None:
+                self._append_node(record["id"])
+        for relation_id in relations.get("removed", []):
+            self._remove_relation(relation_id)
+        for record in relations.get("added", []) + relations.get("changed", []):
+            self._remove_relation(record["id"])  # endpoints or type may have changed
+            self._append_relation(record)
+        for entity_id in entities.get("removed", []):
+            self._remove_node(entity_id)
+        if self._overlay + self._dead > max(MIN_COMPACT_THRESHOLD, GRAPH_INDEX_COMPACT_RATIO * len(self.rel_ids)):
+            self.compact()
+
+    def _append_node(self, entity_id: int) -> None:
+        index = len(self.node_ids)
+        if self._sorted_nodes == index and (index == 0 or entity_id > self.node_ids[-1]):
+            self._sorted_nodes += 1
+        else:
+            self._late_nodes[entity_id] = index
+        self.node_ids.append(entity_id)
+        self.node_alive.append(1)
+
+    def _remove_node(self, entity_id: int) -> None:
+        index = self.index_of(entity_id)
+        if index is None:
+            return
+        # Relations go with their entity
+        for rel, _ in list(self.neighbors(index, "both")):
+            self._kill_relation(rel)
+        self.node_alive[index] = 0
+
+    def _append_relation(self, record: Dict[str, Any]) -> None:
+        source, target = self.index_of(record["source_id"]), self.index_of(record["target_id"])
+        if source is None or target is None:
+            return
+        index = len(self.rel_ids)
+        if self._sorted_rels == index and (index == 0 or record["id"] > self.rel_ids[-1]):
+            self._sorted_rels += 1
+        else:
+            self._late_rels[record["id"]] = index
+        self.rel_ids.append(record["id"])
+        self.rel_src.append(source)
+        self.rel_tgt.append(target)
+        self.rel_type.append(self.type_id(record["relation_type"], create=True))
+        self.rel_alive.append(1)
+        self._extra_out.setdefault(source, []).append(index)
+        self._extra_in.setdefault(target, []).append(index)
+        self._overlay += 1
+
+    def _remove_relation(self, relation_id: int) -> None:
+        index = self.relation_index_of(relation_id)
+        if index is not None:
+            self._kill_relation(index)
+
+    def _kill_relation(self, index: int) -> None:
+        if self.rel_alive[index]:
+            self.rel_alive[index] = 0
+            self._dead += 1
+
+
+def load_user_graph(database: Session, user_id: int) -> UserGraph:
+    """Build a user's graph from the entities and relations tables (two queries)."""
+    entity_ids = array("q", database.execute(
+        select(Entity.id).where(Entity.user_id == user_id).order_by(Entity.id)
+        .execution_options(yield_per=LOAD_FETCH_SIZE)
+    ).scalars())
+    relations = database.execute(
+        select(Relation.id, Relation.source_id, Relation.target_id, Relation.relation_type)
+        .where(Relation.user_id == user_id)
+        .order_by(Relation.id)
+        .execution_options(yield_per=LOAD_FETCH_SIZE)
+    )
+    return UserGraph(entity_ids, (tuple(row) for row in relations))
+
+
+class GraphIndex:
+    """Lazily loaded, incrementally updated UserGraphs under a memory budget.
+
+    ``loader`` can build another per-user structure instead; it needs the
+    ``lock``, ``apply_changes`` and ``nbytes`` members of UserGraph.
+    """
+
+    def __init__(
+        self,
+        memory_budget_bytes: int = int(GRAPH_INDEX_MEMORY_MB * 1024 * 1024),
+        max_users: int = GRAPH_INDEX_MAX_USERS,
+        loader: Callable[[Session, int], Any] = load_user_graph,
+    ):
+        self._loader = loader
+        self._graphs = LRUCache(max_users, max_weight=memory_budget_bytes, weigher=lambda graph: graph.nbytes)
+        self._generations: Dict[int, int] = {}
+        self._load_locks: Dict[int, threading.Lock] = {}
+        self._lock = threading.Lock()
+
+    def get(self, database: Session, user_id: int) -> UserGraph:
+        """The user's graph, loaded on first use."""
+        graph = self._graphs.get(user_id)
+        if graph is not None:
+            return graph
+        with self._lock:
+            load_lock = self._load_locks.setdefault(user_id, threading.Lock())
+        with load_lock:
+            graph = self._graphs.get(user_id)
+            if graph is not None:
+                return graph
+            with self._lock:
+                generation = self._generations.get(user_id, 0)
+            graph = self._loader(database, user_id)
+            with self._lock:
+                # An edit committed while loading may be missing; use this copy once only
+                if self._generations.get(user_id, 0) == generation:
+                    self._graphs.put(user_id, graph)
+            return graph
+
+    def apply_changes(self, user_id: int, changes: Optional[Dict[str, Any]]) -> None:
+        """Bring a loaded graph up to date with a committed delta (None: unknown delta)."""
+        if changes is None:
+            self.invalidate(user_id)
+            return
+        with self._lock:
+            generation = self._generations[user_id] = self._generations.get(user_id, 0) + 1
+        graph = self._graphs.get(user_id)
+        if graph is None:
+            return
+        with graph.lock:
+            graph.apply_changes(changes)
+        with self._lock:
+            # Re-weigh, unless an invalidation dropped the graph meanwhile
+            if self._generations.get(user_id, 0) == generation and self._graphs.get(user_id) is graph:
+                self._graphs.put(user_id, graph)
+
+    def invalidate(self, user_id: int) -> None:
+        with self._lock:
+            self._generations[user_id] = self._generations.get(user_id, 0) + 1
+        self._graphs.pop(user_id)
+
+    def is_loaded(self, user_id: int) -> bool:
+        return self._graphs.get(user_id) is not None
+
+    def clear(self) -> None:
+        self._graphs.clear()
+
+    @property
+    def memory_bytes(self) -> int:
+        return self._graphs.total_weight
+
+
+index = GraphIndex()
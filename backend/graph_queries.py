@@ -0,0 +1,289 @@
+"""Traversal queries over the in-memory graph index (see graph_index).
+
+Traversals run on entity and relation indexes only; the rows of the result
+are read from the database afterwards by ID, so the cost of a query depends
+on the size of its result, not of the graph.  Path searches can still touch
+much of a large graph, so they run under a ``SearchBudget`` of node visits and
+wall time and return what they found when it runs out.
+"""
+
+import heapq
+import os
+import time
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Set, Tuple
+
+from sqlalchemy.orm import Session
+
+from graph_index import UserGraph
+from models import Entity, Relation
+from version_service import entity_record, relation_record
+
+# IDs per IN (...) lookup when reading result rows
+ROW_LOOKUP_CHUNK = 500
+
+# Budget of one path query
+PATH_QUERY_MAX_VISITS = int(os.getenv("PATH_QUERY_MAX_VISITS", "200000"))
+PATH_QUERY_TIMEOUT_SECONDS = float(os.getenv("PATH_QUERY_TIMEOUT_SECONDS", "2"))
+
+# Direction of a search walking back from the target
+REVERSED = {"out": "in", "in": "out", "both": "both"}
+
+# (entity indexes, relation indexes) from source to target
+GraphPath = Tuple[List[int], List[int]]
+
+
+class BudgetExceeded(Exception):
+    """A search ran out of its visit or time budget."""
+
+
+class SearchBudget:
+    """Node visits and wall time left to a query, shared by its searches."""
+
+    def __init__(self, max_visits: int = PATH_QUERY_MAX_VISITS, timeout_seconds: float = PATH_QUERY_TIMEOUT_SECONDS):
+        self.remaining = max_visits
+        self.deadline = time.monotonic() + timeout_seconds
+
+    def spend(self) -> None:
+        self.remaining -= 1
+        # The clock is read every 256 visits only
+        if self.remaining < 0 or (self.remaining & 0xFF == 0 and time.monotonic() > self.deadline):
+            raise BudgetExceeded()
+
+
+def parse_types(values: Optional[List[str]]) -> Optional[List[str]]:
+    """Relation types from repeated and/or comma-separated query values."""
+    if not values:
+        return None
+    return [name.strip() for value in values for name in value.split(",") if name.strip()]
+
+
+def load_rows(database: Session, model, user_id: int, ids: Iterable[int]) -> Dict[int, Any]:
+    """Rows of a user by ID, in chunks."""
+    ids = list(ids)
+    rows = {}
+    for start in range(0, len(ids), ROW_LOOKUP_CHUNK):
+        chunk = ids[start:start + ROW_LOOKUP_CHUNK]
+        for row in database.query(model).filter(model.id.in_(chunk), model.user_id == user_id):
+            rows[row.id] = row
+    return rows
+
+
+def neighborhood(
+    graph: UserGraph,
+    center: int,
+    depth: int,
+    direction: str = "both",
+    type_ids: Optional[Set[int]] = None,
+    max_nodes: int = 500,
+) -> Dict[str, Any]:
+    """Breadth-first k-hop neighbourhood of a node and the relations among it.
+
+    Returns entity IDs with their hop count, the relation IDs of the
+    induced subgraph (relations of the allowed types between returned
+    nodes) and whether ``max_nodes`` cut the traversal short.  The caller
+    holds ``graph.lock``.
+    """
+    hops = {center: 0}
+    frontier = [center]
+    truncated = False
+    for hop in range(1, depth + 1):
+        next_frontier = []
+        for node in frontier:
+            for _, other in graph.neighbors(node, direction, type_ids):
+                if other in hops:
+                    continue
+                if len(hops) >= max_nodes:
+                    truncated = True
+                    break
+                hops[other] = hop
+                next_frontier.append(other)
+            if truncated:
+                break
+        frontier = next_frontier
+        if truncated or not frontier:
+            break
+
+    relations = {
+        graph.rel_ids[rel]
+        for node in hops
+        for rel, other in graph.neighbors(node, "out", type_ids)
+        if other in hops
+    }
+    return {
+        "hops": {graph.node_ids[node]: hop for node, hop in hops.items()},
+        "relation_ids": sorted(relations),
+        "truncated": truncated,
+    }
+
+
+def neighborhood_response(database: Session, user_id: int, result: Dict[str, Any]) -> Dict[str, Any]:
+    """Turn a neighbourhood of IDs into entity and relation records."""
+    hops, relation_ids = result["hops"], result["relation_ids"]
+    entities = load_rows(database, Entity, user_id, sorted(hops))
+    relations = load_rows(database, Relation, user_id, relation_ids)
+    return {
+        "entities": [
+            {**entity_record(entities[entity_id]), "hops": hops[entity_id]}
+            for entity_id in sorted(hops, key=lambda entity_id: (hops[entity_id], entity_id))
+            if entity_id in entities
+        ],
+        "relations": [relation_record(relations[relation_id]) for relation_id in relation_ids if relation_id in relations],
+        "truncated": result["truncated"],
+    }
+
+
+def shortest_path(
+    graph: UserGraph,
+    source: int,
+    target: int,
+    max_len: int,
+    direction: str = "both",
+    type_ids: Optional[Set[int]] = None,
+    budget: Optional[SearchBudget] = None,
+    blocked_nodes: Set[int] = frozenset(),
+    blocked_rels: Set[int] = frozenset(),
+) -> Optional[GraphPath]:
+    """Shortest path of at most ``max_len`` relations, by bidirectional BFS.
+
+    Searches forward from the source and backward from the target, one whole
+    level of the smaller frontier at a time, so each side only goes about
+    half the path length deep.  Blocked
+    nodes and relations are skipped (used by ``k_shortest_paths``).
+    """
+    if source == target:
+        return [source], []
+    budget = budget or SearchBudget()
+    # node -> (previous node, relation, depth) on each side
+    forward = {source: (None, None, 0)}
+    backward = {target: (None, None, 0)}
+    forward_frontier, backward_frontier = [source], [target]
+    forward_depth = backward_depth = 0
+    while forward_frontier and backward_frontier and forward_depth + backward_depth < max_len:
+        if len(forward_frontier) <= len(backward_frontier):
+            visited, other, frontier, step = forward, backward, forward_frontier, direction
+        else:
+            visited, other, frontier, step = backward, forward, backward_frontier, REVERSED[direction]
+        best = None
+        next_frontier = []
+        for node in frontier:
+            depth = visited[node][2] + 1
+            for rel, neighbor in graph.neighbors(node, step, type_ids):
+                budget.spend()
+                if neighbor in visited or neighbor in blocked_nodes or rel in blocked_rels:
+                    continue
+                visited[neighbor] = (node, rel, depth)
+                next_frontier.append(neighbor)
+                if neighbor in other and (best is None or depth + other[neighbor][2] < best[0]):
+                    best = (depth + other[neighbor][2], neighbor)
+        if best is not None:
+            return _join(forward, backward, best[1])
+        if visited is forward:
+            forward_frontier, forward_depth = next_frontier, forward_depth + 1
+        else:
+            backward_frontier, backward_depth = next_frontier, backward_depth + 1
+    return None
+
+
+def _join(forward: Dict[int, tuple], backward: Dict[int, tuple], meeting: int) -> GraphPath:
+    nodes, rels = [meeting], []
+    node = meeting
+    while forward[node][0] is not None:
+        node, rel, _ = forward[node]
+        nodes.append(node)
+        rels.append(rel)
+    nodes.reverse()
+    rels.reverse()
+    node = meeting
+    while backward[node][0] is not None:
+        node, rel, _ = backward[node]
+        nodes.append(node)
+        rels.append(rel)
+    return nodes, rels
+
+
+def k_shortest_paths(
+    graph: UserGraph,
+    source: int,
+    target: int,
+    max_len: int,
+    direction: str = "both",
+    type_ids: Optional[Set[int]] = None,
+    budget: Optional[SearchBudget] = None,
+) -> Iterator[GraphPath]:
+    """Simple paths of at most ``max_len`` relations, shortest first (Yen's algorithm).
+
+    Paths are told apart by their relations, so parallel relations give
+    distinct paths.  Stop iterating once enough paths have been taken.
+    """
+    budget = budget or SearchBudget()
+    path = shortest_path(graph, source, target, max_len, direction, type_ids, budget)
+    if path is None:
+        return
+    found = [path]
+    seen = {tuple(path[1])}
+    candidates: List[Tuple[int, Tuple[int, ...], List[int]]] = []
+    while True:
+        yield path
+        nodes, rels = path
+        for spur in range(len(rels)):
+            root_rels = rels[:spur]
+            blocked_rels = {other[spur] for _, other in found if len(other) > spur and other[:spur] == root_rels}
+            branch = shortest_path(
+                graph, nodes[spur], target, max_len - spur, direction, type_ids, budget,
+                blocked_nodes=set(nodes[:spur]), blocked_rels=blocked_rels,
+            )
+            if branch is None:
+                continue
+            candidate = root_rels + branch[1]
+            if tuple(candidate) not in seen:
+                seen.add(tuple(candidate))
+                heapq.heappush(candidates, (len(candidate), tuple(candidate), nodes[:spur] + branch[0]))
+        if not candidates:
+            return
+        _, candidate, candidate_nodes = heapq.heappop(candidates)
+        path = (candidate_nodes, list(candidate))
+        found.append(path)
+
+
+def find_paths(
+    graph: UserGraph,
+    source: int,
+    target: int,
+    max_len: int,
+    k: int = 1,
+    direction: str = "both",
+    type_ids: Optional[Set[int]] = None,
+    budget: Optional[SearchBudget] = None,
+) -> Dict[str, Any]:
+    """Up to ``k`` shortest paths as entity and relation IDs.
+
+    When the budget runs out the paths found so far are returned with
+    ``budget_exhausted`` set.  The caller holds ``graph.lock``.
+    """
+    paths = []
+    exhausted = False
+    try:
+        for nodes, rels in k_shortest_paths(graph, source, target, max_len, direction, type_ids, budget):
+            paths.append({
+                "length": len(rels),
+                "entity_ids": [graph.node_ids[node] for node in nodes],
+                "relation_ids": [graph.rel_ids[rel] for rel in rels],
+            })
+            if len(paths) >= k:
+                break
+    except BudgetExceeded:
+        exhausted = True
+    return {"paths": paths, "budget_exhausted": exhausted}
+
+
+def paths_response(database: Session, user_id: int, result: Dict[str, Any]) -> Dict[str, Any]:
+    """Add the entity and relation records used by a set of paths."""
+    entity_ids = sorted({entity_id for path in result["paths"] for entity_id in path["entity_ids"]})
+    relation_ids = sorted({relation_id for path in result["paths"] for relation_id in path["relation_ids"]})
+    entities = load_rows(database, Entity, user_id, entity_ids)
+    relations = load_rows(database, Relation, user_id, relation_ids)
+    return {
+        **result,
+        "entities": [entity_record(entities[entity_id]) for entity_id in entity_ids if entity_id in entities],
+        "relations": [relation_record(relations[relation_id]) for relation_id in relation_ids if relation_id in relations],
+    }
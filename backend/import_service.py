@@ -0,0 +1,360 @@
+"""Bulk import of entities, relations and types for one user.
+
+Rows are buffered and written in batches with one multi-row INSERT each.
+Entity inserts return the new IDs (``INSERT ... RETURNING``) in parameter
+order, so IDs from the imported file are remapped in memory instead of
+flushing row by row.  Types are registered with one set-based upsert per
+table.  The caller owns the transaction; nothing is committed here.
+
+NdjsonParser and JsonDocumentParser turn a request body into records chunk by
+chunk, so streamed imports never hold more than one batch in memory.
+"""
+
+import codecs
+import json
+import os
+from typing import Any, Dict, Iterable, List, Optional, Set, Tuple
+
+from pydantic import ValidationError
+from sqlalchemy import insert
+from sqlalchemy.orm import Session
+
+import schemas
+from models import Entity, EntityType, Relation, RelationType, User
+from type_registry import recount_usage
+from version_pipeline import pipeline as version_pipeline
+from version_service import VersionService
+
+# Rows written per INSERT statement
+IMPORT_BATCH_SIZE = max(1, int(os.getenv("IMPORT_BATCH_SIZE", "1000")))
+
+# Largest single record (NDJSON line or array item) a streaming import accepts
+MAX_RECORD_BYTES = int(os.getenv("IMPORT_MAX_RECORD_BYTES", str(1024 * 1024)))
+
+# Arrays of an export document and the record kind of their items
+DOCUMENT_SECTIONS = {
+    "entities": "entity",
+    "relations": "relation",
+    "entity_types": "entity_type",
+    "relation_types": "relation_type",
+}
+
+# A parsed record: (kind, data, position in the input for error messages)
+ParsedRecord = Tuple[str, Any, str]
+
+
+ENTITY_COLUMNS = ("name", "type", "description")
+RELATION_COLUMNS = ("source_id", "target_id", "relation_type", "description")
+
+
+class ImportFormatError(ValueError):
+    """A streamed import is malformed or contains an invalid record."""
+
+
+def insert_ignoring_duplicates(database: Session, model, rows: List[Dict[str, Any]]) -> None:
+    """Insert type rows, skipping names the user already has."""
+    if not rows:
+        return
+    dialect = database.get_bind().dialect.name
+    if dialect == "postgresql":
+        from sqlalchemy.dialects.postgresql import insert as dialect_insert
+    elif dialect == "sqlite":
+        from sqlalchemy.dialects.sqlite import insert as dialect_insert
+    else:
+        # No portable upsert: filter out existing names first
+        names = [row["name"] for row in rows]
+        user_id = rows[0]["user_id"]
+        existing = {
+            name for (name,) in database.query(model.name).filter(model.user_id == user_id, model.name.in_(names))
+        }
+        rows = [row for row in rows if row["name"] not in existing]
+        if rows:
+            database.execute(insert(model), rows)
+        return
+    database.execute(dialect_insert(model).on_conflict_do_nothing(index_elements=["user_id", "name"]), rows)
+
+
+def record_import(database: Session, user: User, mode: str) -> None:
+    """Version an import as a full snapshot, after any pending automatic versions."""
+    version_pipeline.flush(database, user.id)
+    VersionService.create_version(database, f"Imported data ({mode})", "system", user)
+
+
+class BulkImporter:
+    """Writes imported rows for one user in batches.
+
+    Entities are added before the relations that reference them.  A
+    relation endpoint is resolved through the imported entity IDs first and
+    otherwise must be an existing entity of the user; relations that resolve
+    to neither are skipped.
+    """
+
+    def __init__(self, database: Session, user_id: int, batch_size: int = IMPORT_BATCH_SIZE):
+        self.database = database
+        self.user_id = user_id
+        self.batch_size = max(1, batch_size)
+        self.entity_id_map: Dict[Any, int] = {}
+        self.entity_type_names: Set[str] = set()
+        self.relation_type_names: Set[str] = set()
+        self.imported_entities = 0
+        self.imported_relations = 0
+        self.skipped = 0
+        self._entities: List[Dict[str, Any]] = []
+        self._entity_ids: List[Optional[Any]] = []
+        self._relations: List[Dict[str, Any]] = []
+
+    def clear_existing(self) -> None:
+        """Delete the user's entities and relations (replace mode); types are kept."""
+        self.database.query(Relation).filter(Relation.user_id == self.user_id).delete(synchronize_session=False)
+        self.database.query(Entity).filter(Entity.user_id == self.user_id).delete(synchronize_session=False)
+
+    def add_entity(self, entity: Dict[str, Any]) -> None:
+        self._entities.append({column: entity.get(column) for column in ENTITY_COLUMNS})
+        self._entity_ids.append(entity.get("id"))
+        self.entity_type_names.add(entity["type"])
+        if len(self._entities) >= self.batch_size:
+            self.flush_entities()
+
+    def add_entities(self, entities: Iterable[Dict[str, Any]]) -> None:
+        for entity in entities:
+            self.add_entity(entity)
+
+    def add_relation(self, relation: Dict[str, Any]) -> None:
+        self._relations.append({column: relation.get(column) for column in RELATION_COLUMNS})
+        self.relation_type_names.add(relation["relation_type"])
+        if len(self._relations) >= self.batch_size:
+            self.flush_relations()
+
+    def add_relations(self, relations: Iterable[Dict[str, Any]]) -> None:
+        for relation in relations:
+            self.add_relation(relation)
+
+    def add_record(self, kind: str, data: Any, position: str = "") -> None:
+        """Validate and add one streamed record (see ParsedRecord)."""
+        try:
+            if kind == "entity":
+                self.add_entity(schemas.EntityImport.model_validate(data).model_dump())
+            elif kind == "relation":
+                self.add_relation(schemas.RelationImport.model_validate(data).model_dump())
+            elif kind in ("entity_type", "relation_type"):
+                name = data.get("name") if isinstance(data, dict) else data
+                if not isinstance(name, str):
+                    raise ImportFormatError(f"{position}: type name must be a string")
+                names = self.entity_type_names if kind == "entity_type" else self.relation_type_names
+                names.add(name)
+            elif kind != "meta":
+                raise ImportFormatError(f"{position}: unknown record kind {kind!r}")
+        except ValidationError as e:
+            errors = "; ".join(f"{'.'.join(map(str, err['loc']))}: {err['msg']}" for err in e.errors())
+            raise ImportFormatError(f"{position}: invalid {kind}: {errors}")
+
+    def add_records(self, records: Iterable[ParsedRecord]) -> None:
+        for kind, data, position in records:
+            self.add_record(kind, data, position)
+
+    def add_entity_types(self, names: Iterable[str]) -> None:
+        self.entity_type_names.update(names)
+
+    def add_relation_types(self, names: Iterable[str]) -> None:
+        self.relation_type_names.update(names)
+
+    def flush_entities(self) -> None:
+        """Insert buffered entities and record their new IDs."""
+        if not self._entities:
+            return
+        rows = [dict(row, user_id=self.user_id) for row in self._entities]
+        new_ids = self.database.execute(
+            insert(Entity).returning(Entity.id, sort_by_parameter_order=True), rows
+        ).scalars().all()
+        for old_id, new_id in zip(self._entity_ids, new_ids):
+            if old_id is not None:
+                self.entity_id_map[old_id] = new_id
+        self.imported_entities += len(rows)
+        self._entities.clear()
+        self._entity_ids.clear()
+
+    def flush_relations(self) -> None:
+        """Insert buffered relations with their endpoints remapped."""
+        self.flush_entities()
+        if not self._relations:
+            return
+
+        # Endpoints that are not imported IDs must be entities the user already has
+        unmapped = {
+            endpoint
+            for row in self._relations
+            for endpoint in (row["source_id"], row["target_id"])
+            if endpoint not in self.entity_id_map
+        }
+        existing = set()
+        if unmapped:
+            existing = {
+                entity_id
+                for (entity_id,) in self.database.query(Entity.id).filter(
+                    Entity.id.in_(unmapped), Entity.user_id == self.user_id
+                )
+            }
+
+        rows = []
+        for row in self._relations:
+            source_id = self.entity_id_map.get(row["source_id"], row["source_id"])
+            target_id = self.entity_id_map.get(row["target_id"], row["target_id"])
+            if (source_id in existing or row["source_id"] in self.entity_id_map) and (
+                target_id in existing or row["target_id"] in self.entity_id_map
+            ):
+                rows.append(dict(row, source_id=source_id, target_id=target_id, user_id=self.user_id))
+            else:
+                self.skipped += 1
+        if rows:
+            self.database.execute(insert(Relation), rows)
+        self.imported_relations += len(rows)
+        self._relations.clear()
+
+    def finish(self) -> Dict[str, int]:
+        """Write everything still buffered, register the types used and count them."""
+        self.flush_relations()
+        insert_ignoring_duplicates(self.database, EntityType, [
+            {"name": name, "user_id": self.user_id} for name in sorted(self.entity_type_names) if name
+        ])
+        insert_ignoring_duplicates(self.database, RelationType, [
+            {"name": name, "user_id": self.user_id} for name in sorted(self.relation_type_names) if name
+        ])
+        recount_usage(self.database, self.user_id)
+        return {
+            "imported_entities": self.imported_entities,
+            "imported_relations": self.imported_relations,
+            "skipped": self.skipped,
+        }
+
+
+class NdjsonParser:
+    """Incremental parser for NDJSON imports.
+
+    Every line is one JSON object whose ``kind`` is ``entity``, ``relation``,
+    ``entity_type``, ``relation_type`` or ``meta``; the other keys are the
+    record's fields.  Entities must come before the relations that use them.
+    """
+
+    def __init__(self, max_record_bytes: int = MAX_RECORD_BYTES):
+        self.max_record_bytes = max_record_bytes
+        self._buffer = b""
+        self._line = 0
+
+    def feed(self, chunk: bytes) -> List[ParsedRecord]:
+        self._buffer += chunk
+        *lines, self._buffer = self._buffer.split(b"\n")
+        if len(self._buffer) > self.max_record_bytes:
+            raise ImportFormatError(f"line {self._line + len(lines) + 1}: record is too large")
+        return [record for record in map(self._parse_line, lines) if record is not None]
+
+    def close(self) -> List[ParsedRecord]:
+        line, self._buffer = self._buffer, b""
+        record = self._parse_line(line)
+        return [record] if record is not None else []
+
+    def _parse_line(self, line: bytes) -> Optional[ParsedRecord]:
+        self._line += 1
+        position = f"line {self._line}"
+        if not line.strip():
+            return None
+        try:
+            data = json.loads(line)
+        except ValueError as e:
+            raise ImportFormatError(f"{position}: invalid JSON: {e}")
+        if not isinstance(data, dict) or "kind" not in data:
+            raise ImportFormatError(f"{position}: expected an object with a kind")
+        return data.pop("kind"), data, position
+
+
+_INCOMPLETE = object()
+
+
+class JsonDocumentParser:
+    """Incremental parser for the JSON document written by the export endpoint.
+
+    Items of the ``entities``, ``relations``, ``entity_types`` and
+    ``relation_types`` arrays are returned as soon as they are complete, so
+    only one item is held in memory at a time.  Other keys are skipped.
+    """
+
+    def __init__(self, max_record_bytes: int = MAX_RECORD_BYTES):
+        self.max_record_bytes = max_record_bytes
+        self._decoder = codecs.getincrementaldecoder("utf-8")()
+        self._json = json.JSONDecoder()
+        self._buffer = ""
+        self._state = "start"
+        self._key = None
+        self._item = 0
+
+    def feed(self, chunk: bytes) -> List[ParsedRecord]:
+        self._buffer += self._decoder.decode(chunk)
+        records = self._parse(final=False)
+        if len(self._buffer) > self.max_record_bytes:
+            raise ImportFormatError(f"{self._key or 'document'} item {self._item + 1}: record is too large")
+        return records
+
+    def close(self) -> List[ParsedRecord]:
+        self._buffer += self._decoder.decode(b"", final=True)
+        records = self._parse(final=True)
+        if self._state != "end":
+            raise ImportFormatError("unexpected end of JSON document")
+        return records
+
+    def _decode(self, position: int, final: bool) -> Tuple[Any, int]:
+        try:
+            value, end = self._json.raw_decode(self._buffer, position)
+        except ValueError as e:
+            if final:
+                raise ImportFormatError(f"invalid JSON document: {e}")
+            return _INCOMPLETE, position
+        if end == len(self._buffer) and not final:
+            return _INCOMPLETE, position  # a number may continue in the next chunk
+        return value, end
+
+    def _parse(self, final: bool) -> List[ParsedRecord]:
+        records: List[ParsedRecord] = []
+        buffer = self._buffer
+        position = 0
+        while True:
+            while position < len(buffer) and buffer[position] in " \t\r\n":
+                position += 1
+            if position >= len(buffer):
+                break
+            char = buffer[position]
+            state = self._state
+
+            if state == "start" and char == "{":
+                self._state, position = "first_key", position + 1
+            elif state in ("first_key", "key") and char == '"':
+                value, position = self._decode(position, final)
+                if value is _INCOMPLETE:
+                    break
+                self._key, self._state = value, "colon"
+            elif state == "first_key" and char == "}":
+                self._state, position = "end", position + 1
+            elif state == "colon" and char == ":":
+                self._state, position = "value", position + 1
+            elif state == "value" and char == "[" and self._key in DOCUMENT_SECTIONS:
+                self._state, self._item, position = "first_item", 0, position + 1
+            elif state == "value":
+                value, position = self._decode(position, final)
+                if value is _INCOMPLETE:
+                    break
+                self._state = "after_value"
+            elif state == "first_item" and char == "]":
+                self._state, position = "after_value", position + 1
+            elif state in ("first_item", "item"):
+                value, position = self._decode(position, final)
+                if value is _INCOMPLETE:
+                    break
+                self._item += 1
+                records.append((DOCUMENT_SECTIONS[self._key], value, f"{self._key} item {self._item}"))
+                self._state = "after_item"
+            elif state == "after_item" and char in ",]":
+                self._state, position = ("item" if char == "," else "after_value"), position + 1
+            elif state == "after_value" and char in ",}":
+                self._state, position = ("key" if char == "," else "end"), position + 1
+            else:
+                raise ImportFormatError(f"invalid JSON document: unexpected {char!r}")
+        self._buffer = buffer[position:]
+        return records
@@ -0,0 +1,265 @@
+"""Background import/export jobs.
+
+``POST /jobs/import`` stores the uploaded body in ``JOB_STORAGE_DIR`` and
+``POST /jobs/export`` only records its parameters; both return a Job row at
+once and the work runs on a pool of ``JOB_WORKERS`` threads (``0`` runs jobs
+inline, which the tests use).  Each job works in its own session and reports
+progress through a second one, at most every ``JOB_PROGRESS_INTERVAL_SECONDS``,
+so ``GET /jobs/{id}`` sees progress before the job's own transaction commits.
+
+Finished jobs and their files are removed after ``JOB_RETENTION_HOURS``.
+Jobs that were queued or running when the process stopped are marked failed
+on the next start.
+"""
+
+import logging
+import os
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from typing import Any, Dict, Optional
+
+from sqlalchemy import func
+from sqlalchemy.orm import Session
+
+import db
+from export_service import GraphExporter, compress_chunks, use_snapshot_isolation
+from import_service import BulkImporter, JsonDocumentParser, NdjsonParser, record_import
+from models import Entity, Job, Relation, User
+
+logger = logging.getLogger(__name__)
+
+JOB_WORKERS = max(0, int(os.getenv("JOB_WORKERS", "2")))
+JOB_STORAGE_DIR = os.getenv("JOB_STORAGE_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), "job_files"))
+JOB_RETENTION_HOURS = float(os.getenv("JOB_RETENTION_HOURS", "24"))
+JOB_PROGRESS_INTERVAL_SECONDS = float(os.getenv("JOB_PROGRESS_INTERVAL_SECONDS", "1"))
+
+# Bytes read from an uploaded import file at a time
+JOB_READ_CHUNK_BYTES = 64 * 1024
+
+FINISHED_STATUSES = ("succeeded", "failed")
+COMPRESSION_SUFFIXES = {None: "", "gzip": ".gz", "zstd": ".zst"}
+
+
+def throughput(job: Job, now: Optional[datetime] = None) -> Optional[float]:
+    """Rows per second since the job started (until it finished)."""
+    if job.started_at is None:
+        return None
+    elapsed = ((job.finished_at or now or datetime.utcnow()) - job.started_at).total_seconds()
+    return job.rows_processed / elapsed if elapsed > 0 else None
+
+
+class ProgressReporter:
+    """Writes a job's progress from a separate session, throttled by time."""
+
+    def __init__(self, job_id: str, total: Optional[int] = None, interval: float = JOB_PROGRESS_INTERVAL_SECONDS):
+        self.job_id = job_id
+        self.total = total
+        self.interval = interval
+        self.rows = 0
+        self.fraction = 0.0
+        self._last_write = time.monotonic()
+
+    def advance(self, rows: int, fraction: Optional[float] = None) -> None:
+        self.rows += rows
+        if fraction is not None:
+            self.fraction = fraction
+        elif self.total:
+            self.fraction = min(1.0, self.rows / self.total)
+        if time.monotonic() - self._last_write >= self.interval:
+            self.write()
+
+    def write(self) -> None:
+        self._last_write = time.monotonic()
+        database = db.SessionLocal()
+        try:
+            database.query(Job).filter(Job.id == self.job_id).update(
+                {"rows_processed": self.rows, "progress": self.fraction}, synchronize_session=False
+            )
+            database.commit()
+        finally:
+            database.close()
+
+
+class JobRunner:
+    """Runs jobs on a thread pool and keeps their status rows up to date."""
+
+    def __init__(
+        self,
+        workers: int = JOB_WORKERS,
+        storage_dir: str = JOB_STORAGE_DIR,
+        retention_hours: float = JOB_RETENTION_HOURS,
+    ):
+        self.workers = workers
+        self.storage_dir = storage_dir
+        self.retention_hours = retention_hours
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._lock = threading.Lock()
+
+    # ----- Creating jobs -----
+
+    def file_path(self, job_id: str, suffix: str) -> str:
+        os.makedirs(self.storage_dir, exist_ok=True)
+        return os.path.join(self.storage_dir, f"{job_id}{suffix}")
+
+    def create_job(self, database: Session, user_id: int, kind: str, params: Dict[str, Any]) -> Job:
+        """Add a queued job row (committed by the caller once its input is stored)."""
+        job = Job(id=uuid.uuid4().hex, user_id=user_id, kind=kind, status="queued", params=params)
+        if kind == "import":
+            job.input_path = self.file_path(job.id, ".upload")
+        database.add(job)
+        return job
+
+    def submit(self, job_id: str) -> None:
+        """Run a committed job on the pool, or inline without workers."""
+        if self.workers == 0:
+            self.run_job(job_id)
+            return
+        with self._lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="job-worker")
+            self._executor.submit(self.run_job, job_id)
+
+    # ----- Running jobs -----
+
+    def run_job(self, job_id: str) -> None:
+        database = db.SessionLocal()
+        try:
+            job = database.query(Job).filter(Job.id == job_id, Job.status == "queued").first()
+            if job is None:
+                return
+            job.status = "running"
+            job.started_at = datetime.utcnow()
+            input_path = job.input_path
+            database.commit()
+
+            handler = self._run_import if job.kind == "import" else self._run_export
+            try:
+                rows, progress, result = handler(database, job)
+            except Exception as e:
+                database.rollback()
+                logger.exception("Job %s failed", job_id)
+                self._finish(database, job_id, "failed", error=str(e))
+            else:
+                self._finish(database, job_id, "succeeded", rows=rows, progress=progress, result=result)
+            finally:
+                self.remove_file(input_path)
+        finally:
+            database.close()
+
+    def _finish(self, database: Session, job_id: str, status: str, **fields) -> None:
+        job = database.query(Job).filter(Job.id == job_id).one()
+        job.status = status
+        job.finished_at = datetime.utcnow()
+        job.error = fields.get("error")
+        if "rows" in fields:
+            job.rows_processed = fields["rows"]
+            job.progress = fields["progress"]
+            job.result = fields["result"]
+        if status == "failed" and job.result_path:
+            self.remove_file(job.result_path)
+            job.result_path = None
+        database.commit()
+
+    def _run_import(self, database: Session, job: Job):
+        """Parse the uploaded file chunk by chunk into one import transaction."""
+        mode = job.params.get("mode", "merge")
+        parser = NdjsonParser() if job.params.get("format") == "ndjson" else JsonDocumentParser()
+        importer = BulkImporter(database, job.user_id)
+        reporter = ProgressReporter(job.id)
+        size = os.path.getsize(job.input_path)
+
+        if mode == "replace":
+            importer.clear_existing()
+        with open(job.input_path, "rb") as upload:
+            while chunk := upload.read(JOB_READ_CHUNK_BYTES):
+                records = parser.feed(chunk)
+                importer.add_records(records)
+                reporter.advance(len(records), upload.tell() / size if size else 1.0)
+        records = parser.close()
+        importer.add_records(records)
+        result = importer.finish()
+        database.commit()
+
+        user = database.query(User).filter(User.id == job.user_id).one()
+        record_import(database, user, mode)
+        return reporter.rows + len(records), 1.0, result
+
+    def _run_export(self, database: Session, job: Job):
+        """Write the export to a file, compressed if requested."""
+        format = job.params.get("format", "json")
+        compression = job.params.get("compression")
+        user_id = job.user_id
+        path = job.result_path = self.file_path(job.id, f".{format}{COMPRESSION_SUFFIXES[compression]}")
+        total = job.total_rows = sum(
+            database.query(func.count(model.id)).filter(model.user_id == user_id).scalar()
+            for model in (Entity, Relation)
+        )
+        reporter = ProgressReporter(job.id, total=total)
+        database.commit()
+
+        use_snapshot_isolation(database)
+        exporter = GraphExporter(database, user_id, on_rows=reporter.advance)
+        chunks = exporter.ndjson_chunks() if format == "ndjson" else exporter.json_chunks()
+        with open(path, "wb") as output:
+            for chunk in compress_chunks(chunks, compression):
+                output.write(chunk)
+        database.rollback()  # end the read transaction
+
+        result = {
+            "format": format,
+            "compression": compression,
+            "size": os.path.getsize(path),
+            "filename": os.path.basename(path).replace(job.id, "relation-map-export", 1),
+        }
+        return reporter.rows, 1.0, result
+
+    # ----- Housekeeping -----
+
+    @staticmethod
+    def remove_file(path: Optional[str]) -> None:
+        if path and os.path.exists(path):
+            os.remove(path)
+
+    def purge_expired(self, database: Session, now: Optional[datetime] = None) -> int:
+        """Delete finished jobs past the retention period, with their files."""
+        cutoff = (now or datetime.utcnow()) - timedelta(hours=self.retention_hours)
+        expired = database.query(Job).filter(Job.status.in_(FINISHED_STATUSES), Job.finished_at < cutoff).all()
+        for job in expired:
+            self.remove_file(job.result_path)
+            database.delete(job)
+        database.commit()
+        return len(expired)
+
+    def recover(self, database: Session) -> int:
+        """Fail jobs left queued or running by a previous process."""
+        stale = database.query(Job).filter(Job.status.in_(("queued", "running"))).all()
+        for job in stale:
+            self.remove_file(job.input_path)
+            self.remove_file(job.result_path)
+            job.status = "failed"
+            job.error = "Interrupted by a server restart"
+            job.finished_at = datetime.utcnow()
+            job.result_path = None
+        database.commit()
+        return len(stale)
+
+    def start(self) -> None:
+        database = db.SessionLocal()
+        try:
+            self.recover(database)
+            self.purge_expired(database)
+        finally:
+            database.close()
+
+    def stop(self) -> None:
+        """Finish running jobs; queued ones are failed by recover() on the next start."""
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=True, cancel_futures=True)
+
+
+runner = JobRunner()
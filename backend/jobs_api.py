@@ -0,0 +1,123 @@
+"""Background import/export job endpoints (see job_service)."""
+
+import os
+
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, status
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import FileResponse
+from sqlalchemy.orm import Session
+
+import models
+import schemas
+from auth import get_current_user
+from db import get_db
+from export_service import MEDIA_TYPES, available_encodings
+from job_service import runner, throughput
+
+router = APIRouter(prefix="/jobs", tags=["Jobs"])
+
+COMPRESSED_MEDIA_TYPES = {"gzip": "application/gzip", "zstd": "application/zstd"}
+
+
+def job_response(request: Request, job: models.Job) -> schemas.Job:
+    download_url = None
+    if job.status == "succeeded" and job.result_path:
+        download_url = str(request.url_for("download_job_result", job_id=job.id))
+    return schemas.Job(
+        id=job.id,
+        kind=job.kind,
+        status=job.status,
+        params=job.params,
+        progress=job.progress or 0.0,
+        rows_processed=job.rows_processed or 0,
+        total_rows=job.total_rows,
+        throughput=throughput(job),
+        error=job.error,
+        result=job.result,
+        download_url=download_url,
+        created_at=job.created_at,
+        started_at=job.started_at,
+        finished_at=job.finished_at,
+    )
+
+
+def get_user_job(database: Session, job_id: str, user_id: int) -> models.Job:
+    job = database.query(models.Job).filter(models.Job.id == job_id, models.Job.user_id == user_id).first()
+    if not job:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job
+
+
+def start_job(database: Session, job: models.Job) -> None:
+    """Commit a new job and hand it to the runner."""
+    database.commit()
+    runner.submit(job.id)
+    database.expire_all()  # an inline run updated the row from another session
+
+
+@router.post("/import", response_model=schemas.Job, status_code=status.HTTP_202_ACCEPTED)
+async def create_import_job(
+    request: Request,
+    mode: str = Query(default="merge", pattern="^(merge|replace)$"),
+    format: str = Query(default="ndjson", pattern="^(ndjson|json)$"),
+    database: Session = Depends(get_db),
+    current_user: models.User = Depends(get_current_user)
+):
+    """Store the body (NDJSON or an export JSON document) and import it in the background."""
+    await run_in_threadpool(runner.purge_expired, database)
+    job = runner.create_job(database, current_user.id, "import", {"mode": mode, "format": format})
+    try:
+        with open(job.input_path, "wb") as upload:
+            async for chunk in request.stream():
+                await run_in_threadpool(upload.write, chunk)
+    except Exception:
+        database.rollback()
+        runner.remove_file(job.input_path)
+        raise
+    await run_in_threadpool(start_job, database, job)
+    return job_response(request, job)
+
+
+@router.post("/export", response_model=schemas.Job, status_code=status.HTTP_202_ACCEPTED)
+def create_export_job(
+    request: Request,
+    format: str = Query(default="json", pattern="^(json|ndjson)$"),
+    compression: str | None = Query(default=None, pattern="^(gzip|zstd)$"),
+    database: Session = Depends(get_db),
+    current_user: models.User = Depends(get_current_user)
+):
+    """Write an export file in the background; download it from the job's download_url."""
+    if compression and compression not in available_encodings():
+        raise HTTPException(status_code=400, detail=f"Compression '{compression}' is not available")
+    runner.purge_expired(database)
+    job = runner.create_job(database, current_user.id, "export", {"format": format, "compression": compression})
+    start_job(database, job)
+    return job_response(request, job)
+
+
+@router.get("/{job_id}", response_model=schemas.Job)
+def read_job(
+    job_id: str,
+    request: Request,
+    database: Session = Depends(get_db),
+    current_user: models.User = Depends(get_current_user)
+):
+    """Status, progress, rows processed and throughput of a job."""
+    return job_response(request, get_user_job(database, job_id, current_user.id))
+
+
+@router.get("/{job_id}/result", name="download_job_result")
+def download_job_result(
+    job_id: str,
+    database: Session = Depends(get_db),
+    current_user: models.User = Depends(get_current_user)
+):
+    """Download the file written by a finished export job."""
+    job = get_user_job(database, job_id, current_user.id)
+    if job.status != "succeeded" or not job.result_path:
+        raise HTTPException(status_code=409, detail="Job has no result to download")
+    if not os.path.exists(job.result_path):
+        raise HTTPException(status_code=410, detail="Job result has expired")
+    compression = job.result.get("compression")
+    media_type = COMPRESSED_MEDIA_TYPES.get(compression) or MEDIA_TYPES[job.result["format"]]
+    return FileResponse(job.result_path, media_type=media_type, filename=job.result["filename"])
@@ -8,7 +8,12 @@ import db
 import api
 from auth_api import router as auth_router
 from admin_api import router as admin_router
+from jobs_api import router as jobs_router
 from auth import get_current_user, hash_password
+from version_pipeline import pipeline as version_pipeline
+from version_compactor import compactor as version_compactor
+from job_service import runner as job_runner
+from search_service import install_search_index
 import time
 from sqlalchemy.exc import OperationalError
 
@@ -21,6 +26,7 @@ app.include_router(auth_router, prefix="/api")
 app.include_router(auth_router)
 app.include_router(api.router, prefix="/api")
 app.include_router(admin_router, prefix="/api")
+app.include_router(jobs_router, prefix="/api")
 
 # CORS configuration
 app.add_middleware(
@@ -29,6 +35,7 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Next-Cursor", "ETag"],
 )
 
 # Database initialization
@@ -47,6 +54,7 @@ def on_startup():
         raise RuntimeError("Database unavailable after retries")
 
     models.Base.metadata.create_all(bind=db.engine)
+    install_search_index(db.engine)
 
     # Auto-create default admin when DB is empty
     database = db.SessionLocal()
@@ -65,9 +73,25 @@ def on_startup():
             )
             database.add(admin_user)
             database.commit()
+        # Deltas pending when the previous process stopped are lost
+        version_pipeline.resync(database)
     finally:
         database.close()
 
+    # Write automatic versions and thin out old ones in the background
+    version_pipeline.start()
+    version_compactor.start()
+    # Fail import/export jobs interrupted by a restart and drop expired ones
+    job_runner.start()
+
+
+@app.on_event("shutdown")
+def on_shutdown():
+    # Flush automatic versions that are still waiting for their debounce window
+    job_runner.stop()
+    version_compactor.stop()
+    version_pipeline.stop()
+
 
 @app.get("/")
 def read_root():
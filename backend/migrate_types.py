@@ -0,0 +1,76 @@
+"""
+Database migration script for the type registries.
+Adds usage_count to existing entity_types and relation_types tables, adds
+the type_id / relation_type_id references to entities and relations, and
+links and counts every user's entities and relations per type.
+"""
+
+import os
+import sys
+sys.path.insert(0, os.path.dirname(__file__))
+
+from sqlalchemy import inspect, text
+
+from db import engine, SessionLocal
+from models import Base, Entity, EntityType, Relation, RelationType, User
+from type_registry import REFERENCES, recount_usage
+
+
+def backfill_usage_counts(database) -> int:
+    """Link and recount the types of every user; returns the number of users"""
+    user_ids = [user_id for (user_id,) in database.query(User.id).order_by(User.id)]
+    for user_id in user_ids:
+        recount_usage(database, user_id)
+        database.commit()
+    return len(user_ids)
+
+
+def migrate_types():
+    """Bring existing type tables up to date with models.EntityType / RelationType"""
+    try:
+        print("🔄 Starting type usage migration...")
+
+        # Step 1: Create any missing tables
+        Base.metadata.create_all(bind=engine)
+
+        inspector = inspect(engine)
+        with engine.begin() as conn:
+            # Step 2: Types carry the number of rows using them
+            for model in (EntityType, RelationType):
+                table = model.__tablename__
+                columns = {col["name"] for col in inspector.get_columns(table)}
+                if "usage_count" not in columns:
+                    print(f"📦 Adding {table}.usage_count...")
+                    conn.execute(text(f"ALTER TABLE {table} ADD COLUMN usage_count INTEGER NOT NULL DEFAULT 0"))
+
+            # Step 3: Entities and relations reference their type by ID
+            for model, registry in ((Entity, EntityType), (Relation, RelationType)):
+                table, column = model.__tablename__, REFERENCES[model]
+                columns = {col["name"] for col in inspector.get_columns(table)}
+                if column not in columns:
+                    print(f"📦 Adding {table}.{column}...")
+                    conn.execute(text(
+                        f"ALTER TABLE {table} ADD COLUMN {column} INTEGER "
+                        f"REFERENCES {registry.__tablename__}(id) ON DELETE SET NULL"
+                    ))
+                    conn.execute(text(f"CREATE INDEX IF NOT EXISTS ix_{table}_{column} ON {table} ({column})"))
+
+        # Step 4: Link and count the rows written before the references existed
+        database = SessionLocal()
+        try:
+            counted = backfill_usage_counts(database)
+            print(f"✅ Linked and counted types for {counted} users")
+        finally:
+            database.close()
+
+        print("✨ Migration completed successfully!")
+
+    except Exception as e:
+        print(f"❌ Migration failed: {e}")
+        import traceback
+        traceback.print_exc()
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    migrate_types()
@@ -0,0 +1,131 @@
+"""
+Database migration script for version history storage.
+Adds the columns introduced for delta versions and compressed snapshots to an
+existing versions table, and converts legacy JSON snapshots to the compressed,
+content-addressed format.
+"""
+
+import os
+import sys
+sys.path.insert(0, os.path.dirname(__file__))
+
+from sqlalchemy import inspect, text
+
+from db import engine, SessionLocal
+from models import Base, Version
+from version_service import VersionService, count_after, decode_blob, unpack_hashes
+
+# Legacy snapshots are converted and committed in batches of this size
+BATCH_SIZE = 100
+
+
+def migrate_legacy_snapshots(database, batch_size: int = BATCH_SIZE) -> int:
+    """Convert uncompressed JSON snapshots to compressed manifests; returns the count"""
+    migrated = 0
+    while True:
+        batch = (
+            database.query(Version)
+            .filter(Version.snapshot.isnot(None), Version.snapshot_blob.is_(None))
+            .order_by(Version.id)
+            .limit(batch_size)
+            .all()
+        )
+        if not batch:
+            return migrated
+        for version in batch:
+            version.snapshot_blob = VersionService._write_snapshot(database, version.user_id, version.snapshot)
+            version.snapshot = None
+            version.is_snapshot = True
+        database.commit()
+        migrated += len(batch)
+
+
+def backfill_version_counts(database) -> int:
+    """Store entity/relation counts on versions written before they were tracked"""
+    user_ids = [
+        user_id
+        for (user_id,) in database.query(Version.user_id)
+        .filter(Version.entity_count.is_(None))
+        .distinct()
+    ]
+    updated = 0
+    for user_id in user_ids:
+        entity_count = relation_count = None
+        versions = (
+            database.query(Version)
+            .filter(Version.user_id == user_id)
+            .order_by(Version.version_number.asc())
+            .all()
+        )
+        for version in versions:
+            if version.entity_count is None:
+                if version.is_snapshot and version.snapshot_blob is not None:
+                    manifest = decode_blob(version.snapshot_blob)
+                    version.entity_count = len(unpack_hashes(manifest["entities"]))
+                    version.relation_count = len(unpack_hashes(manifest["relations"]))
+                elif version.is_snapshot:
+                    version.entity_count = len(version.snapshot.get("entities") or [])
+                    version.relation_count = len(version.snapshot.get("relations") or [])
+                elif version.changes is not None:
+                    version.entity_count = count_after(entity_count, version.changes.get("entities"))
+                    version.relation_count = count_after(relation_count, version.changes.get("relations"))
+                updated += 1
+            entity_count, relation_count = version.entity_count, version.relation_count
+        database.commit()
+    return updated
+
+
+def migrate_versions():
+    """Bring an existing versions table up to date with models.Version"""
+    try:
+        print("🔄 Starting version history migration...")
+
+        # Step 1: Create any missing tables
+        Base.metadata.create_all(bind=engine)
+
+        inspector = inspect(engine)
+        columns = {col["name"] for col in inspector.get_columns("versions")}
+        indexes = {index["name"] for index in inspector.get_indexes("versions")}
+
+        with engine.begin() as conn:
+            # Step 2: Delta versions have no snapshot of their own
+            if "is_snapshot" not in columns:
+                print("📦 Adding versions.is_snapshot...")
+                conn.execute(text("ALTER TABLE versions ADD COLUMN is_snapshot BOOLEAN NOT NULL DEFAULT TRUE"))
+            for column in ("entity_count", "relation_count"):
+                if column not in columns:
+                    print(f"📦 Adding versions.{column}...")
+                    conn.execute(text(f"ALTER TABLE versions ADD COLUMN {column} INTEGER"))
+            if "snapshot_blob" not in columns:
+                print("📦 Adding versions.snapshot_blob...")
+                blob_type = "BYTEA" if engine.dialect.name == "postgresql" else "BLOB"
+                conn.execute(text(f"ALTER TABLE versions ADD COLUMN snapshot_blob {blob_type}"))
+            if engine.dialect.name == "postgresql":
+                conn.execute(text("ALTER TABLE versions ALTER COLUMN snapshot DROP NOT NULL"))
+
+            # Step 3: Versions are looked up per user by version number
+            if "ix_versions_user_number" not in indexes:
+                print("📦 Creating index ix_versions_user_number...")
+                conn.execute(text("CREATE INDEX ix_versions_user_number ON versions (user_id, version_number)"))
+
+        # Step 4: Compress legacy snapshots into content-addressed records
+        database = SessionLocal()
+        try:
+            migrated = migrate_legacy_snapshots(database)
+            print(f"✅ Converted {migrated} legacy snapshots")
+            counted = backfill_version_counts(database)
+            print(f"✅ Stored graph sizes for {counted} versions")
+        finally:
+            database.close()
+
+        print("✨ Migration completed successfully!")
+
+    except Exception as e:
+        print(f"❌ Migration failed: {e}")
+        import traceback
+        traceback.print_exc()
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    migrate_versions()
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, ForeignKey, DateTime, JSON, Text, Boolean, UniqueConstraint
+from sqlalchemy import Column, Integer, String, ForeignKey, DateTime, JSON, Text, Boolean, UniqueConstraint, Index, LargeBinary, Float
 from sqlalchemy.orm import declarative_base, relationship
 from datetime import datetime
 
@@ -21,6 +21,8 @@ class User(Base):
     entity_types = relationship("EntityType", back_populates="owner", cascade="all, delete-orphan")
     relation_types = relationship("RelationType", back_populates="owner", cascade="all, delete-orphan")
     versions = relationship("Version", back_populates="owner", cascade="all, delete-orphan")
+    snapshot_records = relationship("SnapshotRecord", back_populates="owner", cascade="all, delete-orphan")
+    jobs = relationship("Job", back_populates="owner", cascade="all, delete-orphan")
     audit_logs_as_actor = relationship("AuditLog", foreign_keys="AuditLog.actor_user_id", back_populates="actor")
     audit_logs_as_target = relationship("AuditLog", foreign_keys="AuditLog.target_user_id", back_populates="target")
 
@@ -30,9 +32,12 @@ class Entity(Base):
     user_id = Column(Integer, ForeignKey("users.id", ondelete="CASCADE"), nullable=False)
     name = Column(String, nullable=False)
     type = Column(String, nullable=False)  # e.g. 'person', 'organization'
+    # Registry entry of the type (type_registry); the name above is kept in sync
+    type_id = Column(Integer, ForeignKey("entity_types.id", ondelete="SET NULL"), nullable=True, index=True)
     description = Column(String, nullable=True)
     
     owner = relationship("User", back_populates="entities")
+    type_entry = relationship("EntityType")
     outgoing_relations = relationship("Relation", back_populates="source", foreign_keys='Relation.source_id', cascade="all, delete-orphan")
     incoming_relations = relationship("Relation", back_populates="target", foreign_keys='Relation.target_id', cascade="all, delete-orphan")
 
@@ -43,9 +48,12 @@ class Relation(Base):
     source_id = Column(Integer, ForeignKey("entities.id", ondelete="CASCADE"), nullable=False)
     target_id = Column(Integer, ForeignKey("entities.id", ondelete="CASCADE"), nullable=False)
     relation_type = Column(String, nullable=False)  # e.g. 'friend', 'member', etc.
+    # Registry entry of the type (type_registry); the name above is kept in sync
+    relation_type_id = Column(Integer, ForeignKey("relation_types.id", ondelete="SET NULL"), nullable=True, index=True)
     description = Column(String, nullable=True)
 
     owner = relationship("User", back_populates="relations")
+    type_entry = relationship("RelationType")
     source = relationship("Entity", foreign_keys=[source_id], back_populates="outgoing_relations")
     target = relationship("Entity", foreign_keys=[target_id], back_populates="incoming_relations")
 
@@ -55,6 +63,7 @@ class EntityType(Base):
     id = Column(Integer, primary_key=True, index=True)
     user_id = Column(Integer, ForeignKey("users.id", ondelete="CASCADE"), nullable=False)
     name = Column(String, nullable=False)
+    usage_count = Column(Integer, nullable=False, default=0, server_default="0")  # Entities of this type (type_registry)
     
     # Composite index for efficient lookups
     __table_args__ = (UniqueConstraint('user_id', 'name', name='uq_entity_type_user_name'),)
@@ -67,6 +76,7 @@ class RelationType(Base):
     id = Column(Integer, primary_key=True, index=True)
     user_id = Column(Integer, ForeignKey("users.id", ondelete="CASCADE"), nullable=False)
     name = Column(String, nullable=False)
+    usage_count = Column(Integer, nullable=False, default=0, server_default="0")  # Relations of this type (type_registry)
     
     # Composite unique constraint per user
     __table_args__ = (UniqueConstraint('user_id', 'name', name='uq_relation_type_user_name'),)
@@ -81,13 +91,60 @@ class Version(Base):
     version_number = Column(Integer, nullable=False)
     created_at = Column(DateTime, default=datetime.utcnow)
     description = Column(String, nullable=True)
-    snapshot = Column(JSON, nullable=False)
+    # Legacy uncompressed snapshot; new snapshots are stored in snapshot_blob
+    snapshot = Column(JSON(none_as_null=True), nullable=True)
+    # Compressed manifest of a full snapshot (see version_service); only written
+    # every VERSION_SNAPSHOT_INTERVAL versions
+    snapshot_blob = Column(LargeBinary, nullable=True)
+    # Delta against the previous version (added/changed/removed records)
     changes = Column(JSON, nullable=True)
+    is_snapshot = Column(Boolean, default=True, nullable=False)
     created_by = Column(String, default="system")
+    # Size of the graph at this version, stored when the version is written
+    entity_count = Column(Integer, nullable=True)
+    relation_count = Column(Integer, nullable=True)
+
+    # Versions are always looked up per user by version number
+    __table_args__ = (Index('ix_versions_user_number', 'user_id', 'version_number'),)
     
     owner = relationship("User", back_populates="versions")
 
 
+class SnapshotRecord(Base):
+    """Content-addressed entity/relation record shared by version snapshots."""
+    __tablename__ = "snapshot_records"
+    id = Column(Integer, primary_key=True, index=True)
+    user_id = Column(Integer, ForeignKey("users.id", ondelete="CASCADE"), nullable=False)
+    hash = Column(String(32), nullable=False)  # truncated sha256 of the canonical JSON record
+    data = Column(LargeBinary, nullable=False)  # compressed canonical JSON record
+
+    __table_args__ = (UniqueConstraint('user_id', 'hash', name='uq_snapshot_record_user_hash'),)
+
+    owner = relationship("User", back_populates="snapshot_records")
+
+
+class Job(Base):
+    """Background import/export job (see job_service)."""
+    __tablename__ = "jobs"
+    id = Column(String(32), primary_key=True)  # uuid4 hex, not guessable
+    user_id = Column(Integer, ForeignKey("users.id", ondelete="CASCADE"), nullable=False, index=True)
+    kind = Column(String, nullable=False)  # 'import' | 'export'
+    status = Column(String, nullable=False, default="queued")  # 'queued' | 'running' | 'succeeded' | 'failed'
+    params = Column(JSON, nullable=True)  # e.g. {"mode": "merge", "format": "ndjson"}
+    rows_processed = Column(Integer, nullable=False, default=0)
+    total_rows = Column(Integer, nullable=True)  # known up front for exports only
+    progress = Column(Float, nullable=False, default=0.0)  # 0.0 - 1.0
+    error = Column(Text, nullable=True)
+    result = Column(JSON, nullable=True)  # import summary, or export file details
+    input_path = Column(String, nullable=True)  # uploaded import file
+    result_path = Column(String, nullable=True)  # export file to download
+    created_at = Column(DateTime, default=datetime.utcnow)
+    started_at = Column(DateTime, nullable=True)
+    finished_at = Column(DateTime, nullable=True)
+
+    owner = relationship("User", back_populates="jobs")
+
+
 class AuditLog(Base):
     __tablename__ = "audit_logs"
     id = Column(Integer, primary_key=True, index=True)
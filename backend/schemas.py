@@ -1,5 +1,5 @@
 from pydantic import BaseModel, ConfigDict, EmailStr, Field, validator
-from typing import Optional, List, Dict, Any
+from typing import Annotated, Optional, List, Dict, Any, Literal, Union
 from datetime import datetime
 
 # ===== User & Authentication Schemas =====
@@ -76,6 +76,43 @@ class TypeCreate(BaseModel):
     name: str
 
 
+# Upper bound on operations accepted by one POST /batch request
+MAX_BATCH_OPERATIONS = 10000
+
+class BatchEntityOperation(BaseModel):
+    kind: Literal["entity"]
+    op: Literal["create", "update", "delete"]
+    id: Optional[Union[int, str]] = None  # Target of update/delete: a real ID or a temp_id from this batch
+    temp_id: Optional[str] = None  # Client-side ID for create, usable by later operations
+    name: Optional[str] = None
+    type: Optional[str] = None
+    description: Optional[str] = None
+
+class BatchRelationOperation(BaseModel):
+    kind: Literal["relation"]
+    op: Literal["create", "update", "delete"]
+    id: Optional[Union[int, str]] = None
+    temp_id: Optional[str] = None
+    source_id: Optional[Union[int, str]] = None  # Real entity ID or temp_id of an entity in this batch
+    target_id: Optional[Union[int, str]] = None
+    relation_type: Optional[str] = None
+    description: Optional[str] = None
+
+BatchOperation = Annotated[Union[BatchEntityOperation, BatchRelationOperation], Field(discriminator="kind")]
+
+class BatchRequest(BaseModel):
+    operations: List[BatchOperation] = Field(..., max_length=MAX_BATCH_OPERATIONS)
+    description: Optional[str] = None  # Description of the version the batch produces
+
+class BatchResponse(BaseModel):
+    ok: bool = True
+    id_map: Dict[str, int]  # temp_id -> ID of the created row
+    entities: List[Entity]  # Created and updated entities
+    relations: List[Relation]  # Created and updated relations
+    deleted_entity_ids: List[int]
+    deleted_relation_ids: List[int]  # Including relations removed with their entities
+
+
 class AdminUserList(BaseModel):
     total: int
     items: List[UserResponse]
@@ -114,9 +151,128 @@ class VersionListItem(BaseModel):
     created_at: datetime
     description: Optional[str] = None
     created_by: str
+    entity_count: Optional[int] = None
+    relation_count: Optional[int] = None
     model_config = ConfigDict(from_attributes=True)
 
 
+class VersionDiffItem(BaseModel):
+    section: str
+    op: str
+    key: Union[int, str]
+    record: Optional[Dict[str, Any]] = None
+
+
+class VersionDiff(BaseModel):
+    from_version_id: int
+    to_version_id: int
+    summary: Dict[str, Dict[str, int]]
+    total: int
+    offset: int
+    items: List[VersionDiffItem]
+    next_offset: Optional[int] = None
+
+
+class EntitySuggestion(BaseModel):
+    id: int
+    name: str
+    type: str
+
+
+class NeighborhoodEntity(Entity):
+    hops: int  # Distance from the center entity
+
+
+class Neighborhood(BaseModel):
+    center_id: int
+    depth: int
+    entities: List[NeighborhoodEntity]  # Nearest first
+    relations: List[Relation]  # Relations between the returned entities
+    truncated: bool = False  # The node limit was reached before depth
+
+
+class Path(BaseModel):
+    length: int  # Number of relations
+    entity_ids: List[int]  # From source to target
+    relation_ids: List[int]
+
+
+class PathResult(BaseModel):
+    source_id: int
+    target_id: int
+    paths: List[Path]  # Shortest first; empty when not connected within max_len
+    entities: List[Entity]  # Entities on any of the paths
+    relations: List[Relation]
+    budget_exhausted: bool = False  # The search was cut short; more or shorter paths may exist
+
+
+class SearchHit(BaseModel):
+    kind: str  # "entity" or "relation"
+    id: int
+    score: float  # Relevance within its match kind
+    match: str  # "word" (every term as a word prefix) or "fuzzy"
+    entity: Optional[Entity] = None
+    relation: Optional[Relation] = None
+
+
+class SearchResults(BaseModel):
+    query: str
+    results: List[SearchHit]  # Word matches by relevance, then fuzzy matches
+    next_offset: Optional[int] = None  # Offset of the next page, if any
+
+
+class EntityScore(BaseModel):
+    id: int
+    name: str
+    score: float
+
+
+class DegreeCount(BaseModel):
+    degree: int  # Relations in and out (a self-relation counts twice)
+    count: int  # Entities with that degree
+
+
+class DegreeStats(BaseModel):
+    distribution: List[DegreeCount]
+    mean: float
+    max: int
+    top: List[EntityScore]
+
+
+class ComponentStats(BaseModel):
+    count: int  # Weakly connected components
+    largest: List[int]  # Sizes of the largest components
+    isolated: int  # Entities without relations
+
+
+class PageRankStats(BaseModel):
+    top: List[EntityScore]
+    iterations: int
+
+
+class BetweennessStats(BaseModel):
+    top: List[EntityScore]  # Normalized, relation direction ignored
+    samples: int  # Source entities the estimate rests on
+    exact: bool  # Every entity was a source
+
+
+class Analytics(BaseModel):
+    version_number: int
+    entity_count: int
+    relation_count: int
+    degree: DegreeStats
+    components: ComponentStats
+    pagerank: PageRankStats
+    betweenness: BetweennessStats
+
+
+class ChangeSet(BaseModel):
+    since: int
+    version_number: int  # Version the changes lead to; pass it as the next since
+    full_reload: bool = False  # The since version is gone; reload the whole graph
+    changes: Optional[Dict[str, Any]] = None  # Delta by section and op, as stored on versions
+
+
 class Version(BaseModel):
     id: int
     version_number: int
@@ -127,3 +283,20 @@ class Version(BaseModel):
     created_by: str
     model_config = ConfigDict(from_attributes=True)
 
+
+
+class Job(BaseModel):
+    id: str
+    kind: str
+    status: str
+    params: Optional[Dict[str, Any]] = None
+    progress: float
+    rows_processed: int
+    total_rows: Optional[int] = None
+    throughput: Optional[float] = None  # Rows per second
+    error: Optional[str] = None
+    result: Optional[Dict[str, Any]] = None
+    download_url: Optional[str] = None  # Set once an export has finished
+    created_at: datetime
+    started_at: Optional[datetime] = None
+    finished_at: Optional[datetime] = None
@@ -0,0 +1,194 @@
+"""Ranked full-text and fuzzy search over entities and relations.
+
+Entity names and descriptions and relation descriptions are indexed by the
+database itself:
+
+- PostgreSQL: GIN expression indexes over ``to_tsvector('simple', ...)``
+  (entity names weighted above descriptions) for word and prefix matches,
+  and pg_trgm GIN indexes for fuzzy matches ranked by trigram similarity.
+- SQLite: external-content FTS5 tables kept in sync by triggers, one with
+  the unicode61 tokenizer (words, prefixes, bm25 ranking) and one with the
+  trigram tokenizer, which matches substrings (inside words and in text
+  without spaces such as Japanese).
+
+``install_search_index`` creates them and is safe to run on every start.
+Every query term is matched as a prefix; fuzzy matches are only looked up
+when the word matches do not fill the requested page, and rank after them.
+"""
+
+import re
+from typing import Any, Dict, List, Sequence, Tuple
+
+from sqlalchemy import text
+from sqlalchemy.engine import Connection, Engine
+from sqlalchemy.orm import Session
+
+from graph_queries import load_rows
+from models import Entity, Relation
+from version_service import entity_record, relation_record
+
+# Words of a query that are searched for
+MAX_QUERY_TERMS = 8
+# Trigram matching needs at least this many characters
+MIN_FUZZY_LENGTH = 3
+
+KINDS = ("entity", "relation")
+
+ENTITY_TSVECTOR = (
+    "(setweight(to_tsvector('simple', coalesce(name, '')), 'A') || "
+    "setweight(to_tsvector('simple', coalesce(description, '')), 'B'))"
+)
+RELATION_TSVECTOR = "to_tsvector('simple', coalesce(description, ''))"
+
+POSTGRES_DDL = (
+    "CREATE EXTENSION IF NOT EXISTS pg_trgm",
+    f"CREATE INDEX IF NOT EXISTS ix_entities_search ON entities USING gin ({ENTITY_TSVECTOR})",
+    "CREATE INDEX IF NOT EXISTS ix_entities_name_trgm ON entities USING gin (name gin_trgm_ops)",
+    f"CREATE INDEX IF NOT EXISTS ix_relations_search ON relations USING gin ({RELATION_TSVECTOR})",
+    "CREATE INDEX IF NOT EXISTS ix_relations_description_trgm ON relations USING gin (description gin_trgm_ops)",
+)
+
+# FTS5 table -> (content table, indexed columns, tokenizer)
+SQLITE_FTS_TABLES = {
+    "entity_search": ("entities", ("name", "description"), "unicode61 remove_diacritics 2"),
+    "entity_trigram": ("entities", ("name",), "trigram"),
+    "relation_search": ("relations", ("description",), "unicode61 remove_diacritics 2"),
+    "relation_trigram": ("relations", ("description",), "trigram"),
+}
+
+
+def _sqlite_ddl(connection: Connection) -> None:
+    existing = {
+        name for (name,) in connection.execute(text("SELECT name FROM sqlite_master WHERE type = 'table'"))
+    }
+    for fts, (content, columns, tokenizer) in SQLITE_FTS_TABLES.items():
+        column_list = ", ".join(columns)
+        new_values = ", ".join(f"new.{column}" for column in columns)
+        old_values = ", ".join(f"old.{column}" for column in columns)
+        insert_new = f"INSERT INTO {fts}(rowid, {column_list}) VALUES (new.id, {new_values});"
+        delete_old = f"INSERT INTO {fts}({fts}, rowid, {column_list}) VALUES ('delete', old.id, {old_values});"
+        connection.execute(text(
+            f"CREATE VIRTUAL TABLE IF NOT EXISTS {fts} USING fts5("
+            f"{column_list}, content='{content}', content_rowid='id', tokenize='{tokenizer}')"
+        ))
+        connection.execute(text(f"CREATE TRIGGER IF NOT EXISTS {fts}_ai AFTER INSERT ON {content} BEGIN {insert_new} END"))
+        connection.execute(text(f"CREATE TRIGGER IF NOT EXISTS {fts}_ad AFTER DELETE ON {content} BEGIN {delete_old} END"))
+        connection.execute(text(
+            f"CREATE TRIGGER IF NOT EXISTS {fts}_au AFTER UPDATE OF {column_list} ON {content} "
+            f"BEGIN {delete_old} {insert_new} END"
+        ))
+        if fts not in existing:
+            # Index the rows written before the table existed
+            connection.execute(text(f"INSERT INTO {fts}({fts}) VALUES ('rebuild')"))
+
+
+def install_search_index(engine: Engine) -> None:
+    """Create the search indexes, triggers and extensions that are missing."""
+    with engine.begin() as connection:
+        if engine.dialect.name == "postgresql":
+            for statement in POSTGRES_DDL:
+                connection.execute(text(statement))
+        elif engine.dialect.name == "sqlite":
+            _sqlite_ddl(connection)
+
+
+def query_terms(query: str) -> List[str]:
+    return re.findall(r"\w+", query.lower())[:MAX_QUERY_TERMS]
+
+
+def _word_matches(database: Session, kind: str, user_id: int, terms: Sequence[str], limit: int) -> List[Tuple[float, int]]:
+    """(score, id) of rows containing every term as a word prefix, best first."""
+    table = "entities" if kind == "entity" else "relations"
+    if database.get_bind().dialect.name == "postgresql":
+        vector = ENTITY_TSVECTOR if kind == "entity" else RELATION_TSVECTOR
+        statement = text(
+            f"SELECT id, ts_rank({vector}, query) AS score "
+            f"FROM {table}, to_tsquery('simple', :query) AS query "
+            f"WHERE user_id = :user_id AND {vector} @@ query "
+            "ORDER BY score DESC, id LIMIT :limit"
+        )
+        # Terms are \w+ runs, so they need no further quoting
+        parameters = {"query": " & ".join(f"{term}:*" for term in terms)}
+    else:
+        fts = f"{kind}_search"
+        weights = "10.0, 1.0" if kind == "entity" else "1.0"
+        statement = text(
+            f"SELECT t.id, -bm25({fts}, {weights}) AS score "
+            f"FROM {fts} JOIN {table} AS t ON t.id = {fts}.rowid "
+            f"WHERE {fts} MATCH :query AND t.user_id = :user_id "
+            "ORDER BY score DESC, t.id LIMIT :limit"
+        )
+        parameters = {"query": " ".join(f'"{term}"*' for term in terms)}
+    rows = database.execute(statement, {**parameters, "user_id": user_id, "limit": limit})
+    return [(float(score), row_id) for row_id, score in rows]
+
+
+def _fuzzy_matches(database: Session, kind: str, user_id: int, query: str, limit: int) -> List[Tuple[float, int]]:
+    """(score, id) of rows whose name (entities) or description (relations) resembles the query."""
+    table, column = ("entities", "name") if kind == "entity" else ("relations", "description")
+    if database.get_bind().dialect.name == "postgresql":
+        statement = text(
+            f"SELECT id, similarity({column}, :query) AS score FROM {table} "
+            f"WHERE user_id = :user_id AND {column} % :query "
+            "ORDER BY score DESC, id LIMIT :limit"
+        )
+        parameters = {"query": query}
+    else:
+        # Substring match in id order: bm25 over trigrams would rank every row sharing one
+        fts = f"{kind}_trigram"
+        statement = text(
+            f"SELECT t.id, 0.0 AS score FROM {fts} JOIN {table} AS t ON t.id = {fts}.rowid "
+            f"WHERE {fts} MATCH :query AND t.user_id = :user_id "
+            f"ORDER BY {fts}.rowid LIMIT :limit"
+        )
+        parameters = {"query": '"' + query.replace('"', '""') + '"'}
+    rows = database.execute(statement, {**parameters, "user_id": user_id, "limit": limit})
+    return [(float(score), row_id) for row_id, score in rows]
+
+
+def search(
+    database: Session,
+    user_id: int,
+    query: str,
+    kinds: Sequence[str] = KINDS,
+    fuzzy: bool = True,
+    limit: int = 20,
+    offset: int = 0,
+) -> Dict[str, Any]:
+    """A page of ranked hits: word matches by relevance, then fuzzy matches."""
+    terms = query_terms(query)
+    wanted = offset + limit + 1  # one more tells whether another page follows
+    hits = []
+    if terms:
+        for kind in kinds:
+            hits += [(0, -score, kind, row_id) for score, row_id in _word_matches(database, kind, user_id, terms, wanted)]
+        hits.sort()
+    stripped = query.strip()
+    if fuzzy and len(hits) < wanted and len(stripped) >= MIN_FUZZY_LENGTH:
+        seen = {(kind, row_id) for _, _, kind, row_id in hits}
+        fuzzy_hits = [
+            (1, -score, kind, row_id)
+            for kind in kinds
+            for score, row_id in _fuzzy_matches(database, kind, user_id, stripped, wanted + len(seen))
+            if (kind, row_id) not in seen
+        ]
+        hits += sorted(fuzzy_hits)
+
+    page = hits[offset:offset + limit]
+    records = {
+        "entity": load_rows(database, Entity, user_id, [row_id for _, _, kind, row_id in page if kind == "entity"]),
+        "relation": load_rows(database, Relation, user_id, [row_id for _, _, kind, row_id in page if kind == "relation"]),
+    }
+    results = []
+    for tier, score, kind, row_id in page:
+        row = records[kind].get(row_id)
+        if row is None:
+            continue
+        hit = {"kind": kind, "id": row_id, "score": -score, "match": "fuzzy" if tier else "word"}
+        hit[kind] = entity_record(row) if kind == "entity" else relation_record(row)
+        results.append(hit)
+    return {
+        "query": query,
+        "results": results,
+        "next_offset": offset + limit if len(hits) > offset + limit else None,
+    }
@@ -0,0 +1,140 @@
+"""In-memory typeahead index of each active user's entity names.
+
+A NameIndex keeps one sorted list of ``(key, entity id)`` entries with a key
+for every word start of each name (casefolded), so "lid" finds
+"Alice Liddell"; a prefix lookup is one binary search followed by a scan of
+the matching entries.  Indexes are loaded on first use and kept current from
+the deltas of committed edits, like the graph index (see graph_index), whose
+loading, invalidation and memory budget they share.  Edits that keep a name
+only update its type; a delta renaming more than ``GRAPH_INDEX_COMPACT_RATIO``
+of the entities rebuilds the sorted list once instead of shifting it per key.
+"""
+
+import os
+import re
+import threading
+from bisect import bisect_left, insort
+from typing import Any, Dict, Iterable, List, Tuple
+
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+
+from graph_index import GRAPH_INDEX_COMPACT_RATIO, LOAD_FETCH_SIZE, MIN_COMPACT_THRESHOLD, GraphIndex
+from models import Entity
+
+SUGGEST_INDEX_MEMORY_MB = float(os.getenv("SUGGEST_INDEX_MEMORY_MB", "128"))
+SUGGEST_INDEX_MAX_USERS = int(os.getenv("SUGGEST_INDEX_MAX_USERS", "1000"))
+
+# Word starts of a name that get a key
+MAX_KEYS_PER_NAME = 8
+
+
+def name_keys(name: str) -> List[str]:
+    """Casefolded suffixes of a name starting at each of its words."""
+    folded = name.casefold()
+    keys = []
+    for word in re.finditer(r"\S+", folded):
+        if folded[word.start():] not in keys:
+            keys.append(folded[word.start():])
+        if len(keys) == MAX_KEYS_PER_NAME:
+            break
+    return keys
+
+
+class NameIndex:
+    """Sorted name keys of one user's entities."""
+
+    def __init__(self, entities: Iterable[Tuple[int, str, str]] = ()):
+        self.lock = threading.RLock()
+        self._entities: Dict[int, Tuple[str, str]] = {}  # id -> (name, type)
+        for entity_id, name, entity_type in entities:
+            self._entities[entity_id] = (name, entity_type)
+        self._rebuild()
+
+    def _rebuild(self) -> None:
+        entries = [
+            (key, entity_id) for entity_id, (name, _) in self._entities.items() for key in name_keys(name)
+        ]
+        entries.sort()
+        self._entries: List[Tuple[str, int]] = entries
+
+    def suggest(self, prefix: str, limit: int = 10) -> List[Dict[str, Any]]:
+        """Entities with a word of their name starting with ``prefix``, by matching key."""
+        key = prefix.strip().casefold()
+        results = []
+        seen = set()
+        with self.lock:
+            for position in range(bisect_left(self._entries, (key,)), len(self._entries)):
+                entry_key, entity_id = self._entries[position]
+                if not entry_key.startswith(key):
+                    break
+                if entity_id in seen:
+                    continue
+                seen.add(entity_id)
+                name, entity_type = self._entities[entity_id]
+                results.append({"id": entity_id, "name": name, "type": entity_type})
+                if len(results) == limit:
+                    break
+        return results
+
+    def apply_changes(self, changes: Dict[str, Any]) -> None:
+        """Apply a version delta; applying the same delta twice has no further effect."""
+        entities = changes.get("entities") or {}
+        removed = {entity_id for entity_id in entities.get("removed", []) if entity_id in self._entities}
+        renamed = []
+        for record in entities.get("added", []) + entities.get("changed", []):
+            current = self._entities.get(record["id"])
+            if current is not None and current[0] == record["name"] and record["id"] not in removed:
+                self._entities[record["id"]] = (record["name"], record["type"])  # keys are unchanged
+            else:
+                renamed.append(record)
+
+        if len(removed) + len(renamed) > max(MIN_COMPACT_THRESHOLD, GRAPH_INDEX_COMPACT_RATIO * len(self._entities)):
+            for entity_id in removed:
+                del self._entities[entity_id]
+            for record in renamed:
+                self._entities[record["id"]] = (record["name"], record["type"])
+            self._rebuild()
+            return
+        for entity_id in removed:
+            self._remove(entity_id)
+        for record in renamed:
+            self._remove(record["id"])
+            self._entities[record["id"]] = (record["name"], record["type"])
+            for key in name_keys(record["name"]):
+                insort(self._entries, (key, record["id"]))
+
+    def _remove(self, entity_id: int) -> None:
+        entity = self._entities.pop(entity_id, None)
+        if entity is None:
+            return
+        for key in name_keys(entity[0]):
+            position = bisect_left(self._entries, (key, entity_id))
+            if position < len(self._entries) and self._entries[position] == (key, entity_id):
+                del self._entries[position]
+
+    @property
+    def entity_count(self) -> int:
+        return len(self._entities)
+
+    @property
+    def nbytes(self) -> int:
+        """Rough memory footprint: a tuple and key string per entry, a dict slot per entity."""
+        return 120 * len(self._entries) + 200 * len(self._entities)
+
+
+def load_name_index(database: Session, user_id: int) -> NameIndex:
+    """Build a user's name index from the entities table (one query)."""
+    rows = database.execute(
+        select(Entity.id, Entity.name, Entity.type)
+        .where(Entity.user_id == user_id)
+        .execution_options(yield_per=LOAD_FETCH_SIZE)
+    )
+    return NameIndex(tuple(row) for row in rows)
+
+
+index = GraphIndex(
+    memory_budget_bytes=int(SUGGEST_INDEX_MEMORY_MB * 1024 * 1024),
+    max_users=SUGGEST_INDEX_MAX_USERS,
+    loader=load_name_index,
+)
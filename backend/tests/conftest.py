@@ -9,10 +9,17 @@ from sqlalchemy.orm import sessionmaker
 from fastapi.testclient import TestClient
 import sys
 import os
+import tempfile
 
 # Add parent directory to path to allow imports
 sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
+# Write one automatic version per edit so tests can count versions
+os.environ.setdefault("AUTO_VERSION_DEBOUNCE_SECONDS", "0")
+# Run import/export jobs inline, with their files in a scratch directory
+os.environ.setdefault("JOB_WORKERS", "0")
+os.environ.setdefault("JOB_STORAGE_DIR", tempfile.mkdtemp(prefix="relation-map-jobs-"))
+
 # Import database module before app to set up test engine
 import db
 from models import Base
@@ -50,7 +57,15 @@ db.SessionLocal = TestingSessionLocal
 # Now import app after database is configured for testing
 from main import app
 from db import get_db
-from auth import hash_password, create_access_token
+from auth import hash_password, create_access_token, user_cache
+from version_pipeline import pipeline as version_pipeline
+import version_service
+import analytics_service
+from graph_index import index as graph_index
+from suggest_index import index as suggest_index
+from search_service import install_search_index
+
+install_search_index(TEST_ENGINE)
 
 
 # ===== Database Fixtures =====
@@ -70,6 +85,12 @@ def db_session(db_engine):
     
     # Cleanup - clear all data between tests for test isolation
     session.rollback()
+    version_pipeline.reset()
+    version_service._diff_cache.clear()
+    graph_index.clear()
+    suggest_index.clear()
+    analytics_service._cache.clear()
+    user_cache.clear()
     for table in reversed(Base.metadata.sorted_tables):
         session.execute(table.delete())
     session.commit()
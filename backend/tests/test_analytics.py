@@ -0,0 +1,154 @@
+"""
+Analytics Tests.
+Tests the sparse-matrix metrics against direct computations and the cached endpoint.
+"""
+
+import itertools
+import random
+import time
+
+import numpy as np
+
+import analytics_service
+from analytics_service import betweenness, compute_analytics, edge_list, pagerank
+from graph_index import UserGraph
+
+
+def random_graph(count: int = 30, relations: int = 60, seed: int = 3) -> UserGraph:
+    rng = random.Random(seed)
+    return UserGraph(
+        range(1, count + 1),
+        [(rid, rng.randint(1, count), rng.randint(1, count), "r") for rid in range(relations)],
+    )
+
+
+def brute_force_betweenness(count: int, sources, targets) -> np.ndarray:
+    """Betweenness by enumerating the shortest paths of every pair (undirected)."""
+    neighbors = {node: set() for node in range(count)}
+    for source, target in zip(sources, targets):
+        if source != target:
+            neighbors[source].add(target)
+            neighbors[target].add(source)
+
+    def distances(start):
+        seen, frontier = {start: 0}, [start]
+        while frontier:
+            next_frontier = []
+            for node in frontier:
+                for other in neighbors[node]:
+                    if other not in seen:
+                        seen[other] = seen[node] + 1
+                        next_frontier.append(other)
+            frontier = next_frontier
+        return seen
+
+    dist = [distances(node) for node in range(count)]
+    paths = np.zeros((count, count))
+    for start in range(count):
+        paths[start, start] = 1
+        for node in sorted(dist[start], key=dist[start].get)[1:]:
+            paths[start, node] = sum(paths[start, p] for p in neighbors[node] if dist[start].get(p) == dist[start][node] - 1)
+    scores = np.zeros(count)
+    for s, t in itertools.combinations(range(count), 2):
+        if t not in dist[s]:
+            continue
+        for v in range(count):
+            if v not in (s, t) and v in dist[s] and t in dist[v] and dist[s][v] + dist[v][t] == dist[s][t]:
+                scores[v] += paths[s, v] * paths[v, t] / paths[s, t]
+    return scores / ((count - 1) * (count - 2) / 2)
+
+
+class TestMetrics:
+    """Test the vectorized metrics."""
+
+    def test_edge_list_skips_removed_rows(self):
+        graph = UserGraph([1, 2, 3], [(10, 1, 2, "r"), (11, 2, 3, "r")])
+        graph.apply_changes({"entities": {"removed": [1]}})
+
+        node_ids, sources, targets = edge_list(graph)
+
+        assert node_ids.tolist() == [2, 3]
+        assert (sources.tolist(), targets.tolist()) == ([0], [1])
+
+    def test_exact_betweenness_matches_brute_force(self):
+        node_ids, sources, targets = edge_list(random_graph())
+
+        scores, used = betweenness(len(node_ids), sources, targets, samples=len(node_ids))
+
+        assert used == len(node_ids)
+        np.testing.assert_allclose(scores, brute_force_betweenness(len(node_ids), sources, targets), atol=1e-12)
+
+    def test_sampled_betweenness_and_deadline(self):
+        node_ids, sources, targets = edge_list(random_graph(count=200, relations=600))
+        exact, _ = betweenness(len(node_ids), sources, targets, samples=200)
+
+        sampled, used = betweenness(len(node_ids), sources, targets, samples=100)
+
+        assert used == 100
+        assert np.argmax(sampled) in np.argsort(exact)[-5:]
+        assert betweenness(len(node_ids), sources, targets, deadline=time.monotonic() - 1) == (None, 0)
+
+    def test_pagerank_matches_dense_eigenvector(self):
+        node_ids, sources, targets = edge_list(random_graph())
+        count = len(node_ids)
+
+        rank, _ = pagerank(count, sources, targets, tolerance=1e-12, max_iterations=1000)
+
+        # Dense Google matrix: dangling entities link to every entity
+        links = np.zeros((count, count))
+        np.add.at(links, (targets, sources), 1.0)
+        out_degree = links.sum(axis=0)
+        links[:, out_degree == 0] = 1.0
+        google = 0.85 * links / links.sum(axis=0) + 0.15 / count
+        values, vectors = np.linalg.eig(google)
+        expected = np.real(vectors[:, np.argmax(np.real(values))])
+        np.testing.assert_allclose(rank, expected / expected.sum(), atol=1e-9)
+
+    def test_degree_and_components(self):
+        graph = UserGraph([1, 2, 3, 4, 5, 6], [(10, 1, 2, "r"), (11, 2, 3, "r"), (12, 3, 1, "r"), (13, 4, 5, "r")])
+
+        result = compute_analytics(graph, top=2)
+
+        assert result["degree"]["distribution"] == [
+            {"degree": 0, "count": 1}, {"degree": 1, "count": 2}, {"degree": 2, "count": 3}
+        ]
+        assert result["degree"]["top"] == [(1, 2.0), (2, 2.0)]
+        assert result["components"] == {"count": 3, "largest": [3, 2], "isolated": 1}
+        assert result["betweenness"]["exact"] is True
+
+    def test_empty_graph(self):
+        result = compute_analytics(UserGraph())
+
+        assert (result["entity_count"], result["components"]["count"]) == (0, 0)
+
+
+class TestAnalyticsEndpoint:
+    """Test GET /api/analytics."""
+
+    def test_returns_metrics_with_names(self, authenticated_client, sample_entities, sample_relations):
+        response = authenticated_client.get("/api/analytics")
+
+        assert response.status_code == 200
+        data = response.json()
+        assert data["entity_count"] == 3
+        assert data["components"]["count"] == 1
+        assert {entry["name"] for entry in data["pagerank"]["top"]} == {"Alice", "Bob", "Charlie"}
+        assert abs(sum(entry["score"] for entry in data["pagerank"]["top"]) - 1) < 1e-6
+
+    def test_cached_until_next_version(self, authenticated_client, sample_entities, monkeypatch):
+        """Test that repeated loads reuse the result and an edit recomputes it."""
+        calls = []
+        compute = analytics_service.compute_analytics
+        monkeypatch.setattr(analytics_service, "compute_analytics", lambda *args: calls.append(1) or compute(*args))
+
+        first = authenticated_client.get("/api/analytics")
+        assert authenticated_client.get("/api/analytics").json() == first.json()
+        assert authenticated_client.get(
+            "/api/analytics", headers={"If-None-Match": first.headers["etag"]}
+        ).status_code == 304
+        authenticated_client.post("/api/entities/", json={"name": "Dave", "type": "person"})
+        second = authenticated_client.get("/api/analytics")
+
+        assert len(calls) == 2
+        assert second.json()["entity_count"] == 4
+        assert second.headers["etag"] != first.headers["etag"]
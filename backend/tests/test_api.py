@@ -263,6 +263,32 @@ class TestEntityCRUD:
         entities = response.json()
         assert len(entities) == 2
 
+    def test_read_entities_with_cursor(self, authenticated_client):
+        """Test walking all entities with after/X-Next-Cursor."""
+        for i in range(5):
+            authenticated_client.post("/api/entities/", json={"name": f"Entity{i}", "type": "person"})
+
+        names, cursor = [], None
+        while True:
+            url = "/api/entities/?limit=2" + (f"&after={cursor}" if cursor else "")
+            response = authenticated_client.get(url)
+            names += [e["name"] for e in response.json()]
+            cursor = response.headers.get("x-next-cursor")
+            if cursor is None:
+                break
+
+        assert names == [f"Entity{i}" for i in range(5)]
+
+    def test_read_all_entities_streamed(self, authenticated_client, sample_entities):
+        """Test that all=true returns every entity beyond the page size."""
+        for i in range(3):
+            authenticated_client.post("/api/entities/", json={"name": f"Extra{i}", "type": "person"})
+
+        response = authenticated_client.get("/api/entities/?all=true&limit=1")
+
+        assert len(response.json()) == len(sample_entities) + 3
+        assert "x-next-cursor" not in response.headers
+
 
 class TestRelationCRUD:
     """Test Relation CRUD operations."""
@@ -319,6 +345,16 @@ class TestRelationCRUD:
         assert response.status_code == 200
         relations = response.json()
         assert len(relations) == 2
+
+    def test_read_relations_pages_and_stream(self, authenticated_client, sample_relations):
+        """Test the relation cursor and the all=true stream."""
+        first = authenticated_client.get("/api/relations/?limit=1")
+        rest = authenticated_client.get(f"/api/relations/?after={first.headers['x-next-cursor']}&limit=100")
+        streamed = authenticated_client.get("/api/relations/?all=true").json()
+
+        ids = [r["id"] for r in first.json() + rest.json()]
+        assert ids == sorted(r.id for r in sample_relations)
+        assert [r["id"] for r in streamed] == ids
     
     def test_read_relation_by_id_success(self, authenticated_client, sample_user, sample_entities):
         """Test reading a specific relation by ID."""
@@ -383,6 +419,136 @@ class TestRelationCRUD:
         assert get_response.status_code == 404
 
 
+class TestBatchEndpoint:
+    """Test POST /api/batch."""
+
+    def test_batch_creates_graph_with_temp_ids(self, authenticated_client):
+        """Test that relations can reference entities created earlier in the batch."""
+        payload = {
+            "operations": [
+                {"kind": "entity", "op": "create", "temp_id": "a", "name": "Alice", "type": "person"},
+                {"kind": "entity", "op": "create", "temp_id": "b", "name": "Acme", "type": "organization"},
+                {"kind": "relation", "op": "create", "temp_id": "r", "source_id": "a", "target_id": "b",
+                 "relation_type": "member"},
+            ]
+        }
+        response = authenticated_client.post("/api/batch", json=payload)
+        assert response.status_code == 200
+        data = response.json()
+
+        relation = authenticated_client.get(f"/api/relations/{data['id_map']['r']}").json()
+        assert relation["source_id"] == data["id_map"]["a"]
+        assert relation["target_id"] == data["id_map"]["b"]
+        assert set(authenticated_client.get("/api/relations/types").json()) == {"member"}
+
+    def test_batch_produces_one_version(self, authenticated_client, sample_entities):
+        """Test that a mixed batch is recorded as a single version delta."""
+        alice, bob, charlie = sample_entities
+        payload = {
+            "description": "Bulk edit",
+            "operations": [
+                {"kind": "entity", "op": "create", "temp_id": "d", "name": "Dave", "type": "person"},
+                {"kind": "entity", "op": "update", "id": bob.id, "name": "Robert"},
+                {"kind": "entity", "op": "delete", "id": charlie.id},
+                {"kind": "relation", "op": "create", "source_id": alice.id, "target_id": "d",
+                 "relation_type": "friend"},
+            ],
+        }
+        data = authenticated_client.post("/api/batch", json=payload).json()
+
+        versions = authenticated_client.get("/api/versions").json()
+        assert [v["description"] for v in versions] == ["Bulk edit"]
+        version = authenticated_client.get(f"/api/versions/{versions[0]['id']}").json()
+        assert sorted(e["name"] for e in version["snapshot"]["entities"]) == ["Alice", "Dave", "Robert"]
+        assert data["deleted_entity_ids"] == [charlie.id]
+        assert [e["description"] for e in data["entities"] if e["name"] == "Robert"] == [bob.description]
+
+    def test_batch_delete_cascades_relations(self, authenticated_client, sample_entities, sample_relations):
+        """Test that deleting an entity reports the relations removed with it."""
+        bob = sample_entities[1]
+        payload = {"operations": [{"kind": "entity", "op": "delete", "id": bob.id}]}
+
+        data = authenticated_client.post("/api/batch", json=payload).json()
+
+        assert data["deleted_relation_ids"] == sorted(r.id for r in sample_relations)
+        assert authenticated_client.get("/api/relations/").json() == []
+
+    def test_created_then_deleted_rows_cancel_out(self, authenticated_client):
+        """Test rows created and deleted in the same batch leave no trace."""
+        payload = {
+            "operations": [
+                {"kind": "entity", "op": "create", "temp_id": "a", "name": "A", "type": "person"},
+                {"kind": "entity", "op": "create", "temp_id": "b", "name": "B", "type": "person"},
+                {"kind": "relation", "op": "create", "source_id": "a", "target_id": "b", "relation_type": "knows"},
+                {"kind": "entity", "op": "delete", "id": "a"},
+            ]
+        }
+        data = authenticated_client.post("/api/batch", json=payload).json()
+
+        assert data["deleted_entity_ids"] == [] and data["deleted_relation_ids"] == []
+        assert list(data["id_map"]) == ["b"]
+        assert [e["name"] for e in authenticated_client.get("/api/entities/").json()] == ["B"]
+        assert authenticated_client.get("/api/relations/").json() == []
+
+    def test_invalid_operation_rolls_back_batch(self, authenticated_client):
+        """Test that one bad operation leaves the database untouched."""
+        payload = {
+            "operations": [
+                {"kind": "entity", "op": "create", "temp_id": "a", "name": "A", "type": "person"},
+                {"kind": "relation", "op": "create", "source_id": "a", "target_id": "missing",
+                 "relation_type": "knows"},
+            ]
+        }
+        response = authenticated_client.post("/api/batch", json=payload)
+
+        assert response.status_code == 400
+        assert response.json()["detail"] == "Operation 1: Entity missing not found"
+        assert authenticated_client.get("/api/entities/").json() == []
+        assert authenticated_client.get("/api/versions").json() == []
+
+    def test_batch_moves_relation_created_in_batch(self, authenticated_client, sample_entities):
+        """Test that a relation created earlier in the batch can change its endpoints."""
+        alice, bob, charlie = sample_entities
+        payload = {
+            "description": "Move relation",
+            "operations": [
+                {"kind": "entity", "op": "create", "temp_id": "t1", "name": "Dave", "type": "person"},
+                {"kind": "relation", "op": "create", "temp_id": "r1", "source_id": "t1", "target_id": alice.id,
+                 "relation_type": "friend"},
+                {"kind": "relation", "op": "update", "id": "r1", "target_id": bob.id},
+                {"kind": "relation", "op": "update", "id": "r1", "source_id": charlie.id},
+            ],
+        }
+        response = authenticated_client.post("/api/batch", json=payload)
+
+        assert response.status_code == 200
+        data = response.json()
+        relation_id = data["id_map"]["r1"]
+        assert [(r["id"], r["source_id"], r["target_id"]) for r in data["relations"]] == [
+            (relation_id, charlie.id, bob.id)
+        ]
+        versions = authenticated_client.get("/api/versions").json()
+        assert [v["description"] for v in versions] == ["Move relation"]
+        snapshot = authenticated_client.get(f"/api/versions/{versions[0]['id']}").json()["snapshot"]
+        assert [(r["id"], r["source_id"], r["target_id"]) for r in snapshot["relations"]] == [
+            (relation_id, charlie.id, bob.id)
+        ]
+
+    def test_batch_cannot_touch_other_users_rows(self, authenticated_client, db_session, sample_users):
+        """Test that IDs of another user's rows are not found."""
+        from models import Entity
+
+        other = Entity(name="Other", type="person", user_id=sample_users[0].id)
+        db_session.add(other)
+        db_session.commit()
+
+        payload = {"operations": [{"kind": "entity", "op": "delete", "id": other.id}]}
+        response = authenticated_client.post("/api/batch", json=payload)
+
+        assert response.status_code == 400
+        assert db_session.query(Entity).filter(Entity.id == other.id).count() == 1
+
+
 class TestDataManagement:
     """Test data export, import, and reset operations."""
     
@@ -453,6 +619,38 @@ class TestDataManagement:
         assert len(entities) == 2
 
 
+    def test_import_data_merge_remaps_relations(self, authenticated_client, sample_entities):
+        """Test that merged relations point at the newly created entities."""
+        import_payload = {
+            "version": "1.0",
+            "entities": [
+                {"id": 1, "name": "Import1", "type": "person"},
+                {"id": 2, "name": "Import2", "type": "person"},
+            ],
+            "relations": [
+                {"source_id": 1, "target_id": 2, "relation_type": "knows"},
+                {"source_id": 1, "target_id": 424242, "relation_type": "knows"},
+            ],
+        }
+
+        result = authenticated_client.post("/api/import?mode=merge", json=import_payload).json()
+
+        assert (result["imported_entities"], result["imported_relations"], result["skipped"]) == (2, 1, 1)
+        entities = {e["id"]: e["name"] for e in authenticated_client.get("/api/entities/").json()}
+        relation = authenticated_client.get("/api/relations/").json()[0]
+        assert (entities[relation["source_id"]], entities[relation["target_id"]]) == ("Import1", "Import2")
+        assert len(entities) == len(sample_entities) + 2
+
+    def test_import_data_records_version(self, authenticated_client):
+        """Test that an import is captured by the version history."""
+        import_payload = {"version": "1.0", "entities": [{"name": "Imported", "type": "person"}], "relations": []}
+        authenticated_client.post("/api/import?mode=replace", json=import_payload)
+
+        versions = authenticated_client.get("/api/versions").json()
+
+        assert versions[0]["description"] == "Imported data (replace)"
+        assert versions[0]["entity_count"] == 1
+
 class TestTypeManagement:
     """Test type renaming and deletion operations."""
 
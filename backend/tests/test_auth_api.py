@@ -4,6 +4,11 @@ Tests user registration, login, profile retrieval, and logout endpoints.
 """
 
 import pytest
+from sqlalchemy import event
+
+import auth
+import models
+from auth import create_access_token, hash_password, user_cache
 
 
 class TestUserRegistration:
@@ -324,3 +329,74 @@ class TestAuthenticationFlow:
         assert profile1.status_code == 200
         assert profile2.status_code == 200
         assert profile1.json()["username"] == profile2.json()["username"]
+
+
+class TestCurrentUserCache:
+    """Test the authenticated-user cache behind get_current_user."""
+
+    @staticmethod
+    def user_queries(db_engine, request):
+        statements = []
+
+        def record(conn, cursor, statement, *args):
+            if "FROM users" in statement:
+                statements.append(statement)
+
+        event.listen(db_engine, "before_cursor_execute", record)
+        try:
+            assert request().status_code == 200
+        finally:
+            event.remove(db_engine, "before_cursor_execute", record)
+        return len(statements)
+
+    def test_repeated_requests_skip_the_user_query(self, authenticated_client, db_engine, sample_user):
+        request = lambda: authenticated_client.get("/api/auth/me")
+
+        assert self.user_queries(db_engine, request) == 1
+        assert self.user_queries(db_engine, request) == 0
+        assert request().json()["username"] == sample_user.username
+
+    def test_expired_entries_are_reloaded(self, authenticated_client, db_engine, monkeypatch):
+        monkeypatch.setattr(auth, "USER_CACHE_TTL_SECONDS", 0)
+        request = lambda: authenticated_client.get("/api/auth/me")
+
+        assert self.user_queries(db_engine, request) == 1
+        assert self.user_queries(db_engine, request) == 1
+
+    def test_deactivated_user_is_rejected(self, authenticated_client, db_session, sample_user):
+        assert authenticated_client.get("/api/auth/me").status_code == 200
+        assert user_cache.get(sample_user.id) is not None
+
+        sample_user.is_active = False
+        db_session.commit()
+
+        assert user_cache.get(sample_user.id) is None
+        assert authenticated_client.get("/api/auth/me").status_code == 401
+
+    def test_user_deleted_by_admin_is_rejected(self, client, db_session, sample_user, auth_headers):
+        admin = models.User(
+            username="admin", email="admin@example.com", password_hash=hash_password("pass123"),
+            is_active=True, is_admin=True,
+        )
+        db_session.add(admin)
+        db_session.commit()
+        admin_headers = {"Authorization": f"Bearer {create_access_token({'sub': admin.id})}"}
+        assert client.get("/api/auth/me", headers=auth_headers).status_code == 200
+
+        response = client.delete(f"/api/admin/users/{sample_user.id}", headers=admin_headers)
+
+        assert response.status_code == 200
+        assert client.get("/api/auth/me", headers=auth_headers).status_code == 401
+
+    def test_invalidation_during_lookup_is_not_cached(self, db_session, sample_user, monkeypatch):
+        """Test that a row read before an invalidation is not cached after it."""
+        query = db_session.query
+
+        def invalidating_query(*args):
+            auth.invalidate_user(sample_user.id)
+            return query(*args)
+
+        monkeypatch.setattr(db_session, "query", invalidating_query)
+
+        assert auth.load_active_user(db_session, sample_user.id) is sample_user
+        assert user_cache.get(sample_user.id) is None
@@ -0,0 +1,115 @@
+"""
+Change Feed Tests.
+Tests the in-process pub/sub, the server-sent event stream and version events.
+"""
+
+import asyncio
+import json
+import threading
+
+import pytest
+
+from change_feed import ChangeFeed, event_stream, format_event
+from change_feed import feed as change_feed
+from version_service import VersionService
+
+
+def parse_event(chunk: bytes) -> dict:
+    data = [line for line in chunk.decode().splitlines() if line.startswith("data: ")]
+    return json.loads(data[0][len("data: "):])
+
+
+class TestChangeFeed:
+    """Test publishing and subscribing."""
+
+    @pytest.mark.asyncio
+    async def test_publish_from_thread_reaches_only_that_user(self):
+        """Test that events published from a worker thread arrive on the loop."""
+        feed = ChangeFeed()
+        mine, other = feed.subscribe(1), feed.subscribe(2)
+
+        thread = threading.Thread(target=feed.publish, args=(1, {"type": "version", "version_number": 5}))
+        thread.start()
+        thread.join()
+
+        assert (await asyncio.wait_for(mine.get(), timeout=1))["version_number"] == 5
+        await asyncio.sleep(0)
+        assert other.queue.empty()
+
+    @pytest.mark.asyncio
+    async def test_slow_subscriber_gets_resync(self):
+        """Test that an overflowing queue is replaced by one resync event."""
+        feed = ChangeFeed(queue_size=2)
+        subscription = feed.subscribe(1)
+
+        for number in range(5):
+            feed.publish(1, {"type": "version", "version_number": number})
+        await asyncio.sleep(0.01)
+
+        assert (await subscription.get())["type"] == "resync"
+
+    @pytest.mark.asyncio
+    async def test_event_stream_sends_catch_up_events_and_heartbeats(self):
+        """Test the SSE framing of the stream and unsubscribing when it ends."""
+        feed = ChangeFeed()
+        subscription = feed.subscribe(1)
+        stream = event_stream(feed, subscription, {"type": "changes", "version_number": 3}, heartbeat_seconds=0.01)
+
+        assert await stream.__anext__() == b"retry: 3000\n\n"
+        first = await stream.__anext__()
+        assert first.startswith(b"event: changes\nid: 3\n")
+        assert await stream.__anext__() == b": keep-alive\n\n"
+        feed.publish(1, {"type": "version", "version_number": 4})
+        assert parse_event(await stream.__anext__())["version_number"] == 4
+
+        await stream.aclose()
+        assert feed.subscriber_count(1) == 0
+
+    def test_format_event_without_version(self):
+        assert format_event({"type": "resync"}) == b'event: resync\ndata: {"type": "resync"}\n\n'
+
+
+class TestVersionEvents:
+    """Test that written versions are published."""
+
+    @pytest.mark.asyncio
+    async def test_create_version_publishes_event(self, db_session, sample_user):
+        """Test that events carry the version number and the one before it."""
+        subscription = change_feed.subscribe(sample_user.id)
+        try:
+            VersionService.create_version(db_session, "First", "system", sample_user)
+            VersionService.create_version(
+                db_session, "Second", "system", sample_user,
+                {"entities": {"removed": [1]}},
+            )
+            first = await asyncio.wait_for(subscription.get(), timeout=1)
+            second = await asyncio.wait_for(subscription.get(), timeout=1)
+        finally:
+            change_feed.unsubscribe(subscription)
+
+        assert (first["version_number"], first["previous_version_number"], first["changes"]) == (1, 0, None)
+        assert (second["version_number"], second["previous_version_number"]) == (2, 1)
+        assert second["changes"] == {"entities": {"removed": [1]}}
+
+    @pytest.mark.asyncio
+    async def test_checkpoint_publishes_empty_delta(self, authenticated_client, db_session, sample_user):
+        """Test that a checkpoint keeps the indexes and clients' graphs instead of reloading them."""
+        from graph_index import index as graph_index
+
+        authenticated_client.post("/api/entities/", json={"name": "A", "type": "person"})
+        graph_index.get(db_session, sample_user.id)
+        subscription = change_feed.subscribe(sample_user.id)
+        try:
+            checkpoint = authenticated_client.post("/api/versions/create-checkpoint?description=cp").json()
+            event = await asyncio.wait_for(subscription.get(), timeout=1)
+        finally:
+            change_feed.unsubscribe(subscription)
+
+        assert (event["version_number"], event["changes"]) == (checkpoint["version_number"], {})
+        assert graph_index.is_loaded(sample_user.id)
+        version = VersionService.get_version(db_session, checkpoint["id"], sample_user.id)
+        assert version.is_snapshot
+        assert [e["name"] for e in VersionService.get_snapshot(db_session, version)["entities"]] == ["A"]
+
+    def test_stream_requires_authentication(self, client):
+        assert client.get("/api/changes/stream").status_code in (401, 403)
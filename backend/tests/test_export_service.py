@@ -0,0 +1,79 @@
+"""
+Streaming Export Tests.
+Tests chunked serialization, format selection and content encoding of the export.
+"""
+
+import json
+
+from export_service import GraphExporter, negotiate_encoding
+
+
+class TestGraphExporter:
+    """Test GraphExporter serialization."""
+
+    def test_json_chunks_form_one_document(self, db_session, sample_user, sample_entities, sample_relations):
+        """Test that a document split into many chunks is valid JSON."""
+        exporter = GraphExporter(db_session, sample_user.id, fetch_size=1)
+
+        chunks = list(exporter.json_chunks())
+        data = json.loads(b"".join(chunks))
+
+        assert len(chunks) > 5
+        assert list(data) == ["version", "exported_at", "entities", "relations", "entity_types", "relation_types"]
+        assert [e["name"] for e in data["entities"]] == ["Alice", "Bob", "Charlie"]
+        assert len(data["relations"]) == len(sample_relations)
+        assert data["relation_types"] == sorted({r.relation_type for r in sample_relations})
+
+    def test_type_names_include_unregistered_types(self, db_session, sample_user, sample_entities, sample_entity_type):
+        """Test that types used by rows are exported even without a type record."""
+        exporter = GraphExporter(db_session, sample_user.id)
+
+        assert exporter.entity_types() == sorted({sample_entity_type.name} | {e.type for e in sample_entities})
+
+
+class TestNegotiateEncoding:
+    """Test Accept-Encoding negotiation."""
+
+    def test_gzip_accepted(self):
+        assert negotiate_encoding("gzip, deflate") == "gzip"
+
+    def test_identity_and_refused_encodings(self):
+        assert negotiate_encoding(None) is None
+        assert negotiate_encoding("identity") is None
+        assert negotiate_encoding("gzip;q=0, br") is None
+
+
+class TestExportEndpoint:
+    """Test GET /api/export."""
+
+    def test_gzip_encoded_when_accepted(self, authenticated_client, sample_entities):
+        """Test that the response is gzip compressed when the client accepts it."""
+        response = authenticated_client.get("/api/export", headers={"Accept-Encoding": "gzip"})
+
+        assert response.headers["content-encoding"] == "gzip"
+        assert len(response.json()["entities"]) == 3
+
+    def test_uncompressed_when_not_accepted(self, authenticated_client, sample_entities):
+        """Test that identity clients get a plain body."""
+        response = authenticated_client.get("/api/export", headers={"Accept-Encoding": "identity"})
+
+        assert "content-encoding" not in response.headers
+        assert len(json.loads(response.content)["entities"]) == 3
+
+    def test_ndjson_round_trip(self, authenticated_client, sample_entities, sample_relations):
+        """Test that an NDJSON export can be streamed back in with the same graph."""
+        response = authenticated_client.get("/api/export", headers={"Accept": "application/x-ndjson"})
+        assert response.headers["content-type"].startswith("application/x-ndjson")
+        before = {e["name"] for e in authenticated_client.get("/api/entities/").json()}
+
+        result = authenticated_client.post("/api/import/stream?mode=replace", content=response.content).json()
+
+        assert (result["imported_entities"], result["imported_relations"]) == (3, len(sample_relations))
+        assert {e["name"] for e in authenticated_client.get("/api/entities/").json()} == before
+
+    def test_format_query_overrides_accept(self, authenticated_client):
+        """Test choosing the format explicitly."""
+        response = authenticated_client.get("/api/export?format=ndjson", headers={"Accept": "application/json"})
+
+        assert json.loads(response.content.splitlines()[0])["kind"] == "meta"
+        assert 'filename="relation-map-export.ndjson"' in response.headers["content-disposition"]
@@ -0,0 +1,135 @@
+"""
+Graph Index Tests.
+Tests the CSR adjacency, incremental updates, compaction and the LRU memory budget.
+"""
+
+from graph_index import GraphIndex, UserGraph
+from graph_index import index as graph_index
+
+
+def neighbor_ids(graph: UserGraph, entity_id: int, direction: str = "both", types=None):
+    node = graph.index_of(entity_id)
+    return sorted(graph.node_ids[other] for _, other in graph.neighbors(node, direction, graph.type_ids(types)))
+
+
+def small_graph() -> UserGraph:
+    return UserGraph([1, 2, 3, 4], [(10, 1, 2, "knows"), (11, 2, 3, "works_with"), (12, 3, 1, "knows")])
+
+
+class TestUserGraph:
+    """Test adjacency lookups."""
+
+    def test_neighbors_by_direction_and_type(self):
+        graph = small_graph()
+
+        assert neighbor_ids(graph, 1, "out") == [2]
+        assert neighbor_ids(graph, 1, "in") == [3]
+        assert neighbor_ids(graph, 2, "both") == [1, 3]
+        assert neighbor_ids(graph, 2, "both", ["knows"]) == [1]
+        assert neighbor_ids(graph, 4) == []
+        assert (graph.node_count, graph.relation_count) == (4, 3)
+
+    def test_self_loop_listed_once(self):
+        graph = UserGraph([1], [(5, 1, 1, "self")])
+
+        assert neighbor_ids(graph, 1) == [1]
+
+    def test_apply_changes(self):
+        """Test that deltas add to the overlay and removals cascade."""
+        graph = small_graph()
+
+        graph.apply_changes({
+            "entities": {"added": [{"id": 5}], "removed": [3]},
+            "relations": {
+                "added": [{"id": 13, "source_id": 5, "target_id": 1, "relation_type": "knows"}],
+                "changed": [{"id": 10, "source_id": 1, "target_id": 4, "relation_type": "knows"}],
+            },
+        })
+
+        assert graph.index_of(3) is None
+        assert neighbor_ids(graph, 1) == [4, 5]
+        assert neighbor_ids(graph, 2) == []
+        assert graph.relation_count == 2
+
+    def test_apply_changes_is_idempotent(self):
+        graph = small_graph()
+        delta = {"entities": {"added": [{"id": 5}]},
+                 "relations": {"added": [{"id": 13, "source_id": 5, "target_id": 1, "relation_type": "x"}]}}
+
+        graph.apply_changes(delta)
+        graph.apply_changes(delta)
+
+        assert (graph.node_count, graph.relation_count) == (5, 4)
+        assert neighbor_ids(graph, 1) == [2, 3, 5]
+
+    def test_out_of_order_ids_and_compaction(self):
+        """Test IDs below the sorted range, and that compaction keeps the same graph."""
+        graph = small_graph()
+        graph.apply_changes({
+            "entities": {"added": [{"id": 0}]},
+            "relations": {"added": [{"id": 1, "source_id": 0, "target_id": 4, "relation_type": "knows"}],
+                          "removed": [11]},
+        })
+        before = {entity_id: neighbor_ids(graph, entity_id) for entity_id in (0, 1, 2, 3, 4)}
+
+        graph.compact()
+
+        assert {entity_id: neighbor_ids(graph, entity_id) for entity_id in (0, 1, 2, 3, 4)} == before
+        assert list(graph.node_ids) == [0, 1, 2, 3, 4]
+        assert graph._overlay == graph._dead == 0
+
+
+class TestGraphIndex:
+    """Test loading, updates from edits and eviction."""
+
+    def test_loads_lazily_and_follows_edits(self, authenticated_client, db_session, sample_user, sample_entities):
+        """Test that CRUD commits update a loaded graph without reloading it."""
+        graph = graph_index.get(db_session, sample_user.id)
+        alice, bob = sample_entities[0].id, sample_entities[1].id
+
+        created = authenticated_client.post("/api/relations/", json={
+            "source_id": alice, "target_id": bob, "relation_type": "knows"
+        }).json()
+
+        assert graph_index.get(db_session, sample_user.id) is graph
+        assert neighbor_ids(graph, alice, "out") == [bob]
+        authenticated_client.delete(f"/api/relations/{created['id']}")
+        assert neighbor_ids(graph, alice, "out") == []
+
+    def test_import_invalidates(self, authenticated_client, db_session, sample_user, sample_entities):
+        """Test that an edit without a delta drops the loaded graph."""
+        graph_index.get(db_session, sample_user.id)
+
+        authenticated_client.post("/api/import?mode=replace", json={
+            "version": "1.0", "entities": [{"id": 1, "name": "X", "type": "t"}], "relations": []
+        })
+
+        assert not graph_index.is_loaded(sample_user.id)
+        assert graph_index.get(db_session, sample_user.id).node_count == 1
+
+    def test_invalidation_during_apply_is_kept(self, db_session, sample_user, sample_entities, monkeypatch):
+        """Test that a graph invalidated while a delta is applied is not cached again."""
+        index = GraphIndex()
+        graph = index.get(db_session, sample_user.id)
+        apply_changes = graph.apply_changes
+
+        def apply_then_invalidate(changes):
+            apply_changes(changes)
+            index.invalidate(sample_user.id)
+
+        monkeypatch.setattr(graph, "apply_changes", apply_then_invalidate)
+        index.apply_changes(sample_user.id, {"entities": {"removed": [sample_entities[0].id]}})
+
+        assert not index.is_loaded(sample_user.id)
+
+    def test_memory_budget_evicts_least_recently_used(self, db_session, sample_users, sample_entities):
+        """Test that graphs beyond the budget are evicted, oldest first."""
+        alice, bob = sample_users
+        index = GraphIndex(memory_budget_bytes=1)
+
+        index.get(db_session, alice.id)
+        index.get(db_session, bob.id)
+
+        assert not index.is_loaded(alice.id)
+        assert index.is_loaded(bob.id)
+        assert index.memory_bytes > 0
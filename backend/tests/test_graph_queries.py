@@ -0,0 +1,197 @@
+"""
+Graph Query Tests.
+Tests neighbourhood and path traversals over the graph index and their endpoints.
+"""
+
+from graph_index import UserGraph
+from graph_queries import SearchBudget, find_paths, neighborhood, parse_types
+from models import Entity
+
+
+def chain_graph() -> UserGraph:
+    """1 -knows-> 2 -knows-> 3 -works_with-> 4, and 5 -knows-> 1."""
+    return UserGraph(
+        [1, 2, 3, 4, 5],
+        [(10, 1, 2, "knows"), (11, 2, 3, "knows"), (12, 3, 4, "works_with"), (13, 5, 1, "knows")],
+    )
+
+
+def run(graph: UserGraph, entity_id: int, depth: int, direction: str = "both", types=None, max_nodes: int = 500):
+    return neighborhood(graph, graph.index_of(entity_id), depth, direction, graph.type_ids(types), max_nodes)
+
+
+class TestNeighborhood:
+    """Test the breadth-first traversal."""
+
+    def test_depth(self):
+        graph = chain_graph()
+
+        assert run(graph, 1, 1)["hops"] == {1: 0, 2: 1, 5: 1}
+        assert run(graph, 1, 2)["hops"] == {1: 0, 2: 1, 5: 1, 3: 2}
+
+    def test_direction_and_types(self):
+        graph = chain_graph()
+
+        assert run(graph, 2, 3, "out")["hops"] == {2: 0, 3: 1, 4: 2}
+        assert run(graph, 2, 3, "in")["hops"] == {2: 0, 1: 1, 5: 2}
+        assert run(graph, 1, 3, types=["knows"])["hops"] == {1: 0, 2: 1, 5: 1, 3: 2}
+
+    def test_induced_relations(self):
+        """Test that relations between returned nodes are included, and only those."""
+        graph = UserGraph([1, 2, 3], [(10, 1, 2, "a"), (11, 1, 3, "a"), (12, 2, 3, "a")])
+
+        result = run(graph, 1, 1, "out", max_nodes=3)
+
+        assert result["relation_ids"] == [10, 11, 12]
+        assert run(graph, 1, 1, "out", max_nodes=2)["relation_ids"] == [10]
+
+    def test_limit_truncates(self):
+        result = run(chain_graph(), 1, 3, max_nodes=2)
+
+        assert len(result["hops"]) == 2
+        assert result["truncated"] is True
+        assert run(chain_graph(), 1, 1)["truncated"] is False
+
+    def test_parse_types(self):
+        assert parse_types(["knows, works_with", "likes"]) == ["knows", "works_with", "likes"]
+        assert parse_types(None) is None
+
+
+def ladder_graph() -> UserGraph:
+    """Two routes from 1 to 4 (1-2-4 and 1-3-5-4) plus a parallel 2-4 relation."""
+    return UserGraph(
+        [1, 2, 3, 4, 5],
+        [(10, 1, 2, "knows"), (11, 2, 4, "knows"), (12, 1, 3, "knows"),
+         (13, 3, 5, "knows"), (14, 5, 4, "likes"), (15, 2, 4, "likes")],
+    )
+
+
+def paths(graph: UserGraph, source: int, target: int, max_len: int = 6, k: int = 1, direction: str = "both",
+          types=None, budget=None):
+    return find_paths(graph, graph.index_of(source), graph.index_of(target), max_len, k, direction,
+                      graph.type_ids(types), budget)
+
+
+class TestPaths:
+    """Test shortest and k shortest path searches."""
+
+    def test_shortest_path(self):
+        result = paths(chain_graph(), 5, 4)
+
+        assert result["paths"] == [{"length": 4, "entity_ids": [5, 1, 2, 3, 4], "relation_ids": [13, 10, 11, 12]}]
+        assert result["budget_exhausted"] is False
+
+    def test_max_len_direction_and_types(self):
+        graph = chain_graph()
+
+        assert paths(graph, 5, 4, max_len=3)["paths"] == []
+        assert paths(graph, 4, 1, direction="out")["paths"] == []
+        assert paths(graph, 4, 1, direction="in")["paths"][0]["entity_ids"] == [4, 3, 2, 1]
+        assert paths(graph, 1, 4, types=["knows"])["paths"] == []
+        assert paths(graph, 3, 3)["paths"] == [{"length": 0, "entity_ids": [3], "relation_ids": []}]
+
+    def test_k_shortest_simple_paths(self):
+        """Test that paths come shortest first and parallel relations count as distinct paths."""
+        result = paths(ladder_graph(), 1, 4, k=5)
+
+        assert [path["relation_ids"] for path in result["paths"]] == [[10, 11], [10, 15], [12, 13, 14]]
+        assert all(len(set(path["entity_ids"])) == len(path["entity_ids"]) for path in result["paths"])
+
+    def test_budget(self):
+        """Test that an exhausted budget ends the search with what was found."""
+        result = paths(ladder_graph(), 1, 4, k=5, budget=SearchBudget(max_visits=3))
+
+        assert result["budget_exhausted"] is True
+        assert len(result["paths"]) < 3
+
+    def test_timeout(self):
+        """Test that the wall-clock limit stops a search over a large grid."""
+        size = 30
+        relations = []
+        for row in range(size):
+            for col in range(size):
+                node = row * size + col
+                if col + 1 < size:
+                    relations.append((len(relations), node, node + 1, "r"))
+                if row + 1 < size:
+                    relations.append((len(relations), node, node + size, "r"))
+        graph = UserGraph(range(size * size), relations)
+
+        assert paths(graph, 0, size * size - 1, max_len=60)["paths"][0]["length"] == 58
+        assert paths(graph, 0, size * size - 1, max_len=60, k=20,
+                     budget=SearchBudget(timeout_seconds=0))["budget_exhausted"] is True
+
+
+class TestNeighborhoodEndpoint:
+    """Test GET /api/entities/{id}/neighborhood."""
+
+    def test_returns_records_with_hops(self, authenticated_client, sample_entities, sample_relations):
+        center = sample_entities[0].id
+
+        response = authenticated_client.get(f"/api/entities/{center}/neighborhood?depth=2")
+
+        assert response.status_code == 200
+        data = response.json()
+        assert data["center_id"] == center
+        assert data["entities"][0]["id"] == center
+        assert data["entities"][0]["hops"] == 0
+        assert all(entity["hops"] <= 2 for entity in data["entities"])
+        returned = {entity["id"] for entity in data["entities"]}
+        assert all({r["source_id"], r["target_id"]} <= returned for r in data["relations"])
+        assert data["relations"]
+        assert data["truncated"] is False
+
+    def test_type_filter_and_limit(self, authenticated_client, sample_entities, sample_relations):
+        center = sample_entities[0].id
+
+        filtered = authenticated_client.get(
+            f"/api/entities/{center}/neighborhood?depth=3&types=no_such_type"
+        ).json()
+        limited = authenticated_client.get(f"/api/entities/{center}/neighborhood?depth=3&limit=1").json()
+
+        assert [entity["id"] for entity in filtered["entities"]] == [center]
+        assert filtered["relations"] == []
+        assert len(limited["entities"]) == 1
+
+    def test_unknown_or_foreign_entity(self, authenticated_client, db_session, sample_users):
+        foreign = Entity(name="Other", type="person", user_id=sample_users[1].id)
+        db_session.add(foreign)
+        db_session.commit()
+
+        assert authenticated_client.get("/api/entities/99999/neighborhood").status_code == 404
+        assert authenticated_client.get(f"/api/entities/{foreign.id}/neighborhood").status_code == 404
+
+    def test_rejects_bad_parameters(self, authenticated_client, sample_entities):
+        center = sample_entities[0].id
+
+        assert authenticated_client.get(f"/api/entities/{center}/neighborhood?direction=up").status_code == 422
+        assert authenticated_client.get(f"/api/entities/{center}/neighborhood?depth=100").status_code == 422
+
+
+class TestPathsEndpoint:
+    """Test GET /api/paths."""
+
+    def test_returns_paths_with_records(self, authenticated_client, sample_entities, sample_relations):
+        alice, charlie = sample_entities[0].id, sample_entities[2].id
+
+        response = authenticated_client.get(f"/api/paths?from={alice}&to={charlie}&k=3")
+
+        assert response.status_code == 200
+        data = response.json()
+        assert (data["source_id"], data["target_id"]) == (alice, charlie)
+        assert data["paths"][0]["entity_ids"][0] == alice
+        assert data["paths"][0]["entity_ids"][-1] == charlie
+        lengths = [path["length"] for path in data["paths"]]
+        assert lengths == sorted(lengths)
+        assert {entity["id"] for entity in data["entities"]} >= {alice, charlie}
+        assert len(data["relations"]) >= data["paths"][0]["length"]
+
+    def test_filters_and_errors(self, authenticated_client, sample_entities, sample_relations):
+        alice, charlie = sample_entities[0].id, sample_entities[2].id
+
+        filtered = authenticated_client.get(f"/api/paths?from={alice}&to={charlie}&relation_types=no_such_type")
+
+        assert filtered.json()["paths"] == []
+        assert authenticated_client.get(f"/api/paths?from={alice}&to=99999").status_code == 404
+        assert authenticated_client.get(f"/api/paths?from={alice}").status_code == 422
+        assert authenticated_client.get(f"/api/paths?from={alice}&to={charlie}&k=0").status_code == 422
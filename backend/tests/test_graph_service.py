@@ -0,0 +1,86 @@
+"""
+Combined Graph Endpoint Tests.
+Tests GET /api/graph payloads, columnar encoding, ETags and query count.
+"""
+
+from sqlalchemy import event
+
+from graph_service import etag_matches
+
+
+class TestGraphEndpoint:
+    """Test GET /api/graph."""
+
+    def test_returns_whole_graph(self, authenticated_client, sample_entities, sample_relations):
+        """Test that one response carries entities, relations and types."""
+        graph = authenticated_client.get("/api/graph").json()
+
+        assert [e["name"] for e in graph["entities"]] == ["Alice", "Bob", "Charlie"]
+        assert set(graph["entities"][0]) == {"id", "name", "type", "description"}
+        assert len(graph["relations"]) == len(sample_relations)
+        assert graph["entity_types"] == sorted({e.type for e in sample_entities})
+        assert graph["relation_types"] == sorted({r.relation_type for r in sample_relations})
+
+    def test_columnar_encoding(self, authenticated_client, sample_entities, sample_relations):
+        """Test that columnar tables hold the same values as parallel arrays."""
+        rows = authenticated_client.get("/api/graph").json()
+        columnar = authenticated_client.get("/api/graph?encoding=columnar").json()
+
+        assert columnar["encoding"] == "columnar"
+        assert columnar["entities"]["name"] == [e["name"] for e in rows["entities"]]
+        assert columnar["relations"]["source_id"] == [r["source_id"] for r in rows["relations"]]
+
+    def test_columnar_encoding_of_empty_graph(self, authenticated_client):
+        graph = authenticated_client.get("/api/graph?encoding=columnar").json()
+
+        assert graph["entities"] == {"id": [], "name": [], "type": [], "description": []}
+        assert graph["version_number"] == 0
+
+    def test_not_modified_until_an_edit(self, authenticated_client, sample_entities):
+        """Test that the ETag revalidates until the graph changes."""
+        first = authenticated_client.get("/api/graph")
+        etag = first.headers["etag"]
+
+        unchanged = authenticated_client.get("/api/graph", headers={"If-None-Match": etag})
+        authenticated_client.post("/api/entities/", json={"name": "Dave", "type": "person"})
+        changed = authenticated_client.get("/api/graph", headers={"If-None-Match": etag})
+
+        assert unchanged.status_code == 304
+        assert unchanged.content == b""
+        assert changed.status_code == 200
+        assert changed.headers["etag"] != etag
+        assert "Dave" in [e["name"] for e in changed.json()["entities"]]
+
+    def test_fixed_number_of_queries(self, authenticated_client, db_engine):
+        """Test that the query count does not grow with the graph."""
+        def count_queries():
+            statements = []
+
+            def record(conn, cursor, statement, *args):
+                statements.append(statement)
+
+            event.listen(db_engine, "before_cursor_execute", record)
+            try:
+                authenticated_client.get("/api/graph")
+            finally:
+                event.remove(db_engine, "before_cursor_execute", record)
+            return len(statements)
+
+        authenticated_client.get("/api/graph")  # caches the authenticated user
+        small = count_queries()
+        for i in range(20):
+            authenticated_client.post("/api/entities/", json={"name": f"E{i}", "type": f"t{i}"})
+        authenticated_client.get("/api/graph")  # writes the pending versions
+        assert count_queries() == small
+
+
+class TestEtagMatches:
+    """Test If-None-Match parsing."""
+
+    def test_matches_listed_and_weak_tags(self):
+        etag = 'W/"graph-1-3-rows"'
+        assert etag_matches('"other", W/"graph-1-3-rows"', etag)
+        assert etag_matches('"graph-1-3-rows"', etag)
+        assert etag_matches("*", etag)
+        assert not etag_matches(None, etag)
+        assert not etag_matches('W/"graph-1-4-rows"', etag)
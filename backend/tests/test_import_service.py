@@ -0,0 +1,174 @@
+"""
+Bulk Import Tests.
+Tests batched inserts, ID remapping and type upserts of BulkImporter, and
+the parsers and endpoint used for streaming imports.
+"""
+
+import json
+
+import pytest
+from models import Entity, EntityType, Relation, RelationType
+from import_service import BulkImporter, ImportFormatError, JsonDocumentParser, NdjsonParser
+
+
+def entities(count, start=0):
+    return [{"id": 100 + i, "name": f"E{i}", "type": f"t{i % 3}", "description": None} for i in range(start, count)]
+
+
+class TestBulkImporter:
+    """Test BulkImporter."""
+
+    def test_remaps_ids_across_batches(self, db_session, sample_user):
+        """Test that relations are remapped to the IDs of entities from earlier batches."""
+        importer = BulkImporter(db_session, sample_user.id, batch_size=3)
+        importer.add_entities(entities(10))
+        importer.add_relations(
+            {"source_id": 100 + i, "target_id": 109 - i, "relation_type": "knows", "description": None}
+            for i in range(10)
+        )
+        result = importer.finish()
+        db_session.commit()
+
+        assert result == {"imported_entities": 10, "imported_relations": 10, "skipped": 0}
+        names = {e.id: e.name for e in db_session.query(Entity).all()}
+        pairs = sorted((names[r.source_id], names[r.target_id]) for r in db_session.query(Relation).all())
+        assert pairs == sorted((f"E{i}", f"E{9 - i}") for i in range(10))
+
+    def test_relations_to_existing_entities(self, db_session, sample_user, sample_entities, sample_users):
+        """Test that unmapped endpoints must be existing entities of the same user."""
+        other = Entity(name="Other", type="person", user_id=sample_users[0].id)
+        db_session.add(other)
+        db_session.commit()
+        alice = sample_entities[0]
+
+        importer = BulkImporter(db_session, sample_user.id)
+        importer.add_entities(entities(1))
+        importer.add_relations([
+            {"source_id": 100, "target_id": alice.id, "relation_type": "knows"},
+            {"source_id": 100, "target_id": other.id, "relation_type": "knows"},
+            {"source_id": 100, "target_id": 99999, "relation_type": "knows"},
+        ])
+        result = importer.finish()
+
+        assert result["imported_relations"] == 1
+        assert result["skipped"] == 2
+
+    def test_types_are_upserted(self, db_session, sample_user, sample_entity_type):
+        """Test that types the user already has are not duplicated."""
+        for _ in range(2):
+            importer = BulkImporter(db_session, sample_user.id)
+            importer.add_entities(entities(3))
+            importer.add_entity_types([sample_entity_type.name])
+            importer.add_relation_types(["friend"])
+            importer.finish()
+            db_session.commit()
+
+        entity_types = sorted(name for (name,) in db_session.query(EntityType.name))
+        assert entity_types == sorted({sample_entity_type.name, "t0", "t1", "t2"})
+        assert [name for (name,) in db_session.query(RelationType.name)] == ["friend"]
+
+
+class TestStreamingParsers:
+    """Test the incremental NDJSON and JSON document parsers."""
+
+    def feed_in_chunks(self, parser, payload, size=7):
+        records = []
+        for start in range(0, len(payload), size):
+            records.extend(parser.feed(payload[start:start + size]))
+        return records + parser.close()
+
+    def test_ndjson_records_split_across_chunks(self):
+        """Test that lines split across chunks are reassembled."""
+        payload = (
+            b'{"kind": "entity", "id": 1, "name": "A\\u00e9", "type": "person"}\n'
+            b'\n'
+            b'{"kind": "relation", "source_id": 1, "target_id": 1, "relation_type": "self"}'
+        )
+
+        records = self.feed_in_chunks(NdjsonParser(), payload)
+
+        assert [(kind, position) for kind, _, position in records] == [("entity", "line 1"), ("relation", "line 3")]
+        assert records[0][1]["name"] == "Aé"
+
+    def test_ndjson_invalid_line(self):
+        """Test that malformed lines are reported with their line number."""
+        with pytest.raises(ImportFormatError, match="line 2"):
+            self.feed_in_chunks(NdjsonParser(), b'{"kind": "meta"}\n{oops}\n')
+
+    def test_ndjson_record_size_limit(self):
+        """Test that an unterminated huge line is rejected instead of buffered."""
+        with pytest.raises(ImportFormatError, match="too large"):
+            NdjsonParser(max_record_bytes=10).feed(b'{"kind": "entity", "name": "')
+
+    def test_json_document_items(self):
+        """Test that array items of an export document are parsed incrementally."""
+        document = json.dumps({
+            "version": 1.5,
+            "entities": [{"id": 1, "name": "A", "type": "person"}, {"id": 2, "name": "B", "type": "person"}],
+            "relations": [{"source_id": 1, "target_id": 2, "relation_type": "knows"}],
+            "entity_types": ["person"],
+            "relation_types": [],
+            "exported_at": "2024-01-01",
+        }).encode()
+
+        records = self.feed_in_chunks(JsonDocumentParser(), document, size=5)
+
+        assert [kind for kind, _, _ in records] == ["entity", "entity", "relation", "entity_type"]
+        assert records[1][1]["name"] == "B"
+
+    def test_json_document_truncated(self):
+        """Test that a truncated document is rejected."""
+        with pytest.raises(ImportFormatError):
+            self.feed_in_chunks(JsonDocumentParser(), b'{"entities": [{"id": 1, "name": "A"')
+
+
+class TestStreamingImportEndpoint:
+    """Test POST /api/import/stream."""
+
+    def test_ndjson_import_in_chunks(self, authenticated_client):
+        """Test importing a chunked NDJSON body with remapped relations."""
+        lines = [json.dumps({"kind": "entity", "id": i, "name": f"E{i}", "type": "person"}) for i in range(50)]
+        lines += [
+            json.dumps({"kind": "relation", "source_id": i, "target_id": i + 1, "relation_type": "next"})
+            for i in range(49)
+        ]
+        body = ("\n".join(lines) + "\n").encode()
+
+        response = authenticated_client.post(
+            "/api/import/stream?mode=replace",
+            content=(body[start:start + 100] for start in range(0, len(body), 100)),
+            headers={"Content-Type": "application/x-ndjson"},
+        )
+
+        assert response.status_code == 200
+        assert response.json()["imported_relations"] == 49
+        entities = {e["id"]: e["name"] for e in authenticated_client.get("/api/entities/").json()}
+        relation = authenticated_client.get("/api/relations/").json()[0]
+        assert (entities[relation["source_id"]], entities[relation["target_id"]]) == ("E0", "E1")
+
+    def test_json_document_import(self, authenticated_client):
+        """Test importing an export document without parsing it as one body."""
+        document = {
+            "version": "1.0",
+            "entities": [{"id": 7, "name": "Seven", "type": "number"}],
+            "relations": [],
+            "entity_types": ["number", "unused"],
+        }
+
+        response = authenticated_client.post("/api/import/stream?format=json", content=json.dumps(document))
+
+        assert response.json()["imported_entities"] == 1
+        assert set(authenticated_client.get("/api/entities/types").json()) == {"number", "unused"}
+
+    def test_invalid_record_rolls_back(self, authenticated_client):
+        """Test that an invalid record aborts the whole import."""
+        body = (
+            json.dumps({"kind": "entity", "name": "Ok", "type": "person"}) + "\n"
+            + json.dumps({"kind": "entity", "name": "Missing type"}) + "\n"
+        )
+
+        response = authenticated_client.post("/api/import/stream", content=body)
+
+        assert response.status_code == 400
+        assert "line 2" in response.json()["detail"]
+        assert authenticated_client.get("/api/entities/").json() == []
@@ -0,0 +1,128 @@
+"""
+Background Job Tests.
+Tests import/export jobs, their status reporting, result download and housekeeping.
+(Jobs run inline in tests, see JOB_WORKERS in conftest.)
+"""
+
+import gzip
+import json
+import os
+from datetime import datetime, timedelta
+
+import models
+from auth import create_access_token
+from job_service import JobRunner, runner
+
+
+class TestExportJobs:
+    """Test POST /api/jobs/export and result download."""
+
+    def test_export_job_reports_rows_and_download(self, authenticated_client, sample_entities, sample_relations):
+        """Test that a finished export reports its rows and links to the file."""
+        response = authenticated_client.post("/api/jobs/export?format=ndjson")
+        assert response.status_code == 202
+        job = authenticated_client.get(f"/api/jobs/{response.json()['id']}").json()
+
+        total = len(sample_entities) + len(sample_relations)
+        assert job["status"] == "succeeded"
+        assert (job["rows_processed"], job["total_rows"], job["progress"]) == (total, total, 1.0)
+        assert job["throughput"] is not None
+
+        download = authenticated_client.get(job["download_url"])
+        assert download.status_code == 200
+        kinds = [json.loads(line)["kind"] for line in download.content.splitlines()]
+        assert kinds.count("entity") == len(sample_entities)
+        assert 'filename="relation-map-export.ndjson"' in download.headers["content-disposition"]
+
+    def test_compressed_export(self, authenticated_client, sample_entities):
+        """Test that a gzip export downloads as a .gz file."""
+        job = authenticated_client.post("/api/jobs/export?compression=gzip").json()
+
+        download = authenticated_client.get(job["download_url"])
+
+        assert download.headers["content-type"] == "application/gzip"
+        assert len(json.loads(gzip.decompress(download.content))["entities"]) == len(sample_entities)
+
+
+class TestImportJobs:
+    """Test POST /api/jobs/import."""
+
+    def test_import_job_writes_rows_and_version(self, authenticated_client, db_session, sample_user):
+        """Test that an uploaded NDJSON file is imported and versioned."""
+        body = "\n".join(json.dumps(record) for record in [
+            {"kind": "entity", "id": 1, "name": "A", "type": "person"},
+            {"kind": "entity", "id": 2, "name": "B", "type": "person"},
+            {"kind": "relation", "source_id": 1, "target_id": 2, "relation_type": "knows"},
+        ])
+
+        job = authenticated_client.post("/api/jobs/import?mode=replace", content=body).json()
+
+        assert job["status"] == "succeeded"
+        assert job["rows_processed"] == 3
+        assert job["result"] == {"imported_entities": 2, "imported_relations": 1, "skipped": 0}
+        assert job["download_url"] is None
+        assert len(authenticated_client.get("/api/entities/").json()) == 2
+        versions = db_session.query(models.Version).filter(models.Version.user_id == sample_user.id).all()
+        assert [v.description for v in versions] == ["Imported data (replace)"]
+        assert not os.path.exists(runner.file_path(job["id"], ".upload"))
+
+    def test_invalid_import_fails_without_changes(self, authenticated_client, sample_entities):
+        """Test that a malformed file fails the job and rolls the import back."""
+        body = json.dumps({"kind": "entity", "name": "A", "type": "person"}) + "\nnot json\n"
+
+        job = authenticated_client.post("/api/jobs/import?mode=replace", content=body).json()
+
+        assert job["status"] == "failed"
+        assert "line 2" in job["error"]
+        assert len(authenticated_client.get("/api/entities/").json()) == len(sample_entities)
+
+
+class TestJobAccess:
+    """Test job ownership and errors."""
+
+    def test_other_users_job_not_found(self, client, sample_users):
+        """Test that a job is only visible to its owner."""
+        alice, bob = (
+            {"Authorization": f"Bearer {create_access_token({'sub': str(u.id), 'username': u.username})}"}
+            for u in sample_users
+        )
+        job = client.post("/api/jobs/export", headers=alice).json()
+
+        assert client.get(f"/api/jobs/{job['id']}", headers=bob).status_code == 404
+        assert client.get(f"/api/jobs/{job['id']}/result", headers=bob).status_code == 404
+
+    def test_unknown_job(self, authenticated_client):
+        assert authenticated_client.get("/api/jobs/missing").status_code == 404
+
+
+class TestJobHousekeeping:
+    """Test recovery and retention."""
+
+    def test_recover_fails_interrupted_jobs(self, db_session, sample_user):
+        """Test that queued and running jobs are failed on startup."""
+        job_runner = JobRunner(workers=0)
+        for status in ("queued", "running", "succeeded"):
+            db_session.add(models.Job(id=status, user_id=sample_user.id, kind="export", status=status))
+        db_session.commit()
+
+        assert job_runner.recover(db_session) == 2
+        statuses = {job.id: job.status for job in db_session.query(models.Job)}
+        assert statuses == {"queued": "failed", "running": "failed", "succeeded": "succeeded"}
+
+    def test_purge_expired_removes_rows_and_files(self, db_session, sample_user, tmp_path):
+        """Test that finished jobs past retention are deleted with their files."""
+        job_runner = JobRunner(workers=0, storage_dir=str(tmp_path), retention_hours=1)
+        now = datetime.utcnow()
+        old_file = job_runner.file_path("old", ".json")
+        open(old_file, "w").close()
+        db_session.add_all([
+            models.Job(id="old", user_id=sample_user.id, kind="export", status="succeeded",
+                       finished_at=now - timedelta(hours=2), result_path=old_file),
+            models.Job(id="new", user_id=sample_user.id, kind="export", status="succeeded",
+                       finished_at=now - timedelta(minutes=5)),
+        ])
+        db_session.commit()
+
+        assert job_runner.purge_expired(db_session, now) == 1
+        assert [job.id for job in db_session.query(models.Job)] == ["new"]
+        assert not os.path.exists(old_file)
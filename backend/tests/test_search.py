@@ -0,0 +1,108 @@
+"""
+Search Tests.
+Tests ranked word, prefix and fuzzy search over entities and relations.
+"""
+
+from sqlalchemy import text
+
+from models import Entity, Relation
+from search_service import install_search_index
+
+
+def add_entities(db_session, user_id, *records):
+    entities = [Entity(name=name, type="person", description=description, user_id=user_id) for name, description in records]
+    db_session.add_all(entities)
+    db_session.commit()
+    return entities
+
+
+class TestSearch:
+    """Test GET /api/search."""
+
+    def test_ranks_name_matches_above_description_matches(self, authenticated_client, db_session, sample_user):
+        mentions, named = add_entities(
+            db_session, sample_user.id,
+            ("Bob", "Works with Alice on the mill"),
+            ("Alice Liddell", "Curious girl"),
+        )
+
+        results = authenticated_client.get("/api/search?q=alice").json()["results"]
+
+        assert [hit["id"] for hit in results] == [named.id, mentions.id]
+        assert results[0]["entity"]["name"] == "Alice Liddell"
+        assert results[0]["match"] == "word"
+
+    def test_prefix_and_every_term(self, authenticated_client, db_session, sample_user):
+        add_entities(db_session, sample_user.id, ("Alice Liddell", None), ("Alice Kingsleigh", None))
+
+        assert [hit["entity"]["name"] for hit in authenticated_client.get("/api/search?q=ali lid").json()["results"]] == [
+            "Alice Liddell"
+        ]
+
+    def test_fuzzy_matches_follow_word_matches(self, authenticated_client, db_session, sample_user):
+        """Test substring matches inside words and in text without spaces."""
+        add_entities(db_session, sample_user.id, ("Malice", None), ("山田太郎", None), ("Alice", None))
+
+        results = authenticated_client.get("/api/search?q=alice").json()["results"]
+        japanese = authenticated_client.get("/api/search?q=田太郎").json()["results"]
+        word_only = authenticated_client.get("/api/search?q=alice&fuzzy=false").json()["results"]
+
+        assert [(hit["entity"]["name"], hit["match"]) for hit in results] == [("Alice", "word"), ("Malice", "fuzzy")]
+        assert [hit["entity"]["name"] for hit in japanese] == ["山田太郎"]
+        assert [hit["entity"]["name"] for hit in word_only] == ["Alice"]
+
+    def test_relations_and_kind_filter(self, authenticated_client, db_session, sample_user, sample_entities):
+        relation = Relation(
+            source_id=sample_entities[0].id, target_id=sample_entities[1].id,
+            relation_type="friend", description="Met at the rowing club", user_id=sample_user.id,
+        )
+        db_session.add(relation)
+        db_session.commit()
+
+        everything = authenticated_client.get("/api/search?q=rowing").json()["results"]
+        entities_only = authenticated_client.get("/api/search?q=rowing&kind=entity").json()["results"]
+
+        assert [(hit["kind"], hit["id"]) for hit in everything] == [("relation", relation.id)]
+        assert everything[0]["relation"]["relation_type"] == "friend"
+        assert entities_only == []
+
+    def test_pagination(self, authenticated_client, db_session, sample_user):
+        add_entities(db_session, sample_user.id, *[(f"Member {i}", None) for i in range(5)])
+
+        first = authenticated_client.get("/api/search?q=member&limit=2").json()
+        last = authenticated_client.get("/api/search?q=member&limit=2&offset=4").json()
+
+        assert len(first["results"]) == 2
+        assert first["next_offset"] == 2
+        assert len(last["results"]) == 1
+        assert last["next_offset"] is None
+
+    def test_index_follows_updates_and_deletes(self, authenticated_client, db_session, sample_user):
+        entity = add_entities(db_session, sample_user.id, ("Alice", None))[0]
+
+        authenticated_client.put(f"/api/entities/{entity.id}", json={"name": "Beatrice", "type": "person"})
+
+        assert authenticated_client.get("/api/search?q=alice&fuzzy=false").json()["results"] == []
+        assert len(authenticated_client.get("/api/search?q=beatrice").json()["results"]) == 1
+        authenticated_client.delete(f"/api/entities/{entity.id}")
+        assert authenticated_client.get("/api/search?q=beatrice").json()["results"] == []
+
+    def test_only_own_rows(self, authenticated_client, db_session, sample_users):
+        add_entities(db_session, sample_users[1].id, ("Alice", None))
+
+        assert authenticated_client.get("/api/search?q=alice").json()["results"] == []
+
+    def test_rebuilds_existing_rows_on_install(self, db_engine, db_session, sample_user):
+        """Test that installing the index picks up rows written before it existed."""
+        add_entities(db_session, sample_user.id, ("Alice", None))
+        with db_engine.begin() as connection:
+            connection.execute(text("DROP TABLE entity_search"))
+        install_search_index(db_engine)
+
+        count = db_session.execute(text("SELECT count(*) FROM entity_search WHERE entity_search MATCH 'alice'")).scalar()
+        assert count == 1
+
+    def test_query_validation(self, authenticated_client):
+        assert authenticated_client.get("/api/search").status_code == 422
+        assert authenticated_client.get("/api/search?q=x&kind=type").status_code == 422
+        assert authenticated_client.get("/api/search?q=%21%21").json()["results"] == []
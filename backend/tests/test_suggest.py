@@ -0,0 +1,103 @@
+"""
+Entity Suggestion Tests.
+Tests the in-memory name index and the typeahead endpoint.
+"""
+
+from suggest_index import NameIndex, name_keys
+from suggest_index import index as suggest_index
+
+
+def names(results):
+    return [result["name"] for result in results]
+
+
+class TestNameIndex:
+    """Test prefix lookups and incremental updates."""
+
+    def test_matches_word_starts_case_insensitively(self):
+        index = NameIndex([(1, "Alice Liddell", "person"), (2, "Bob Alison", "person"), (3, "Malice", "idea")])
+
+        assert names(index.suggest("ali")) == ["Alice Liddell", "Bob Alison"]
+        assert names(index.suggest("LID")) == ["Alice Liddell"]
+        assert index.suggest("ali", limit=1) == [{"id": 1, "name": "Alice Liddell", "type": "person"}]
+        assert index.suggest("zed") == []
+
+    def test_apply_changes(self):
+        index = NameIndex([(1, "Alice", "person"), (2, "Bob", "person")])
+        delta = {"entities": {
+            "added": [{"id": 3, "name": "Alfred", "type": "person"}],
+            "changed": [{"id": 1, "name": "Beatrice", "type": "person"}],
+            "removed": [2],
+        }}
+
+        index.apply_changes(delta)
+        index.apply_changes(delta)
+
+        assert names(index.suggest("al")) == ["Alfred"]
+        assert names(index.suggest("b")) == ["Beatrice"]
+        assert index.entity_count == 2
+
+    def test_type_change_keeps_entries(self):
+        """Test that a delta keeping a name only updates its type."""
+        index = NameIndex([(1, "Alice", "person")])
+        entries = list(index._entries)
+
+        index.apply_changes({"entities": {"changed": [{"id": 1, "name": "Alice", "type": "robot"}]}})
+
+        assert index._entries == entries
+        assert index.suggest("al") == [{"id": 1, "name": "Alice", "type": "robot"}]
+
+    def test_large_delta_rebuilds_once(self, monkeypatch):
+        """Test that a delta renaming many entities rebuilds the list instead of inserting per key."""
+        import suggest_index
+
+        index = NameIndex([(i, f"Name {i}", "person") for i in range(100)])
+        monkeypatch.setattr(suggest_index, "MIN_COMPACT_THRESHOLD", 10)
+        monkeypatch.setattr(suggest_index, "insort", None)  # fails if used
+
+        index.apply_changes({"entities": {
+            "changed": [{"id": i, "name": f"Renamed {i}", "type": "person"} for i in range(50)],
+            "removed": [99],
+        }})
+
+        assert names(index.suggest("renamed 7")) == ["Renamed 7"]
+        assert names(index.suggest("name 7")) == ["Name 70", "Name 71", "Name 72", "Name 73", "Name 74",
+                                                   "Name 75", "Name 76", "Name 77", "Name 78", "Name 79"]
+        assert index.entity_count == 99
+
+    def test_name_keys(self):
+        assert name_keys("Alice  Liddell") == ["alice  liddell", "liddell"]
+        assert name_keys("山田 太郎") == ["山田 太郎", "太郎"]
+
+
+class TestSuggestEndpoint:
+    """Test GET /api/entities/suggest."""
+
+    def test_follows_edits(self, authenticated_client, db_session, sample_user, sample_entities):
+        """Test that creates, renames and deletes reach a loaded index."""
+        assert names(authenticated_client.get("/api/entities/suggest?prefix=al").json()) == ["Alice"]
+        assert suggest_index.is_loaded(sample_user.id)
+
+        created = authenticated_client.post("/api/entities/", json={"name": "Alfred", "type": "person"}).json()
+        authenticated_client.put(f"/api/entities/{sample_entities[0].id}", json={"name": "Zoe", "type": "person"})
+        authenticated_client.delete(f"/api/entities/{sample_entities[1].id}")
+
+        assert authenticated_client.get("/api/entities/suggest?prefix=al").json() == [
+            {"id": created["id"], "name": "Alfred", "type": "person"}
+        ]
+        assert names(authenticated_client.get("/api/entities/suggest?prefix=zo").json()) == ["Zoe"]
+        assert authenticated_client.get("/api/entities/suggest?prefix=bob").json() == []
+
+    def test_import_invalidates(self, authenticated_client, sample_user, sample_entities):
+        authenticated_client.get("/api/entities/suggest?prefix=a")
+
+        authenticated_client.post("/api/import?mode=replace", json={
+            "version": "1.0", "entities": [{"id": 1, "name": "Xavier", "type": "t"}], "relations": []
+        })
+
+        assert not suggest_index.is_loaded(sample_user.id)
+        assert names(authenticated_client.get("/api/entities/suggest?prefix=x").json()) == ["Xavier"]
+
+    def test_validation(self, authenticated_client):
+        assert authenticated_client.get("/api/entities/suggest").status_code == 422
+        assert authenticated_client.get("/api/entities/suggest?prefix=a&limit=0").status_code == 422
@@ -0,0 +1,215 @@
+"""
+Type Usage Count Tests.
+Tests that the usage counts of registered types follow every kind of write.
+"""
+
+import models
+from migrate_types import backfill_usage_counts
+from type_registry import REFERENCES
+from version_service import VersionService
+
+
+def entity_counts(client):
+    return {t["name"]: t["count"] for t in client.get("/api/entities/types?with_counts=true").json()}
+
+
+def relation_counts(client):
+    return {t["name"]: t["count"] for t in client.get("/api/relations/types?with_counts=true").json()}
+
+
+class TestTypeUsageCounts:
+    """Test usage counts through the API."""
+
+    def test_legacy_types_are_counted_when_derived(self, authenticated_client, sample_relations):
+        assert entity_counts(authenticated_client) == {"person": 3}
+        assert relation_counts(authenticated_client) == {"colleague": 1, "friend": 1}
+        assert authenticated_client.get("/api/entities/types").json() == ["person"]
+
+    def test_crud_updates_counts(self, authenticated_client):
+        """Test that creates, retypes and deletes adjust the counts."""
+        alice = authenticated_client.post("/api/entities/", json={"name": "Alice", "type": "person"}).json()
+        bob = authenticated_client.post("/api/entities/", json={"name": "Bob", "type": "person"}).json()
+        authenticated_client.post("/api/entities/", json={"name": "Acme", "type": "organization"})
+        authenticated_client.post("/api/relations/", json={
+            "source_id": alice["id"], "target_id": bob["id"], "relation_type": "friend"
+        })
+        assert entity_counts(authenticated_client) == {"organization": 1, "person": 2}
+        assert relation_counts(authenticated_client) == {"friend": 1}
+
+        authenticated_client.put(f"/api/entities/{bob['id']}", json={"name": "Bob", "type": "organization"})
+        assert entity_counts(authenticated_client) == {"organization": 2, "person": 1}
+
+        # Relations deleted with their entity are uncounted too
+        authenticated_client.delete(f"/api/entities/{alice['id']}")
+        assert entity_counts(authenticated_client) == {"organization": 2, "person": 0}
+        assert relation_counts(authenticated_client) == {"friend": 0}
+
+    def test_rename_keeps_count(self, authenticated_client, sample_relations):
+        entity_counts(authenticated_client)
+        relation_counts(authenticated_client)
+
+        authenticated_client.put("/api/entities/types/person?new_type=human")
+        authenticated_client.put("/api/relations/types/friend?new_type=buddy")
+
+        assert entity_counts(authenticated_client) == {"human": 3}
+        assert relation_counts(authenticated_client) == {"buddy": 1, "colleague": 1}
+
+    def test_type_delete_uncounts_relations(self, authenticated_client, sample_relations):
+        relation_counts(authenticated_client)
+        authenticated_client.post("/api/entities/", json={"name": "Acme", "type": "organization"})
+
+        authenticated_client.delete("/api/entities/types/person")
+
+        assert entity_counts(authenticated_client) == {"organization": 1}
+        assert relation_counts(authenticated_client) == {"colleague": 0, "friend": 0}
+
+    def test_batch(self, authenticated_client):
+        """Test batches, including rows created and deleted within the batch."""
+        response = authenticated_client.post("/api/batch", json={"operations": [
+            {"kind": "entity", "op": "create", "temp_id": "a", "name": "Alice", "type": "person"},
+            {"kind": "entity", "op": "create", "temp_id": "b", "name": "Acme", "type": "organization"},
+            {"kind": "entity", "op": "create", "temp_id": "c", "name": "Temp", "type": "person"},
+            {"kind": "relation", "op": "create", "source_id": "a", "target_id": "b", "relation_type": "member"},
+            {"kind": "relation", "op": "create", "source_id": "a", "target_id": "c", "relation_type": "member"},
+            {"kind": "entity", "op": "delete", "id": "c"},
+        ]})
+        assert response.status_code == 200
+
+        assert entity_counts(authenticated_client) == {"organization": 1, "person": 1}
+        assert relation_counts(authenticated_client) == {"member": 1}
+
+    def test_import_and_restore_recount(self, authenticated_client, db_session, sample_user, sample_entities):
+        entity_counts(authenticated_client)
+        version = VersionService.create_version(db_session, "Before import", "system", sample_user)
+
+        authenticated_client.post("/api/import?mode=replace", json={
+            "version": "1.0",
+            "entities": [{"id": 1, "name": "X", "type": "t"}, {"id": 2, "name": "Y", "type": "t"}],
+            "relations": [{"source_id": 1, "target_id": 2, "relation_type": "r"}],
+        })
+        assert entity_counts(authenticated_client) == {"person": 0, "t": 2}
+        assert relation_counts(authenticated_client) == {"r": 1}
+
+        authenticated_client.post(f"/api/versions/{version.id}/restore")
+        assert entity_counts(authenticated_client)["person"] == 3
+
+
+class TestSetBasedTypeOperations:
+    """Test type renames and cascade deletes run as set-based statements."""
+
+    def test_rename_records_one_version(self, authenticated_client, sample_relations):
+        response = authenticated_client.put("/api/entities/types/person?new_type=human")
+        assert response.json()["updated_count"] == 3
+
+        versions = authenticated_client.get("/api/versions").json()
+        assert [v["description"] for v in versions] == ["Renamed entity type: person -> human"]
+        snapshot = authenticated_client.get(f"/api/versions/{versions[0]['id']}").json()["snapshot"]
+        assert {e["type"] for e in snapshot["entities"]} == {"human"}
+        assert [t["name"] for t in snapshot["entity_types"]] == ["human"]
+
+    def test_rename_unknown_type(self, authenticated_client, sample_entities):
+        assert authenticated_client.put("/api/entities/types/robot?new_type=android").status_code == 404
+        assert authenticated_client.put("/api/relations/types/enemy?new_type=rival").status_code == 404
+
+    def test_cascade_delete_records_one_version(self, authenticated_client, sample_relations):
+        authenticated_client.post("/api/entities/", json={"name": "Acme", "type": "organization"})
+
+        response = authenticated_client.delete("/api/entities/types/person").json()
+
+        assert (response["deleted_entities"], response["deleted_relations"]) == (3, 2)
+        versions = authenticated_client.get("/api/versions").json()
+        assert versions[0]["description"] == "Deleted entity type: person"
+        snapshot = authenticated_client.get(f"/api/versions/{versions[0]['id']}").json()["snapshot"]
+        assert [e["name"] for e in snapshot["entities"]] == ["Acme"]
+        assert snapshot["relations"] == []
+
+    def test_cascade_delete_keeps_other_users_types(self, authenticated_client, db_session, sample_user, sample_users):
+        authenticated_client.post("/api/entities/", json={"name": "Alice", "type": "person"})
+        db_session.add(models.EntityType(name="person", user_id=sample_users[0].id))
+        db_session.commit()
+
+        authenticated_client.delete("/api/entities/types/person")
+
+        owners = [user_id for (user_id,) in db_session.query(models.EntityType.user_id)]
+        assert owners == [sample_users[0].id]
+
+    def test_delete_unused_type_keeps_other_users_types(self, authenticated_client, db_session, sample_user, sample_users):
+        authenticated_client.post("/api/entities/types", json={"name": "robot"})
+        db_session.add(models.EntityType(name="robot", user_id=sample_users[0].id))
+        db_session.commit()
+
+        assert authenticated_client.delete("/api/entities/types/robot/only").status_code == 200
+
+        owners = [user_id for (user_id,) in db_session.query(models.EntityType.user_id)]
+        assert owners == [sample_users[0].id]
+
+
+def type_references(db_session, model, attribute, registry):
+    """Name of each row's type and of the registry entry it references."""
+    db_session.expire_all()
+    rows = db_session.query(getattr(model, attribute), registry.name).outerjoin(
+        registry, registry.id == getattr(model, REFERENCES[model])
+    )
+    return sorted(rows)
+
+
+class TestTypeReferences:
+    """Test that rows reference their registry entry by ID through every kind of write."""
+
+    def test_crud_links_rows(self, authenticated_client, db_session):
+        alice = authenticated_client.post("/api/entities/", json={"name": "Alice", "type": "person"}).json()
+        bob = authenticated_client.post("/api/entities/", json={"name": "Bob", "type": "person"}).json()
+        authenticated_client.post("/api/relations/", json={
+            "source_id": alice["id"], "target_id": bob["id"], "relation_type": "friend"
+        })
+        authenticated_client.put(f"/api/entities/{bob['id']}", json={"name": "Bob", "type": "organization"})
+
+        assert type_references(db_session, models.Entity, "type", models.EntityType) == [
+            ("organization", "organization"), ("person", "person")
+        ]
+        assert type_references(db_session, models.Relation, "relation_type", models.RelationType) == [
+            ("friend", "friend")
+        ]
+
+    def test_rename_keeps_reference(self, authenticated_client, db_session):
+        authenticated_client.post("/api/entities/", json={"name": "Alice", "type": "person"})
+        type_id = db_session.query(models.Entity.type_id).scalar()
+
+        authenticated_client.put("/api/entities/types/person?new_type=human")
+
+        assert db_session.query(models.Entity.type_id).scalar() == type_id
+        assert type_references(db_session, models.Entity, "type", models.EntityType) == [("human", "human")]
+
+    def test_batch_and_import_link_rows(self, authenticated_client, db_session):
+        authenticated_client.post("/api/batch", json={"operations": [
+            {"kind": "entity", "op": "create", "temp_id": "a", "name": "Alice", "type": "person"},
+            {"kind": "entity", "op": "create", "temp_id": "b", "name": "Acme", "type": "organization"},
+            {"kind": "relation", "op": "create", "source_id": "a", "target_id": "b", "relation_type": "member"},
+        ]})
+        assert type_references(db_session, models.Relation, "relation_type", models.RelationType) == [
+            ("member", "member")
+        ]
+
+        authenticated_client.post("/api/import?mode=merge", json={
+            "version": "1.0",
+            "entities": [{"id": 1, "name": "X", "type": "t"}],
+            "relations": [],
+        })
+        assert type_references(db_session, models.Entity, "type", models.EntityType) == [
+            ("organization", "organization"), ("person", "person"), ("t", "t")
+        ]
+
+
+class TestUsageBackfill:
+    """Test the migration's recount."""
+
+    def test_backfill_fixes_counts(self, db_session, sample_user, sample_entities, sample_entity_types):
+        db_session.query(models.EntityType).update({"usage_count": 99})
+        db_session.add(models.EntityType(name="person", user_id=sample_user.id))
+        db_session.commit()
+
+        assert backfill_usage_counts(db_session) == 1
+
+        counts = dict(db_session.query(models.EntityType.name, models.EntityType.usage_count))
+        assert counts == {"Organization": 0, "Person": 0, "Place": 0, "person": 3}
+        assert type_references(db_session, models.Entity, "type", models.EntityType) == [("person", "person")] * 3
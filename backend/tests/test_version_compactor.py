@@ -0,0 +1,162 @@
+"""
+Version Retention and Compaction Tests.
+Tests the retention policy and that compaction keeps remaining versions intact.
+"""
+
+import threading
+from datetime import datetime, timedelta
+from types import SimpleNamespace
+
+from models import Entity, SnapshotRecord, Version
+from version_compactor import RetentionPolicy, VersionCompactor
+from version_service import VersionService, entity_record
+
+
+NOW = datetime(2026, 1, 31, 12, 0, 0)
+
+
+def make_history(db_session, user, count, spacing=timedelta(minutes=20)):
+    """Create ``count`` delta versions, each adding one entity, spaced back from NOW."""
+    versions = []
+    for i in range(count):
+        entity = Entity(name=f"E{i}", type="person", user_id=user.id)
+        db_session.add(entity)
+        db_session.commit()
+        changes = {"entities": {"added": [entity_record(entity)]}}
+        version = VersionService.create_version(db_session, f"v{i + 1}", "system", user, changes)
+        version.created_at = NOW - spacing * (count - 1 - i)
+        versions.append(version)
+    db_session.commit()
+    return versions
+
+
+class TestRetentionPolicy:
+    """Test RetentionPolicy.select_kept."""
+
+    def version(self, id, age, created_by="system"):
+        return SimpleNamespace(id=id, created_at=NOW - age, created_by=created_by)
+
+    def test_keeps_last_n(self):
+        """Test that the latest versions are always kept."""
+        versions = [self.version(i, timedelta(days=400)) for i in range(5, 0, -1)]
+        policy = RetentionPolicy(keep_last=2, keep_hourly_hours=0, keep_daily_days=0)
+
+        assert policy.select_kept(versions, NOW) == {5, 4}
+
+    def test_keeps_newest_per_hour_and_day(self):
+        """Test hourly and daily checkpoints beyond the last N."""
+        versions = [
+            self.version(6, timedelta(minutes=0)),
+            self.version(5, timedelta(minutes=90)),
+            self.version(4, timedelta(minutes=100)),
+            self.version(3, timedelta(days=3, hours=1)),
+            self.version(2, timedelta(days=3, hours=2)),
+            self.version(1, timedelta(days=30)),
+        ]
+        policy = RetentionPolicy(keep_last=1, keep_hourly_hours=24, keep_daily_days=7)
+
+        assert policy.select_kept(versions, NOW) == {6, 5, 3}
+
+    def test_never_drops_user_checkpoints(self):
+        """Test that user-created versions are kept regardless of age."""
+        versions = [
+            self.version(3, timedelta(0)),
+            self.version(2, timedelta(days=400), created_by="user"),
+            self.version(1, timedelta(days=400)),
+        ]
+        policy = RetentionPolicy(keep_last=1, keep_hourly_hours=0, keep_daily_days=0)
+
+        assert policy.select_kept(versions, NOW) == {3, 2}
+
+
+class TestVersionCompactor:
+    """Test VersionCompactor.compact_user."""
+
+    def test_compaction_preserves_remaining_versions(self, db_session, sample_user):
+        """Test that every kept version rebuilds to the same graph after compaction."""
+        versions = make_history(db_session, sample_user, 12)
+        checkpoint = versions[3]
+        checkpoint.created_by = "user"
+        db_session.commit()
+        before = {v.id: VersionService.get_snapshot(db_session, v) for v in versions}
+
+        compactor = VersionCompactor(RetentionPolicy(keep_last=3, keep_hourly_hours=0, keep_daily_days=0), batch_size=2)
+        dropped = compactor.compact_user(db_session, sample_user.id, now=NOW)
+
+        remaining = VersionService.get_all_versions(db_session, sample_user.id)
+        assert dropped == 8
+        assert [v.version_number for v in remaining] == [12, 11, 10, 4]
+        for version in remaining:
+            assert VersionService.get_snapshot(db_session, version) == before[version.id]
+
+    def test_compaction_keeps_numbering(self, db_session, sample_user):
+        """Test that new versions continue numbering after compaction."""
+        make_history(db_session, sample_user, 5)
+        compactor = VersionCompactor(RetentionPolicy(keep_last=1, keep_hourly_hours=0, keep_daily_days=0))
+        compactor.compact_user(db_session, sample_user.id, now=NOW)
+
+        version = VersionService.create_version(db_session, "next", "system", sample_user)
+
+        assert version.version_number == 6
+
+    def test_restore_after_compaction(self, db_session, sample_user):
+        """Test restoring a version whose base snapshot was compacted away."""
+        versions = make_history(db_session, sample_user, 6)
+        kept = versions[2]
+        kept.created_by = "user"
+        db_session.commit()
+        compactor = VersionCompactor(RetentionPolicy(keep_last=1, keep_hourly_hours=0, keep_daily_days=0))
+        compactor.compact_user(db_session, sample_user.id, now=NOW)
+
+        VersionService.restore_version(db_session, kept.id, create_backup=False, user_id=sample_user.id)
+
+        assert sorted(e.name for e in db_session.query(Entity).all()) == ["E0", "E1", "E2"]
+
+    def test_unreferenced_records_are_collected(self, db_session, sample_user):
+        """Test that snapshot records only used by dropped versions are deleted."""
+        entity = Entity(name="Temp", type="person", user_id=sample_user.id)
+        db_session.add(entity)
+        db_session.commit()
+        VersionService.create_version(db_session, "v1", "system", sample_user)
+        db_session.delete(entity)
+        db_session.commit()
+        VersionService.create_version(db_session, "v2", "system", sample_user)
+        assert db_session.query(SnapshotRecord).count() == 1
+
+        compactor = VersionCompactor(RetentionPolicy(keep_last=1, keep_hourly_hours=0, keep_daily_days=0))
+        compactor.compact_user(db_session, sample_user.id, now=NOW)
+
+        assert db_session.query(Version).count() == 1
+        assert db_session.query(SnapshotRecord).count() == 0
+
+    def test_collection_waits_for_snapshot_reusing_a_record(self, db_session, sample_user):
+        """Test that a record reused by an uncommitted snapshot write is not collected."""
+        from tests.conftest import TestingSessionLocal
+
+        entity = Entity(name="Kept", type="person", user_id=sample_user.id)
+        db_session.add(entity)
+        db_session.commit()
+        snapshot = VersionService.get_current_snapshot(db_session, sample_user.id).model_dump()
+        VersionService._write_snapshot(db_session, sample_user.id, snapshot)
+        db_session.commit()  # the record now exists but no version references it
+
+        # The writer finds the record and reuses it, but has not committed yet
+        blob = VersionService._write_snapshot(db_session, sample_user.id, snapshot)
+        collected = []
+        collector_session = TestingSessionLocal()
+        collector = threading.Thread(
+            target=lambda: collected.append(VersionCompactor().collect_records(collector_session, sample_user.id))
+        )
+        collector.start()
+        collector.join(timeout=0.2)
+        assert collector.is_alive()
+
+        version = Version(version_number=1, description="v1", created_by="system", user_id=sample_user.id,
+                          snapshot_blob=blob, is_snapshot=True)
+        db_session.add(version)
+        db_session.commit()
+        collector.join(timeout=5)
+        collector_session.close()
+
+        assert collected == [0]
+        assert [e["name"] for e in VersionService.get_snapshot(db_session, version)["entities"]] == ["Kept"]
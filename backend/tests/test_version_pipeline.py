@@ -0,0 +1,187 @@
+"""
+Automatic Version Pipeline Tests.
+Tests coalescing of edits into versions and explicit flushing.
+"""
+
+import pytest
+from models import Entity, Version
+from version_pipeline import VersionPipeline, pipeline
+from version_service import VersionService
+
+
+def entity_added(entity_id, name):
+    return {"entities": {"added": [{"id": entity_id, "name": name, "type": "person", "description": None}]}}
+
+
+class TestVersionPipeline:
+    """Test VersionPipeline coalescing and flushing."""
+
+    def test_burst_is_merged_into_one_version(self, db_session, sample_user):
+        """Test that edits within the debounce window become one version."""
+        VersionService.create_version(db_session, "base", "system", sample_user)
+        versions = VersionPipeline(debounce_seconds=60)
+        versions.submit(sample_user.id, "Added entity: A", entity_added(1, "A"))
+        versions.submit(sample_user.id, "Added entity: B", entity_added(2, "B"))
+        versions.submit(sample_user.id, "Deleted entity: A", {"entities": {"removed": [1]}})
+
+        version = versions.flush(db_session, sample_user.id)
+
+        assert version.version_number == 2
+        assert version.description == "Added entity: A (+2 more changes)"
+        assert version.changes == entity_added(2, "B")
+        assert db_session.query(Version).count() == 2
+
+    def test_edits_outside_window_are_separate_versions(self, db_session, sample_user):
+        """Test that edits further apart than the window are not merged."""
+        versions = VersionPipeline(debounce_seconds=0)
+        versions.submit(sample_user.id, "first", entity_added(1, "A"))
+        versions.submit(sample_user.id, "second", entity_added(2, "B"))
+
+        versions.flush(db_session, sample_user.id)
+
+        written = VersionService.get_all_versions(db_session, sample_user.id)
+        assert [v.description for v in written] == ["second", "first"]
+
+    def test_flush_due_waits_for_window(self, db_session, sample_user, monkeypatch):
+        """Test that the worker only writes versions whose window has elapsed."""
+        monkeypatch.setattr("db.SessionLocal", lambda: db_session)
+        monkeypatch.setattr(db_session, "close", lambda: None)
+        versions = VersionPipeline(debounce_seconds=60)
+        versions.submit(sample_user.id, "pending", entity_added(1, "A"))
+
+        versions.flush_due()
+        assert versions.has_pending(sample_user.id)
+        assert db_session.query(Version).count() == 0
+
+        versions.debounce_seconds = 0
+        versions.flush_due()
+        assert not versions.has_pending(sample_user.id)
+        assert db_session.query(Version).count() == 1
+
+    def test_failed_write_keeps_pending_versions(self, db_session, sample_user, monkeypatch):
+        """Test that pending versions survive a failed write."""
+        versions = VersionPipeline(debounce_seconds=0)
+        versions.submit(sample_user.id, "first", entity_added(1, "A"))
+
+        def fail(*args, **kwargs):
+            raise RuntimeError("database unavailable")
+
+        monkeypatch.setattr(VersionService, "create_version", fail)
+        with pytest.raises(RuntimeError):
+            versions.flush(db_session, sample_user.id)
+
+        assert versions.has_pending(sample_user.id)
+
+    def test_failing_version_is_dropped_after_max_attempts(self, db_session, sample_user, monkeypatch):
+        """Test that a version failing every write is dropped and the next one is a full snapshot."""
+        VersionService.create_version(db_session, "base", "system", sample_user)
+        versions = VersionPipeline(debounce_seconds=0, max_attempts=2)
+        versions.submit(sample_user.id, "broken", entity_added(1, "A"))
+        create_version = VersionService.create_version
+
+        def fail_broken(database, description, *args, **kwargs):
+            if description == "broken":
+                raise RuntimeError("constraint violation")
+            return create_version(database, description, *args, **kwargs)
+
+        monkeypatch.setattr(VersionService, "create_version", fail_broken)
+        for _ in range(2):
+            with pytest.raises(RuntimeError):
+                versions.flush(db_session, sample_user.id)
+        assert not versions.has_pending(sample_user.id)
+
+        versions.submit(sample_user.id, "next", entity_added(2, "B"))
+        version = versions.flush(db_session, sample_user.id)
+
+        assert version.description == "next"
+        assert version.changes is None
+
+    def test_deleted_owner_queue_is_dropped(self, db_session, sample_user, monkeypatch):
+        """Test that the versions of a deleted user are dropped instead of retried."""
+        versions = VersionPipeline(debounce_seconds=0)
+        versions.submit(sample_user.id, "first", entity_added(1, "A"))
+        versions.submit(sample_user.id, "second", entity_added(2, "B"))
+        db_session.delete(sample_user)
+        db_session.commit()
+
+        def fail(*args, **kwargs):
+            raise RuntimeError("foreign key violation")
+
+        monkeypatch.setattr(VersionService, "create_version", fail)
+        assert versions.flush(db_session, sample_user.id) is None
+        assert not versions.has_pending(sample_user.id)
+
+    def test_resync_writes_full_snapshot_after_restart(self, db_session, sample_user):
+        """Test that edits whose deltas were lost in a restart reach the next version."""
+        VersionService.create_version(db_session, "base", "system", sample_user)
+        # Committed before the restart, but its pending delta was never written
+        db_session.add(Entity(name="Lost", type="person", user_id=sample_user.id))
+        db_session.commit()
+
+        versions = VersionPipeline(debounce_seconds=0)
+        assert versions.resync(db_session) == 1
+        versions.submit(sample_user.id, "Added entity: Next", entity_added(99, "Next"))
+        version = versions.flush(db_session, sample_user.id)
+
+        assert version.changes is None
+        assert [e["name"] for e in VersionService.get_snapshot(db_session, version)["entities"]] == ["Lost"]
+
+
+class TestPipelineEndpoints:
+    """Test that endpoints queue versions and flush them when needed."""
+
+    def test_edit_returns_before_version_is_written(self, authenticated_client, db_session, sample_user):
+        """Test that CRUD endpoints queue the version instead of writing it."""
+        VersionService.create_version(db_session, "base", "system", sample_user)
+        response = authenticated_client.post("/api/entities/", json={"name": "Queued", "type": "person"})
+        assert response.status_code == 200
+
+        assert pipeline.has_pending(sample_user.id)
+        assert db_session.query(Version).count() == 1
+
+    def test_first_version_is_written_immediately(self, authenticated_client, db_session, sample_user):
+        """Test that the first version captures the graph before later edits land."""
+        authenticated_client.post("/api/entities/", json={"name": "A", "type": "person"})
+        assert not pipeline.has_pending(sample_user.id)
+
+        authenticated_client.post("/api/entities/", json={"name": "B", "type": "person"})
+        first = VersionService.get_all_versions(db_session, sample_user.id)[-1]
+
+        assert [e["name"] for e in VersionService.get_snapshot(db_session, first)["entities"]] == ["A"]
+
+    def test_checkpoint_flushes_pending_versions(self, authenticated_client, sample_user):
+        """Test that a checkpoint is numbered after the pending automatic versions."""
+        authenticated_client.post("/api/entities/", json={"name": "A", "type": "person"})
+        authenticated_client.post("/api/entities/", json={"name": "B", "type": "person"})
+
+        checkpoint = authenticated_client.post("/api/versions/create-checkpoint?description=cp").json()
+
+        assert checkpoint["version_number"] == 3
+        assert not pipeline.has_pending(sample_user.id)
+
+    def test_checkpoint_after_lost_deltas_is_a_reload(self, authenticated_client, db_session, sample_user):
+        """Test that a checkpoint captures edits no version recorded as a full reload."""
+        authenticated_client.post("/api/entities/", json={"name": "A", "type": "person"})
+        pipeline.resync(db_session)
+
+        checkpoint = authenticated_client.post("/api/versions/create-checkpoint?description=cp").json()
+
+        assert VersionService.get_version(db_session, checkpoint["id"], sample_user.id).changes is None
+        assert not pipeline.claim_snapshot(sample_user.id)
+
+    def test_index_failure_does_not_fail_committed_edit(self, authenticated_client, db_session, sample_user, monkeypatch):
+        """Test that an in-memory index that cannot apply a delta is invalidated instead."""
+        from graph_index import index as graph_index
+
+        VersionService.create_version(db_session, "base", "system", sample_user)
+        graph_index.get(db_session, sample_user.id)
+
+        def fail(*args, **kwargs):
+            raise RuntimeError("index out of sync")
+
+        monkeypatch.setattr(graph_index, "apply_changes", fail)
+        response = authenticated_client.post("/api/entities/", json={"name": "A", "type": "person"})
+
+        assert response.status_code == 200
+        assert pipeline.has_pending(sample_user.id)
+        assert not graph_index.is_loaded(sample_user.id)
@@ -4,8 +4,10 @@ Tests cover version creation, retrieval, and restoration scenarios.
 """
 
 import pytest
-from models import Version, Entity, Relation, RelationType, EntityType
-from version_service import VersionService
+from models import Version, Entity, Relation, RelationType, EntityType, SnapshotRecord
+from version_service import VersionService, apply_changes
+from version_compactor import RetentionPolicy, VersionCompactor
+import version_service
 
 
 class TestVersionService:
@@ -18,17 +20,19 @@ class TestVersionService:
         assert version.version_number == 1
         assert version.description == "Initial version"
         assert version.created_by == "system"
-        assert version.snapshot is not None
-        assert len(version.snapshot["entities"]) == 0
-        assert len(version.snapshot["relations"]) == 0
+        snapshot = VersionService.get_snapshot(db_session, version)
+        assert snapshot is not None
+        assert len(snapshot["entities"]) == 0
+        assert len(snapshot["relations"]) == 0
 
     def test_create_version_with_data(self, db_session, sample_user, sample_entities):
         """Test creating version with entities in database."""
         version = VersionService.create_version(db_session, "With entities", "system", sample_user)
         
         assert version.version_number == 1
-        assert len(version.snapshot["entities"]) == 3
-        assert version.snapshot["entities"][0]["name"] == "Alice"
+        snapshot = VersionService.get_snapshot(db_session, version)
+        assert len(snapshot["entities"]) == 3
+        assert snapshot["entities"][0]["name"] == "Alice"
 
     def test_create_version_increments_number(self, db_session, sample_user, sample_entities):
         """Test that version numbers increment properly."""
@@ -137,6 +141,53 @@ class TestVersionService:
         relations = db_session.query(Relation).all()
         assert len(relations) == 2
 
+    def test_restore_version_keeps_ids(self, db_session, sample_user, sample_entities, sample_relations):
+        """Test that restored entities keep their IDs so relations stay valid."""
+        v1 = VersionService.create_version(db_session, "v1", "system", sample_user)
+        expected = {(r.id, r.source_id, r.target_id) for r in sample_relations}
+        entity_ids = {e.id for e in sample_entities}
+
+        db_session.query(Relation).delete()
+        db_session.query(Entity).delete()
+        db_session.commit()
+        VersionService.restore_version(db_session, v1.id, create_backup=False, user_id=sample_user.id)
+
+        assert {e.id for e in db_session.query(Entity).all()} == entity_ids
+        assert {(r.id, r.source_id, r.target_id) for r in db_session.query(Relation).all()} == expected
+
+    def test_restore_version_remaps_ids_taken_by_other_user(self, db_session, sample_user, sample_users, sample_entities, sample_relations):
+        """Test that an ID reused by another user is remapped together with its relations."""
+        v1 = VersionService.create_version(db_session, "v1", "system", sample_user)
+        alice = sample_entities[0]
+        alice_id = alice.id
+
+        db_session.query(Relation).delete()
+        db_session.query(Entity).filter(Entity.id == alice_id).delete()
+        db_session.commit()
+        db_session.add(Entity(id=alice_id, name="Other", type="person", user_id=sample_users[0].id))
+        db_session.commit()
+
+        VersionService.restore_version(db_session, v1.id, create_backup=False, user_id=sample_user.id)
+
+        restored = db_session.query(Entity).filter(Entity.user_id == sample_user.id, Entity.name == "Alice").one()
+        assert restored.id != alice_id
+        friend = db_session.query(Relation).filter(Relation.relation_type == "friend").one()
+        assert friend.source_id == restored.id
+        assert friend.target_id == sample_entities[1].id
+
+    def test_restore_version_is_atomic(self, db_session, sample_user, sample_entities, monkeypatch):
+        """Test that a failed restore leaves the current graph untouched."""
+        v1 = VersionService.create_version(db_session, "v1", "system", sample_user)
+
+        def fail(*args, **kwargs):
+            raise RuntimeError("insert failed")
+
+        monkeypatch.setattr(VersionService, "_insert_snapshot", fail)
+        with pytest.raises(RuntimeError):
+            VersionService.restore_version(db_session, v1.id, create_backup=False, user_id=sample_user.id)
+
+        assert db_session.query(Entity).count() == 3
+
     def test_restore_version_not_found(self, db_session, sample_user):
         """Test restoring non-existent version."""
         with pytest.raises(ValueError):
@@ -146,7 +197,7 @@ class TestVersionService:
         """Test that snapshot includes entities, relations, and types."""
         v1 = VersionService.create_version(db_session, "v1", "system", sample_user)
         
-        snapshot = v1.snapshot
+        snapshot = VersionService.get_snapshot(db_session, v1)
         assert "entities" in snapshot
         assert "relations" in snapshot
         assert "entity_types" in snapshot
@@ -160,6 +211,260 @@ class TestVersionService:
         assert len(snapshot["relation_types"]) == 3
 
 
+class TestDeltaVersions:
+    """Test delta-encoded version storage."""
+
+    def test_version_with_changes_stores_delta(self, db_session, sample_user, sample_entities):
+        """Test that versions after the first snapshot only store the delta."""
+        v1 = VersionService.create_version(db_session, "v1", "system", sample_user)
+        changes = {"entities": {"removed": [sample_entities[0].id]}}
+        v2 = VersionService.create_version(db_session, "v2", "system", sample_user, changes)
+
+        assert v1.is_snapshot is True
+        assert v2.is_snapshot is False
+        assert v2.snapshot_blob is None
+        assert v2.changes == changes
+
+    def test_full_snapshot_written_every_interval(self, db_session, sample_user, monkeypatch):
+        """Test that a full snapshot is written every SNAPSHOT_INTERVAL versions."""
+        monkeypatch.setattr(version_service, "SNAPSHOT_INTERVAL", 3)
+        versions = [
+            VersionService.create_version(db_session, f"v{i}", "system", sample_user, {})
+            for i in range(7)
+        ]
+
+        assert [v.is_snapshot for v in versions] == [True, False, False, True, False, False, True]
+
+    def test_counts_stored_at_write_time(self, db_session, sample_user, sample_entities, sample_relations):
+        """Test that graph sizes are stored for full and delta versions."""
+        v1 = VersionService.create_version(db_session, "v1", "system", sample_user)
+        changes = {
+            "entities": {"removed": [sample_entities[0].id]},
+            "relations": {"removed": [sample_relations[0].id]},
+        }
+        v2 = VersionService.create_version(db_session, "v2", "system", sample_user, changes)
+
+        assert (v1.entity_count, v1.relation_count) == (3, len(sample_relations))
+        assert (v2.entity_count, v2.relation_count) == (2, len(sample_relations) - 1)
+
+    def test_get_snapshot_applies_deltas(self, db_session, sample_user, sample_entities):
+        """Test that a delta version is rebuilt from the nearest full snapshot."""
+        VersionService.create_version(db_session, "v1", "system", sample_user)
+        alice, bob, _ = sample_entities
+        VersionService.create_version(db_session, "v2", "system", sample_user, {
+            "entities": {"changed": [{"id": alice.id, "name": "Alicia", "type": "person", "description": None}]},
+        })
+        v3 = VersionService.create_version(db_session, "v3", "system", sample_user, {
+            "entities": {"removed": [bob.id]},
+            "entity_types": {"added": [{"name": "robot"}]},
+        })
+
+        snapshot = VersionService.get_snapshot(db_session, v3)
+
+        names = {e["name"] for e in snapshot["entities"]}
+        assert names == {"Alicia", "Charlie"}
+        assert {"name": "robot"} in snapshot["entity_types"]
+
+    def test_restore_delta_version(self, db_session, sample_user, sample_entities):
+        """Test that restoring a delta version rebuilds the graph it describes."""
+        VersionService.create_version(db_session, "v1", "system", sample_user)
+        removed = sample_entities[2]
+        db_session.delete(removed)
+        db_session.commit()
+        v2 = VersionService.create_version(db_session, "v2", "system", sample_user, {
+            "entities": {"removed": [removed.id]},
+        })
+        assert v2.is_snapshot is False
+
+        VersionService.restore_version(db_session, v2.id, create_backup=False, user_id=sample_user.id)
+
+        assert sorted(e.name for e in db_session.query(Entity).all()) == ["Alice", "Bob"]
+
+    def test_apply_changes_removes_and_upserts(self):
+        """Test applying a delta to a snapshot dict."""
+        snapshot = {
+            "entities": [{"id": 1, "name": "A"}, {"id": 2, "name": "B"}],
+            "relations": [],
+            "entity_types": [{"name": "person"}],
+            "relation_types": [],
+        }
+        result = apply_changes(snapshot, {
+            "entities": {"added": [{"id": 3, "name": "C"}], "changed": [{"id": 1, "name": "A2"}], "removed": [2]},
+        })
+
+        assert result["entities"] == [{"id": 1, "name": "A2"}, {"id": 3, "name": "C"}]
+        assert result["entity_types"] == [{"name": "person"}]
+        # The input snapshot is left untouched
+        assert snapshot["entities"][0]["name"] == "A"
+
+
+class TestSnapshotStorage:
+    """Test compressed, content-addressed snapshot storage."""
+
+    def test_snapshot_stored_as_compressed_manifest(self, db_session, sample_user, sample_entities, sample_relations):
+        """Test that a full snapshot is stored as a manifest of record hashes."""
+        version = VersionService.create_version(db_session, "v1", "system", sample_user)
+
+        assert version.snapshot is None
+        assert version.snapshot_blob is not None
+        assert db_session.query(SnapshotRecord).count() == 5
+
+    def test_identical_records_are_stored_once(self, db_session, sample_user, sample_entities, sample_relations):
+        """Test that unchanged records are shared between snapshots."""
+        VersionService.create_version(db_session, "v1", "system", sample_user)
+        sample_entities[0].description = "Changed"
+        db_session.commit()
+        v2 = VersionService.create_version(db_session, "v2", "system", sample_user)
+
+        # Only the changed entity adds a new record
+        assert db_session.query(SnapshotRecord).count() == 6
+        snapshot = VersionService.get_snapshot(db_session, v2)
+        assert {e["description"] for e in snapshot["entities"]} == {"Changed", "Bob person", "Charlie person"}
+
+    def test_legacy_snapshot_is_read_transparently(self, authenticated_client, db_session, sample_user):
+        """Test that versions with an uncompressed JSON snapshot are still readable."""
+        legacy = Version(
+            user_id=sample_user.id,
+            version_number=1,
+            description="Legacy",
+            snapshot={
+                "entities": [{"id": 1, "name": "Old", "type": "person", "description": None}],
+                "relations": [],
+                "entity_types": [{"name": "person"}],
+                "relation_types": [],
+            },
+            created_by="system",
+        )
+        db_session.add(legacy)
+        db_session.commit()
+
+        response = authenticated_client.get(f"/api/versions/{legacy.id}")
+        assert response.status_code == 200
+        assert response.json()["snapshot"]["entities"][0]["name"] == "Old"
+
+    def test_backfill_version_counts(self, db_session, sample_user, sample_entities):
+        """Test storing graph sizes on versions written before they were tracked."""
+        from migrate_versions import backfill_version_counts
+
+        v1 = VersionService.create_version(db_session, "v1", "system", sample_user)
+        v2 = VersionService.create_version(
+            db_session, "v2", "system", sample_user, {"entities": {"removed": [sample_entities[0].id]}}
+        )
+        for version in (v1, v2):
+            version.entity_count = version.relation_count = None
+        db_session.commit()
+
+        assert backfill_version_counts(db_session) == 2
+        assert (v1.entity_count, v2.entity_count) == (3, 2)
+        assert (v1.relation_count, v2.relation_count) == (0, 0)
+
+    def test_migrate_legacy_snapshots(self, db_session, sample_user):
+        """Test converting legacy snapshots to compressed manifests."""
+        from migrate_versions import migrate_legacy_snapshots
+
+        snapshot = {
+            "entities": [{"id": 1, "name": "Old", "type": "person", "description": None}],
+            "relations": [],
+            "entity_types": [{"name": "person"}],
+            "relation_types": [],
+        }
+        legacy = Version(user_id=sample_user.id, version_number=1, snapshot=snapshot, created_by="system")
+        db_session.add(legacy)
+        db_session.commit()
+
+        assert migrate_legacy_snapshots(db_session) == 1
+
+        db_session.refresh(legacy)
+        assert legacy.snapshot is None
+        assert legacy.snapshot_blob is not None
+        assert VersionService.get_snapshot(db_session, legacy) == snapshot
+
+
+class TestVersionDiff:
+    """Test diffs between versions."""
+
+    def make_versions(self, db_session, sample_user, sample_entities):
+        v1 = VersionService.create_version(db_session, "v1", "system", sample_user)
+        alice, bob, charlie = sample_entities
+        bob.name = "Robert"
+        dave = Entity(name="Dave", type="person", user_id=sample_user.id)
+        db_session.add(dave)
+        db_session.delete(charlie)
+        db_session.commit()
+        changes = {
+            "entities": {
+                "added": [version_service.entity_record(dave)],
+                "changed": [version_service.entity_record(bob)],
+                "removed": [charlie.id],
+            }
+        }
+        v2 = VersionService.create_version(db_session, "v2", "system", sample_user, changes)
+        return v1, v2, (bob.id, charlie.id, dave.id)
+
+    def test_forward_diff_from_deltas(self, db_session, sample_user, sample_entities):
+        """Test that merged deltas and snapshot comparison give the same diff."""
+        v1, v2, (bob_id, charlie_id, dave_id) = self.make_versions(db_session, sample_user, sample_entities)
+
+        items = VersionService.diff_versions(db_session, v1, v2)
+
+        assert [(i["op"], i["key"]) for i in items] == [("added", dave_id), ("changed", bob_id), ("removed", charlie_id)]
+        assert items == version_service.flatten_changes(
+            version_service.diff_snapshots(
+                VersionService.get_snapshot(db_session, v1), VersionService.get_snapshot(db_session, v2)
+            )
+        )
+
+    def test_backward_diff_compares_snapshots(self, db_session, sample_user, sample_entities):
+        """Test diffing from a newer version to an older one."""
+        v1, v2, (bob_id, charlie_id, dave_id) = self.make_versions(db_session, sample_user, sample_entities)
+
+        items = VersionService.diff_versions(db_session, v2, v1)
+
+        assert [(i["op"], i["key"]) for i in items] == [("added", charlie_id), ("changed", bob_id), ("removed", dave_id)]
+        assert items[1]["record"]["name"] == "Bob"
+
+    def test_diff_cache_is_bounded_by_records(self, db_session, sample_user, sample_entities, monkeypatch):
+        """Test that cached diffs are weighed by their records and oversized ones are not kept."""
+        v1, v2, _ = self.make_versions(db_session, sample_user, sample_entities)
+        monkeypatch.setattr(version_service, "VERSION_DIFF_CACHE_MAX_ITEMS", 2)
+
+        VersionService.diff_versions(db_session, v1, v2)
+        assert len(version_service._diff_cache) == 0
+
+        monkeypatch.setattr(version_service, "VERSION_DIFF_CACHE_MAX_ITEMS", 3)
+        monkeypatch.setattr(version_service._diff_cache, "max_weight", 3)
+        VersionService.diff_versions(db_session, v1, v2)
+        assert version_service._diff_cache.total_weight == 3
+        VersionService.diff_versions(db_session, v2, v1)
+        assert len(version_service._diff_cache) == 1  # the older diff was evicted
+
+    def test_diff_endpoint_pages(self, authenticated_client, db_session, sample_user):
+        """Test paging through a diff and its summary."""
+        for i in range(5):
+            authenticated_client.post("/api/entities/", json={"name": f"Entity{i}", "type": "person"})
+        versions = authenticated_client.get("/api/versions").json()
+        newest, oldest = versions[0]["id"], versions[-1]["id"]
+
+        first = authenticated_client.get(f"/api/versions/{oldest}/diff/{newest}?limit=3").json()
+        second = authenticated_client.get(
+            f"/api/versions/{oldest}/diff/{newest}?limit=3&offset={first['next_offset']}"
+        ).json()
+
+        assert first["total"] == 4
+        assert first["summary"] == {"entities": {"added": 4}}
+        assert [i["record"]["name"] for i in first["items"] + second["items"]] == [f"Entity{i}" for i in range(1, 5)]
+        assert second["next_offset"] is None
+
+    def test_diff_endpoint_unknown_version(self, authenticated_client):
+        """Test diffing against a version that does not exist."""
+        authenticated_client.post("/api/entities/", json={"name": "A", "type": "person"})
+        version_id = authenticated_client.get("/api/versions").json()[0]["id"]
+
+        response = authenticated_client.get(f"/api/versions/{version_id}/diff/99999")
+
+        assert response.status_code == 404
+
+
 class TestVersionEndpoints:
     """Test version management API endpoints."""
 
@@ -196,6 +501,19 @@ class TestVersionEndpoints:
         versions = response.json()
         assert len(versions) == 3
 
+    def test_list_versions_keyset_pagination(self, authenticated_client):
+        """Test paging through versions with before/limit."""
+        for i in range(5):
+            authenticated_client.post("/api/entities/", json={"name": f"Entity{i}", "type": "person"})
+
+        first = authenticated_client.get("/api/versions?limit=2").json()
+        second = authenticated_client.get(f"/api/versions?limit=2&before={first[-1]['version_number']}").json()
+        last = authenticated_client.get(f"/api/versions?limit=2&before={second[-1]['version_number']}").json()
+
+        assert [v["version_number"] for v in first + second + last] == [5, 4, 3, 2, 1]
+        assert [v["entity_count"] for v in first] == [5, 4]
+        assert "snapshot" not in first[0]
+
     def test_get_version(self, authenticated_client):
         """Test getting a specific version."""
         # Create entity (creates v1)
@@ -213,6 +531,20 @@ class TestVersionEndpoints:
         assert version["version_number"] == 1
         assert version["snapshot"]["entities"][0]["name"] == "Test"
 
+    def test_get_delta_version_returns_full_snapshot(self, authenticated_client):
+        """Test that a delta version is returned with its rebuilt snapshot."""
+        authenticated_client.post("/api/entities/", json={"name": "First", "type": "person"})
+        created = authenticated_client.post("/api/entities/", json={"name": "Second", "type": "person"}).json()
+        authenticated_client.put(f"/api/entities/{created['id']}", json={"name": "Renamed", "type": "place"})
+
+        latest = authenticated_client.get("/api/versions").json()[0]
+        response = authenticated_client.get(f"/api/versions/{latest['id']}")
+        assert response.status_code == 200
+        version = response.json()
+        assert sorted(e["name"] for e in version["snapshot"]["entities"]) == ["First", "Renamed"]
+        assert {"name": "place"} in version["snapshot"]["entity_types"]
+        assert version["changes"]["entities"]["changed"][0]["name"] == "Renamed"
+
     def test_get_version_not_found(self, authenticated_client):
         """Test getting non-existent version."""
         response = authenticated_client.get("/api/versions/999")
@@ -331,3 +663,55 @@ class TestVersionEndpoints:
         # Verify custom type still exists
         types = authenticated_client.get("/api/entities/types").json()
         assert "CustomType" in types
+
+
+class TestChangesEndpoint:
+    """Test GET /api/changes."""
+
+    def test_changes_since_version(self, authenticated_client):
+        """Test that only the edits after the given version are returned."""
+        alice = authenticated_client.post("/api/entities/", json={"name": "Alice", "type": "person"}).json()
+        since = authenticated_client.get("/api/changes?since=0").json()["version_number"]
+        bob = authenticated_client.post("/api/entities/", json={"name": "Bob", "type": "person"}).json()
+        authenticated_client.put(f"/api/entities/{alice['id']}", json={"name": "Alicia", "type": "person"})
+        authenticated_client.post("/api/relations/", json={
+            "source_id": alice["id"], "target_id": bob["id"], "relation_type": "knows"
+        })
+
+        data = authenticated_client.get(f"/api/changes?since={since}").json()
+
+        assert data["full_reload"] is False
+        assert data["version_number"] == since + 3
+        changes = data["changes"]
+        assert [e["name"] for e in changes["entities"]["added"]] == ["Bob"]
+        assert [e["name"] for e in changes["entities"]["changed"]] == ["Alicia"]
+        assert [r["relation_type"] for r in changes["relations"]["added"]] == ["knows"]
+        assert [t["name"] for t in changes["relation_types"]["added"]] == ["knows"]
+
+    def test_up_to_date_client_gets_no_changes(self, authenticated_client, sample_entities):
+        authenticated_client.post("/api/entities/", json={"name": "Dave", "type": "person"})
+        current = authenticated_client.get("/api/changes?since=0").json()["version_number"]
+
+        data = authenticated_client.get(f"/api/changes?since={current}").json()
+
+        assert (data["changes"], data["full_reload"]) == ({}, False)
+
+    def test_compacted_history_requires_full_reload(self, authenticated_client, db_session, sample_user):
+        """Test that a since version removed by compaction asks for a full reload."""
+        for name in ("A", "B", "C"):
+            authenticated_client.post("/api/entities/", json={"name": name, "type": "person"})
+        authenticated_client.get("/api/changes?since=0")  # writes the pending versions
+        VersionCompactor(RetentionPolicy(keep_last=1, keep_hourly_hours=0, keep_daily_days=0)).compact_user(
+            db_session, sample_user.id
+        )
+
+        data = authenticated_client.get("/api/changes?since=1").json()
+
+        assert data["full_reload"] is True
+        assert data["changes"] is None
+        assert data["version_number"] == 3
+
+    def test_since_ahead_of_history_requires_full_reload(self, authenticated_client, sample_entities):
+        authenticated_client.post("/api/entities/", json={"name": "Dave", "type": "person"})
+
+        assert authenticated_client.get("/api/changes?since=99").json()["full_reload"] is True
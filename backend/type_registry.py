@@ -0,0 +1,216 @@
+"""The per-user entity and relation type registries and their usage counts.
+
+Entities and relations reference their registry entry by ID
+(``Entity.type_id``, ``Relation.relation_type_id``), and ``entity_types`` /
+``relation_types`` rows carry ``usage_count``, the number of the user's
+entities / relations of that type, so listing types with their counts reads
+one row per type.  References and counters are maintained in the same
+transaction as the rows:
+
+- ORM writes (CRUD, batches) are linked by a session ``before_flush`` hook and
+  counted by an ``after_flush`` hook from the objects added, deleted or
+  retyped in the flush; types are registered before the rows using them are
+  flushed, as before.
+- Type renames and cascade deletes are set-based (``rename_type``,
+  ``cascade_delete_entity_type``): a renamed registry entry keeps its ID and
+  count, and deletes adjust the counters from the rows their statements
+  return.  Registry entries must be renamed with ``rename_type``, not through
+  the ORM.
+- Bulk statements that bypass the ORM (imports, restores) call
+  ``recount_usage`` for the user afterwards, which links the rows too.
+
+The type name is also kept on every row (``Entity.type``,
+``Relation.relation_type``): it is what versions, exports, search and the API
+exchange, and what the graph indexes load without a join.  ``rename_type``
+updates both in one statement.
+"""
+
+from collections import Counter, defaultdict
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from sqlalchemy import Row, delete, event, func, insert, inspect, or_, select, update
+from sqlalchemy.engine import Connection
+from sqlalchemy.orm import Session
+
+from models import Entity, EntityType, Relation, RelationType
+
+# Counted model -> (registry model, type attribute)
+COUNTED = {Entity: (EntityType, "type"), Relation: (RelationType, "relation_type")}
+REGISTRIES = {EntityType: (Entity, "type"), RelationType: (Relation, "relation_type")}
+# Counted model -> column referencing its registry entry
+REFERENCES = {Entity: "type_id", Relation: "relation_type_id"}
+
+UsageKey = Tuple[type, int, str]
+
+
+def _type_name(obj, attribute: str, current: bool = True) -> Optional[str]:
+    history = inspect(obj).attrs[attribute].history
+    if current:
+        values = history.added or history.unchanged
+    else:
+        values = history.deleted or history.unchanged
+    return values[0] if values else None
+
+
+def usage_deltas(session: Session) -> Dict[UsageKey, int]:
+    """Counter changes implied by the objects of a flush."""
+    deltas: Dict[UsageKey, int] = defaultdict(int)
+    for obj in session.new:
+        if type(obj) in COUNTED:
+            registry, attribute = COUNTED[type(obj)]
+            deltas[(registry, obj.user_id, getattr(obj, attribute))] += 1
+    for obj in session.deleted:
+        if type(obj) in COUNTED:
+            registry, attribute = COUNTED[type(obj)]
+            deltas[(registry, obj.user_id, _type_name(obj, attribute, current=False))] -= 1
+    for obj in session.dirty:
+        if obj in session.deleted:
+            continue
+        if type(obj) in COUNTED:
+            registry, attribute = COUNTED[type(obj)]
+            old, new = _type_name(obj, attribute, current=False), _type_name(obj, attribute)
+            if old != new:
+                deltas[(registry, obj.user_id, old)] -= 1
+                deltas[(registry, obj.user_id, new)] += 1
+    return {key: delta for key, delta in deltas.items() if delta and key[2]}
+
+
+def _retyped(session: Session) -> Dict[UsageKey, List]:
+    """New and retyped counted objects of a pending flush, by their type."""
+    retyped: Dict[UsageKey, List] = defaultdict(list)
+    for obj in list(session.new) + list(session.dirty):
+        if type(obj) not in COUNTED or obj in session.deleted:
+            continue
+        registry, attribute = COUNTED[type(obj)]
+        name = getattr(obj, attribute)
+        if obj in session.new or _type_name(obj, attribute, current=False) != name:
+            retyped[(registry, obj.user_id, name)].append(obj)
+    return retyped
+
+
+@event.listens_for(Session, "before_flush")
+def _link_flushed_types(session: Session, flush_context, instances) -> None:
+    retyped = _retyped(session)
+    if not retyped:
+        return
+    # Types registered in the same flush get their IDs when it inserts them
+    pending = {(type(obj), obj.user_id, obj.name): obj for obj in session.new if type(obj) in REGISTRIES}
+    with session.no_autoflush:
+        for (registry, user_id, name), objects in retyped.items():
+            entry = pending.get((registry, user_id, name))
+            if entry is None:
+                entry = session.scalars(
+                    select(registry).where(registry.user_id == user_id, registry.name == name)
+                ).first()
+            for obj in objects:
+                obj.type_entry = entry
+
+
+def adjust_usage(connection: Connection, registry, user_id: int, name: str, delta: int) -> None:
+    """Add ``delta`` to a registered type's counter (unregistered types are not counted)."""
+    connection.execute(
+        update(registry)
+        .where(registry.user_id == user_id, registry.name == name)
+        .values(usage_count=registry.usage_count + delta)
+    )
+
+
+@event.listens_for(Session, "after_flush")
+def _count_flushed_usage(session: Session, flush_context) -> None:
+    deltas = usage_deltas(session)
+    if not deltas:
+        return
+    connection = session.connection()
+    for (registry, user_id, name), delta in sorted(deltas.items(), key=lambda item: (item[0][0].__name__, *item[0][1:])):
+        adjust_usage(connection, registry, user_id, name, delta)
+
+
+def recount_usage(database: Session, user_id: int, registries: Iterable = (EntityType, RelationType)) -> None:
+    """Link a user's rows to their registry entries and recompute the counters (after bulk statements)."""
+    for registry in registries:
+        model, attribute = REGISTRIES[registry]
+        column = getattr(model, attribute)
+        entry = (
+            select(registry.id)
+            .where(registry.user_id == model.user_id, registry.name == column)
+            .scalar_subquery()
+        )
+        database.execute(
+            update(model).where(model.user_id == user_id).values({REFERENCES[model]: entry}),
+            execution_options={"synchronize_session": False},
+        )
+        counted = (
+            select(func.count())
+            .where(model.user_id == registry.user_id, column == registry.name)
+            .scalar_subquery()
+        )
+        database.execute(
+            update(registry).where(registry.user_id == user_id).values(usage_count=counted),
+            execution_options={"synchronize_session": False},
+        )
+
+
+def rename_type(database: Session, registry, user_id: int, old_name: str, new_name: str) -> Tuple[List[Row], Optional[Row]]:
+    """Rename a type with one UPDATE of its rows and one of its registry entry.
+
+    Returns the renamed rows and the (id, name) of the registry entry, which is
+    None when the type was neither registered nor used.  The entry keeps its ID
+    and count, since the same rows reference it; a used but unregistered type
+    is registered and the rows are linked to it.
+    """
+    model, attribute = REGISTRIES[registry]
+    rows = database.execute(
+        update(model)
+        .where(model.user_id == user_id, getattr(model, attribute) == old_name)
+        .values({attribute: new_name})
+        .returning(*model.__table__.columns),
+        execution_options={"synchronize_session": False},
+    ).all()
+    entry = database.execute(
+        update(registry)
+        .where(registry.user_id == user_id, registry.name == old_name)
+        .values(name=new_name)
+        .returning(registry.id, registry.name),
+        execution_options={"synchronize_session": False},
+    ).first()
+    if entry is None and rows:
+        entry = database.execute(
+            insert(registry)
+            .values(user_id=user_id, name=new_name, usage_count=len(rows))
+            .returning(registry.id, registry.name)
+        ).first()
+        database.execute(
+            update(model)
+            .where(model.user_id == user_id, getattr(model, attribute) == new_name)
+            .values({REFERENCES[model]: entry.id}),
+            execution_options={"synchronize_session": False},
+        )
+    return rows, entry
+
+
+def cascade_delete_entity_type(database: Session, user_id: int, name: str) -> Tuple[List[int], List[int], int]:
+    """Delete an entity type, its entities and their relations with one DELETE each.
+
+    Returns the deleted entity IDs, the deleted relation IDs and the number of
+    registry entries removed.  The counters of the deleted relations' types are
+    decreased by the number deleted per type.
+    """
+    typed = select(Entity.id).where(Entity.user_id == user_id, Entity.type == name)
+    relations = database.execute(
+        delete(Relation)
+        .where(Relation.user_id == user_id, or_(Relation.source_id.in_(typed), Relation.target_id.in_(typed)))
+        .returning(Relation.id, Relation.relation_type),
+        execution_options={"synchronize_session": False},
+    ).all()
+    entity_ids = database.scalars(
+        delete(Entity).where(Entity.user_id == user_id, Entity.type == name).returning(Entity.id),
+        execution_options={"synchronize_session": False},
+    ).all()
+    connection = database.connection()
+    for relation_type, count in sorted(Counter(row.relation_type for row in relations).items()):
+        adjust_usage(connection, RelationType, user_id, relation_type, -count)
+    removed = database.execute(
+        delete(EntityType).where(EntityType.user_id == user_id, EntityType.name == name),
+        execution_options={"synchronize_session": False},
+    ).rowcount
+    return sorted(entity_ids), sorted(row.id for row in relations), removed
@@ -0,0 +1,230 @@
+"""Retention policy and background compaction for version history.
+
+The policy keeps the latest ``VERSION_KEEP_LAST`` versions of each user, then
+the newest version of every hour for ``VERSION_KEEP_HOURLY_HOURS`` hours and
+of every day for ``VERSION_KEEP_DAILY_DAYS`` days.  User checkpoints
+(``created_by == "user"``) are never dropped.
+
+Dropped versions are removed in small batches, each in its own transaction.
+The delta of a dropped run is folded into the version that follows it, and
+that version is promoted to a full snapshot when the run contained its base
+snapshot, so every remaining version rebuilds to exactly the same graph as
+before.  Version numbers are never reused or renumbered.
+"""
+
+import logging
+import os
+import threading
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional, Set
+
+from sqlalchemy import func
+from sqlalchemy.orm import Session
+
+import db
+from models import SnapshotRecord, Version
+from version_service import (
+    RECORD_LOOKUP_CHUNK,
+    RECORD_SECTIONS,
+    VersionService,
+    decode_blob,
+    lock_snapshot_records,
+    merge_changes,
+    unpack_hashes,
+)
+
+logger = logging.getLogger(__name__)
+
+VERSION_KEEP_LAST = int(os.getenv("VERSION_KEEP_LAST", "100"))
+VERSION_KEEP_HOURLY_HOURS = int(os.getenv("VERSION_KEEP_HOURLY_HOURS", "48"))
+VERSION_KEEP_DAILY_DAYS = int(os.getenv("VERSION_KEEP_DAILY_DAYS", "90"))
+# How often the background compactor runs, and how many versions it drops per transaction
+VERSION_COMPACTION_INTERVAL_SECONDS = float(os.getenv("VERSION_COMPACTION_INTERVAL_SECONDS", "3600"))
+VERSION_COMPACTION_BATCH_SIZE = int(os.getenv("VERSION_COMPACTION_BATCH_SIZE", "100"))
+
+
+@dataclass
+class RetentionPolicy:
+    """Which versions of a user to keep."""
+    keep_last: int = VERSION_KEEP_LAST
+    keep_hourly_hours: int = VERSION_KEEP_HOURLY_HOURS
+    keep_daily_days: int = VERSION_KEEP_DAILY_DAYS
+
+    def select_kept(self, versions: List, now: datetime) -> Set[int]:
+        """Return the IDs of the versions to keep, given versions newest first.
+
+        Each item needs ``id``, ``created_at`` and ``created_by``.
+        """
+        kept = {v.id for v in versions[:max(1, self.keep_last)]}
+        hourly_since = now - timedelta(hours=self.keep_hourly_hours)
+        daily_since = now - timedelta(days=self.keep_daily_days)
+        seen_buckets = set()
+
+        for version in versions:
+            if version.created_by == "user" or version.created_at is None:
+                kept.add(version.id)
+                continue
+            created_at = version.created_at
+            if created_at >= hourly_since:
+                bucket = ("hour", created_at.replace(minute=0, second=0, microsecond=0))
+            elif created_at >= daily_since:
+                bucket = ("day", created_at.date())
+            else:
+                continue
+            if bucket not in seen_buckets:
+                # Versions are newest first, so the first one seen is the newest in its bucket
+                seen_buckets.add(bucket)
+                kept.add(version.id)
+        return kept
+
+
+class VersionCompactor:
+    """Thins out old system versions according to a RetentionPolicy."""
+
+    def __init__(
+        self,
+        policy: Optional[RetentionPolicy] = None,
+        batch_size: int = VERSION_COMPACTION_BATCH_SIZE,
+        interval_seconds: float = VERSION_COMPACTION_INTERVAL_SECONDS,
+    ):
+        self.policy = policy or RetentionPolicy()
+        self.batch_size = max(1, batch_size)
+        self.interval_seconds = interval_seconds
+        self._stopping = threading.Event()
+        self._worker: Optional[threading.Thread] = None
+
+    def compact_user(self, database: Session, user_id: int, now: Optional[datetime] = None) -> int:
+        """Drop the versions of a user that the policy does not keep; returns the count."""
+        versions = (
+            database.query(Version.id, Version.created_at, Version.created_by)
+            .filter(Version.user_id == user_id)
+            .order_by(Version.version_number.desc())
+            .all()
+        )
+        kept = self.policy.select_kept(versions, now or datetime.utcnow())
+        chain = [version.id for version in reversed(versions)]
+        database.rollback()  # do not hold the read transaction while compacting
+
+        # Everything before ``index`` is kept, so a run starting at 0 has no older version
+        dropped = 0
+        index = 0
+        while index < len(chain):
+            if chain[index] in kept:
+                index += 1
+                continue
+            run_end = index
+            while run_end < len(chain) and chain[run_end] not in kept and run_end - index < self.batch_size:
+                run_end += 1
+            if run_end == len(chain):
+                break  # the latest version is always kept, so this cannot happen
+            self._fold(database, chain[index:run_end], chain[run_end], is_head=index == 0)
+            dropped += run_end - index
+            del chain[index:run_end]
+
+        if dropped:
+            self.collect_records(database, user_id)
+        return dropped
+
+    def _fold(self, database: Session, run_ids: List[int], successor_id: int, is_head: bool) -> None:
+        """Delete a run of versions, folding their deltas into the following version."""
+        try:
+            run = (
+                database.query(Version.changes, Version.is_snapshot)
+                .filter(Version.id.in_(run_ids))
+                .order_by(Version.version_number.asc())
+                .all()
+            )
+            successor = database.query(Version).filter(Version.id == successor_id).one()
+            carry = {}
+            for version in run:
+                carry = merge_changes(carry, version.changes)
+            merged = merge_changes(carry, successor.changes)
+
+            # The successor must become a full snapshot if its base snapshot goes away
+            lost_base = is_head or any(version.is_snapshot for version in run)
+            if not successor.is_snapshot and (lost_base or merged is None):
+                snapshot = VersionService.get_snapshot(database, successor)
+                successor.snapshot_blob = VersionService._write_snapshot(database, successor.user_id, snapshot)
+                successor.is_snapshot = True
+            successor.changes = merged
+
+            database.query(Version).filter(Version.id.in_(run_ids)).delete(synchronize_session=False)
+            database.commit()
+        except Exception:
+            database.rollback()
+            raise
+
+    def collect_records(self, database: Session, user_id: int) -> int:
+        """Delete snapshot records of a user that no remaining snapshot references.
+
+        Runs in one transaction under the user's record lock, so no snapshot
+        can start reusing a record between the scan and the deletes.
+        """
+        lock_snapshot_records(database, user_id)
+        referenced = set()
+        for (blob,) in database.query(Version.snapshot_blob).filter(
+            Version.user_id == user_id, Version.snapshot_blob.isnot(None)
+        ):
+            manifest = decode_blob(blob)
+            for section in RECORD_SECTIONS:
+                referenced.update(unpack_hashes(manifest[section]))
+
+        unreferenced = [
+            record_id
+            for record_id, digest in database.query(SnapshotRecord.id, SnapshotRecord.hash).filter(
+                SnapshotRecord.user_id == user_id
+            )
+            if digest not in referenced
+        ]
+        try:
+            for start in range(0, len(unreferenced), RECORD_LOOKUP_CHUNK):
+                chunk = unreferenced[start:start + RECORD_LOOKUP_CHUNK]
+                database.query(SnapshotRecord).filter(SnapshotRecord.id.in_(chunk)).delete(synchronize_session=False)
+            database.commit()
+        except Exception:
+            database.rollback()
+            raise
+        return len(unreferenced)
+
+    def run_once(self) -> Dict[int, int]:
+        """Compact every user with more versions than the policy keeps at minimum."""
+        database = db.SessionLocal()
+        try:
+            user_ids = [
+                user_id
+                for (user_id,) in database.query(Version.user_id)
+                .group_by(Version.user_id)
+                .having(func.count(Version.id) > self.policy.keep_last)
+            ]
+            database.rollback()
+            results = {}
+            for user_id in user_ids:
+                try:
+                    results[user_id] = self.compact_user(database, user_id)
+                except Exception:
+                    logger.exception("Failed to compact versions for user %s", user_id)
+            return results
+        finally:
+            database.close()
+
+    def start(self) -> None:
+        """Start the background compaction thread."""
+        if self.interval_seconds <= 0 or (self._worker is not None and self._worker.is_alive()):
+            return
+        self._stopping.clear()
+        self._worker = threading.Thread(target=self._run, name="version-compactor", daemon=True)
+        self._worker.start()
+
+    def stop(self) -> None:
+        self._stopping.set()
+        if self._worker is not None:
+            self._worker.join()
+            self._worker = None
+
+    def _run(self) -> None:
+        while not self._stopping.wait(timeout=self.interval_seconds):
+            self.run_once()
+
+
+compactor = VersionCompactor()
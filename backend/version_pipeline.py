@@ -0,0 +1,265 @@
+"""Background pipeline for automatic versions.
+
+CRUD endpoints commit their edit and hand the resulting delta to
+``pipeline.submit``; the response is returned without waiting for a version to
+be written.  Edits from one user that arrive within the debounce window of each
+other are merged into a single version, which a worker thread writes once the
+user has been idle for the window (or the burst has lasted for the maximum
+delay).  ``pipeline.flush`` writes everything pending for a user right away and
+is used before checkpoints, restores and version reads.  A user's very first
+version is written immediately, since it is a full snapshot of the live graph.
+
+A version that keeps failing is dropped after AUTO_VERSION_MAX_ATTEMPTS
+writes, and the user's next version is then a full snapshot so that later
+deltas do not build on the missing one.  The queue of a user that no longer
+exists is dropped at the first failure.
+
+Pending versions live only in memory, so the deltas of edits that were
+committed shortly before a crash are lost with the process.  On startup
+``pipeline.resync`` marks every user with history so that their next
+automatic version is again a full snapshot of the live graph.
+"""
+
+import logging
+import os
+import threading
+import time
+from dataclasses import dataclass
+from types import SimpleNamespace
+from typing import Any, Dict, List, Optional, Set
+
+from sqlalchemy.orm import Session
+
+import db
+from models import User, Version
+from version_service import VersionService, merge_changes
+
+logger = logging.getLogger(__name__)
+
+# Edits closer together than this are merged into one version
+AUTO_VERSION_DEBOUNCE_SECONDS = float(os.getenv("AUTO_VERSION_DEBOUNCE_SECONDS", "2.0"))
+# A continuous burst is still written after this long
+AUTO_VERSION_MAX_DELAY_SECONDS = float(os.getenv("AUTO_VERSION_MAX_DELAY_SECONDS", "30.0"))
+# Writes of one version before it is dropped
+AUTO_VERSION_MAX_ATTEMPTS = int(os.getenv("AUTO_VERSION_MAX_ATTEMPTS", "5"))
+
+
+@dataclass
+class PendingVersion:
+    """Edits waiting to be written as one version."""
+    descriptions: List[str]
+    changes: Optional[Dict[str, Any]]
+    first_at: float
+    last_at: float
+    attempts: int = 0
+
+    @property
+    def description(self) -> str:
+        if len(self.descriptions) == 1:
+            return self.descriptions[0]
+        return f"{self.descriptions[0]} (+{len(self.descriptions) - 1} more changes)"
+
+
+class VersionPipeline:
+    """Coalesces automatic versions per user and writes them off the request path."""
+
+    def __init__(
+        self,
+        debounce_seconds: float = AUTO_VERSION_DEBOUNCE_SECONDS,
+        max_delay_seconds: float = AUTO_VERSION_MAX_DELAY_SECONDS,
+        max_attempts: int = AUTO_VERSION_MAX_ATTEMPTS,
+    ):
+        self.debounce_seconds = debounce_seconds
+        self.max_delay_seconds = max_delay_seconds
+        self.max_attempts = max_attempts
+        self._pending: Dict[int, List[PendingVersion]] = {}
+        self._lock = threading.Lock()
+        self._user_locks: Dict[int, threading.Lock] = {}
+        self._with_history: Set[int] = set()
+        self._needs_snapshot: Set[int] = set()  # users whose last delta was dropped or lost
+        self._wakeup = threading.Event()
+        self._stopping = threading.Event()
+        self._worker: Optional[threading.Thread] = None
+
+    def submit(self, user_id: int, description: str, changes: Dict[str, Any]) -> None:
+        """Queue a committed edit for the user's next automatic version."""
+        now = time.monotonic()
+        with self._lock:
+            if user_id in self._needs_snapshot:
+                self._needs_snapshot.discard(user_id)
+                changes = None
+            queue = self._pending.setdefault(user_id, [])
+            if queue and now - queue[-1].last_at < self.debounce_seconds:
+                queue[-1].descriptions.append(description)
+                queue[-1].changes = merge_changes(queue[-1].changes, changes)
+                queue[-1].last_at = now
+            else:
+                queue.append(PendingVersion([description], changes, first_at=now, last_at=now))
+        self._wakeup.set()
+
+    def claim_snapshot(self, user_id: int) -> bool:
+        """Whether the user's graph has edits no version recorded; the caller writes a full snapshot."""
+        with self._lock:
+            if user_id not in self._needs_snapshot:
+                return False
+            self._needs_snapshot.discard(user_id)
+            return True
+
+    def has_pending(self, user_id: int) -> bool:
+        with self._lock:
+            return bool(self._pending.get(user_id))
+
+    def has_history(self, database: Session, user_id: int) -> bool:
+        """Whether the user already has a version to base automatic versions on.
+
+        A user's first version is a full snapshot of the live graph, so it
+        must be flushed before any later edit is committed.
+        """
+        if user_id in self._with_history:
+            return True
+        if database.query(Version.id).filter(Version.user_id == user_id).first() is None:
+            return False
+        with self._lock:
+            self._with_history.add(user_id)
+        return True
+
+    def flush(self, database: Session, user_id: int) -> Optional[Version]:
+        """Write all pending versions of a user now; returns the last one written."""
+        return self._write(database, user_id, due_only=False)
+
+    def flush_due(self) -> None:
+        """Write the pending versions whose debounce window has elapsed."""
+        with self._lock:
+            user_ids = [user_id for user_id, queue in self._pending.items() if queue]
+        for user_id in user_ids:
+            database = db.SessionLocal()
+            try:
+                self._write(database, user_id, due_only=True)
+            except Exception:
+                logger.exception("Failed to write automatic version for user %s", user_id)
+            finally:
+                database.close()
+
+    def _is_due(self, pending: PendingVersion, now: float) -> bool:
+        return (
+            now - pending.last_at >= self.debounce_seconds
+            or now - pending.first_at >= self.max_delay_seconds
+        )
+
+    def _write(self, database: Session, user_id: int, due_only: bool) -> Optional[Version]:
+        with self._lock:
+            user_lock = self._user_locks.setdefault(user_id, threading.Lock())
+
+        # The per-user lock keeps versions in submission order across writers
+        with user_lock:
+            now = time.monotonic()
+            with self._lock:
+                queue = self._pending.get(user_id, [])
+                count = len(queue)
+                if due_only:
+                    count = 0
+                    while count < len(queue) and self._is_due(queue[count], now):
+                        count += 1
+                batch = queue[:count]
+                del queue[:count]
+
+            version = None
+            owner = SimpleNamespace(id=user_id)
+            for index, pending in enumerate(batch):
+                try:
+                    version = VersionService.create_version(
+                        database, pending.description, "system", owner, pending.changes
+                    )
+                except Exception:
+                    database.rollback()
+                    if not self._owner_exists(database, user_id):
+                        self._drop_user(user_id, len(batch) - index)
+                        return version
+                    pending.attempts += 1
+                    remaining = batch[index:]
+                    if pending.attempts >= self.max_attempts:
+                        logger.error(
+                            "Dropped automatic version %r of user %s after %d failed writes",
+                            pending.description, user_id, pending.attempts,
+                        )
+                        remaining = remaining[1:]
+                        if remaining:
+                            remaining[0].changes = None  # written as a full snapshot
+                    with self._lock:
+                        if pending.attempts >= self.max_attempts and not remaining:
+                            self._needs_snapshot.add(user_id)
+                        self._pending.setdefault(user_id, [])[:0] = remaining
+                    raise
+            return version
+
+    @staticmethod
+    def _owner_exists(database: Session, user_id: int) -> bool:
+        try:
+            return database.query(User.id).filter(User.id == user_id).first() is not None
+        except Exception:
+            database.rollback()
+            return True  # unknown; keep the versions for another attempt
+
+    def _drop_user(self, user_id: int, unwritten: int) -> None:
+        with self._lock:
+            dropped = unwritten + len(self._pending.pop(user_id, []))
+            self._with_history.discard(user_id)
+            self._needs_snapshot.discard(user_id)
+        logger.warning("Dropped %d pending automatic versions of deleted user %s", dropped, user_id)
+
+    def resync(self, database: Session) -> int:
+        """Make the next version of every user with history a full snapshot.
+
+        Called on startup: deltas still pending when the previous process
+        stopped were never written, so a delta based on the last stored
+        version would silently miss those edits.  Returns the number of users
+        marked.
+        """
+        user_ids = {user_id for (user_id,) in database.query(Version.user_id).distinct()}
+        user_ids.discard(None)
+        with self._lock:
+            self._needs_snapshot.update(user_ids)
+        return len(user_ids)
+
+    def start(self) -> None:
+        """Start the background worker thread."""
+        if self._worker is not None and self._worker.is_alive():
+            return
+        self._stopping.clear()
+        self._worker = threading.Thread(target=self._run, name="version-pipeline", daemon=True)
+        self._worker.start()
+
+    def stop(self) -> None:
+        """Stop the worker and write everything still pending."""
+        self._stopping.set()
+        self._wakeup.set()
+        if self._worker is not None:
+            self._worker.join()
+            self._worker = None
+        with self._lock:
+            user_ids = list(self._pending)
+        for user_id in user_ids:
+            database = db.SessionLocal()
+            try:
+                self.flush(database, user_id)
+            except Exception:
+                logger.exception("Failed to write automatic version for user %s", user_id)
+            finally:
+                database.close()
+
+    def reset(self) -> None:
+        """Drop all pending versions (used by tests)."""
+        with self._lock:
+            self._pending.clear()
+            self._with_history.clear()
+            self._needs_snapshot.clear()
+
+    def _run(self) -> None:
+        tick = max(min(self.debounce_seconds, 1.0), 0.05)
+        while not self._stopping.is_set():
+            self._wakeup.wait(timeout=tick)
+            self._wakeup.clear()
+            self.flush_due()
+
+
+pipeline = VersionPipeline()
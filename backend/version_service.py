@@ -1,13 +1,308 @@
-"""Version management service for handling version history and snapshots."""
+"""Version management service for handling version history and snapshots.
 
+Versions are stored as a chain: every ``VERSION_SNAPSHOT_INTERVAL`` versions a
+full snapshot of the graph is written, and the versions in between only keep
+the delta against their predecessor in ``Version.changes``.  Any version can be
+rebuilt by applying the deltas on top of the nearest preceding full snapshot.
+
+Full snapshots are content-addressed: every entity and relation record is
+stored once per user in ``snapshot_records`` (keyed by the SHA-256 of its
+canonical JSON, compressed), and ``Version.snapshot_blob`` holds a compressed
+manifest with the packed record hashes plus the (small) type lists.  Versions
+written before this format keep their uncompressed ``Version.snapshot`` JSON
+and are read transparently until ``migrate_versions.py`` converts them.
+Records are shared between snapshots, so snapshot writes and the collection of
+unreferenced records (version_compactor) hold a per-user lock until their
+transaction ends (``lock_snapshot_records``).
+
+A delta (``changes``) has the following shape; every section and list is
+optional::
+
+    {
+        "entities":       {"added": [record], "changed": [record], "removed": [id]},
+        "relations":      {"added": [record], "changed": [record], "removed": [id]},
+        "entity_types":   {"added": [record], "changed": [record], "removed": [name]},
+        "relation_types": {"added": [record], "changed": [record], "removed": [name]},
+    }
+"""
+
+import base64
+import hashlib
+import os
+import threading
+import zlib
+from sqlalchemy import Row, event, insert, text
 from sqlalchemy.orm import Session
-from models import Version, Entity, Relation, RelationType, EntityType
+from models import Version, Entity, Relation, RelationType, EntityType, SnapshotRecord
 from schemas import VersionSnapshot
+from cache import LRUCache
+from change_feed import feed as change_feed
+from graph_index import index as graph_index
+from suggest_index import index as suggest_index
+from type_registry import recount_usage
 from datetime import datetime
-from typing import Dict, Any, List, Optional
+from typing import Dict, Any, Callable, List, Optional, Tuple, Union
 import json
 
 
+# Write a full snapshot at least every N versions; deltas are stored in between
+SNAPSHOT_INTERVAL = max(1, int(os.getenv("VERSION_SNAPSHOT_INTERVAL", "20")))
+
+# Restored IDs are checked against other users' rows in chunks of this size
+RESTORE_ID_CHECK_CHUNK = 500
+
+# Hex length of snapshot record hashes
+RECORD_HASH_LENGTH = 32
+
+# Snapshot record hashes are looked up in chunks of this size
+RECORD_LOOKUP_CHUNK = 500
+
+# Key space of the PostgreSQL advisory locks on a user's snapshot records
+RECORD_LOCK_NAMESPACE = 7301
+
+# Snapshot sections stored as content-addressed records (the rest are inlined)
+RECORD_SECTIONS = ("entities", "relations")
+
+# Snapshot sections and the field records are keyed by within each section
+SNAPSHOT_SECTIONS = {
+    "entities": "id",
+    "relations": "id",
+    "entity_types": "name",
+    "relation_types": "name",
+}
+
+# Number of computed version diffs kept in memory for paging, and the total
+# number of changed records they may hold; larger diffs are not cached
+VERSION_DIFF_CACHE_SIZE = int(os.getenv("VERSION_DIFF_CACHE_SIZE", "64"))
+VERSION_DIFF_CACHE_MAX_ITEMS = int(os.getenv("VERSION_DIFF_CACHE_MAX_ITEMS", "200000"))
+
+# Order of operations within each section of a flattened diff
+CHANGE_OPS = ("added", "changed", "removed")
+
+# Columns returned by version listings (everything except snapshots and deltas)
+VERSION_LIST_COLUMNS = (
+    Version.id,
+    Version.version_number,
+    Version.created_at,
+    Version.description,
+    Version.created_by,
+    Version.entity_count,
+    Version.relation_count,
+)
+
+
+def entity_record(entity: Entity) -> Dict[str, Any]:
+    """Serialize an entity the way it is stored in snapshots and deltas."""
+    return {
+        "id": entity.id,
+        "name": entity.name,
+        "type": entity.type,
+        "description": entity.description,
+    }
+
+
+def relation_record(relation: Relation) -> Dict[str, Any]:
+    """Serialize a relation the way it is stored in snapshots and deltas."""
+    return {
+        "id": relation.id,
+        "source_id": relation.source_id,
+        "target_id": relation.target_id,
+        "relation_type": relation.relation_type,
+        "description": relation.description,
+    }
+
+
+def relation_type_record(relation_type: RelationType) -> Dict[str, Any]:
+    """Serialize a relation type the way it is stored in snapshots and deltas."""
+    return {"id": relation_type.id, "name": relation_type.name}
+
+
+def encode_blob(data: Any) -> bytes:
+    """Serialize to canonical JSON and compress."""
+    return zlib.compress(json.dumps(data, sort_keys=True, separators=(",", ":")).encode("utf-8"))
+
+
+def decode_blob(blob: bytes) -> Any:
+    """Inverse of encode_blob."""
+    return json.loads(zlib.decompress(blob).decode("utf-8"))
+
+
+def record_hash(record: Dict[str, Any]) -> str:
+    """Content hash of a snapshot record (first 128 bits of SHA-256, hex)."""
+    canonical = json.dumps(record, sort_keys=True, separators=(",", ":")).encode("utf-8")
+    return hashlib.sha256(canonical).hexdigest()[:RECORD_HASH_LENGTH]
+
+
+def pack_hashes(hashes: List[str]) -> str:
+    """Pack hex record hashes into one base64 string for a manifest."""
+    return base64.b64encode(bytes.fromhex("".join(hashes))).decode("ascii")
+
+
+def unpack_hashes(packed: str) -> List[str]:
+    """Inverse of pack_hashes."""
+    raw = base64.b64decode(packed).hex()
+    return [raw[i:i + RECORD_HASH_LENGTH] for i in range(0, len(raw), RECORD_HASH_LENGTH)]
+
+
+def apply_changes(snapshot: Dict[str, Any], *changesets: Optional[Dict[str, Any]]) -> Dict[str, Any]:
+    """Return a new snapshot with the given deltas applied in order."""
+    sections = {
+        section: {record[key]: record for record in (snapshot.get(section) or [])}
+        for section, key in SNAPSHOT_SECTIONS.items()
+    }
+
+    for changes in changesets:
+        for section, key in SNAPSHOT_SECTIONS.items():
+            delta = (changes or {}).get(section)
+            if not delta:
+                continue
+            records = sections[section]
+            for removed_key in delta.get("removed", []):
+                records.pop(removed_key, None)
+            for record in delta.get("added", []) + delta.get("changed", []):
+                records[record[key]] = record
+
+    return {section: list(records.values()) for section, records in sections.items()}
+
+
+def merge_changes(first: Optional[Dict[str, Any]], second: Optional[Dict[str, Any]]) -> Optional[Dict[str, Any]]:
+    """Combine two consecutive deltas into one with the same net effect.
+
+    Returns None when either delta is unknown (None).
+    """
+    if first is None or second is None:
+        return None
+
+    merged: Dict[str, Any] = {}
+    for section, key in SNAPSHOT_SECTIONS.items():
+        before = first.get(section) or {}
+        after = second.get(section) or {}
+        added = {record[key]: record for record in before.get("added", [])}
+        changed = {record[key]: record for record in before.get("changed", [])}
+        removed = dict.fromkeys(before.get("removed", []))
+
+        for removed_key in after.get("removed", []):
+            if added.pop(removed_key, None) is not None:
+                continue  # created and deleted within the merged span
+            changed.pop(removed_key, None)
+            removed[removed_key] = None
+        for record in after.get("added", []):
+            if removed.pop(record[key], False) is None:
+                changed[record[key]] = record  # deleted and re-created
+            else:
+                added[record[key]] = record
+        for record in after.get("changed", []):
+            if record[key] in added:
+                added[record[key]] = record
+            else:
+                changed[record[key]] = record
+
+        delta = {
+            op: values
+            for op, values in (
+                ("added", list(added.values())),
+                ("changed", list(changed.values())),
+                ("removed", list(removed)),
+            )
+            if values
+        }
+        if delta:
+            merged[section] = delta
+    return merged
+
+
+def diff_snapshots(before: Dict[str, Any], after: Dict[str, Any]) -> Dict[str, Any]:
+    """Delta that turns one snapshot into another, joining records by key."""
+    delta: Dict[str, Any] = {}
+    for section, key in SNAPSHOT_SECTIONS.items():
+        old_records = {record[key]: record for record in (before.get(section) or [])}
+        new_records = {record[key]: record for record in (after.get(section) or [])}
+        section_delta = {
+            op: values
+            for op, values in (
+                ("added", [r for k, r in new_records.items() if k not in old_records]),
+                ("changed", [r for k, r in new_records.items() if k in old_records and old_records[k] != r]),
+                ("removed", [k for k in old_records if k not in new_records]),
+            )
+            if values
+        }
+        if section_delta:
+            delta[section] = section_delta
+    return delta
+
+
+def flatten_changes(changes: Dict[str, Any]) -> List[Dict[str, Any]]:
+    """Flatten a delta into items ordered by section, operation and key."""
+    items = []
+    for section, key in SNAPSHOT_SECTIONS.items():
+        section_delta = changes.get(section) or {}
+        for op in CHANGE_OPS:
+            entries = [
+                (entry, None) if op == "removed" else (entry[key], entry)
+                for entry in section_delta.get(op, [])
+            ]
+            for item_key, record in sorted(entries, key=lambda entry: entry[0]):
+                items.append({"section": section, "op": op, "key": item_key, "record": record})
+    return items
+
+
+def count_after(count: Optional[int], section_changes: Optional[Dict[str, Any]]) -> Optional[int]:
+    """Number of records in a section after applying its delta; None if unknown."""
+    if count is None:
+        return None
+    section_changes = section_changes or {}
+    return count + len(section_changes.get("added", [])) - len(section_changes.get("removed", []))
+
+
+
+
+def diff_item_count(diff: Union[Dict[str, Any], List[Dict[str, Any]]]) -> int:
+    """Number of records in a flattened diff or a delta (the weight of a cached diff)."""
+    if isinstance(diff, list):
+        return len(diff)
+    return sum(len(records) for section in diff.values() for records in (section or {}).values())
+
+
+_diff_cache = LRUCache(VERSION_DIFF_CACHE_SIZE, max_weight=VERSION_DIFF_CACHE_MAX_ITEMS, weigher=diff_item_count)
+
+# Per-user record locks for databases without advisory locks (in-process only)
+_record_locks: Dict[int, threading.Lock] = {}
+_record_locks_guard = threading.Lock()
+
+
+def lock_snapshot_records(db: Session, user_id: int) -> None:
+    """Hold the lock on a user's snapshot records until the session's transaction ends.
+
+    A snapshot write that reuses an existing record and the deletion of
+    unreferenced records must not interleave, or the new manifest could point
+    at a deleted record.
+    """
+    held = db.info.setdefault("record_locks", {})
+    if user_id in held:
+        return
+    if db.get_bind().dialect.name == "postgresql":
+        db.execute(
+            text("SELECT pg_advisory_xact_lock(:namespace, :user_id)"),
+            {"namespace": RECORD_LOCK_NAMESPACE, "user_id": user_id},
+        )
+        held[user_id] = None
+        return
+    db.connection()  # begin the transaction whose end releases the lock
+    with _record_locks_guard:
+        lock = _record_locks.setdefault(user_id, threading.Lock())
+    lock.acquire()
+    held[user_id] = lock
+
+
+@event.listens_for(Session, "after_transaction_end")
+def _release_record_locks(session: Session, transaction) -> None:
+    if transaction.parent is not None:
+        return  # a savepoint; the locks belong to the outer transaction
+    for lock in session.info.pop("record_locks", {}).values():
+        if lock is not None:
+            lock.release()
+
+
 class VersionService:
     """Service for managing version history and snapshots."""
 
@@ -18,40 +313,17 @@ class VersionService:
         relations = db.query(Relation).filter(Relation.user_id == user_id).all()
         entity_types_records = db.query(EntityType).filter(EntityType.user_id == user_id).all()
         relation_types = db.query(RelationType).filter(RelationType.user_id == user_id).all()
-        
+
         # Get entity types from records and existing entities
         entity_types_set = {et.name for et in entity_types_records}
         entity_types_set.update([e.type for e in entities])
         entity_types = sorted(entity_types_set)
 
         return VersionSnapshot(
-            entities=[
-                {
-                    "id": e.id,
-                    "name": e.name,
-                    "type": e.type,
-                    "description": e.description,
-                }
-                for e in entities
-            ],
-            relations=[
-                {
-                    "id": r.id,
-                    "source_id": r.source_id,
-                    "target_id": r.target_id,
-                    "relation_type": r.relation_type,
-                    "description": r.description,
-                }
-                for r in relations
-            ],
+            entities=[entity_record(e) for e in entities],
+            relations=[relation_record(r) for r in relations],
             entity_types=[{"name": et} for et in entity_types],
-            relation_types=[
-                {
-                    "id": rt.id,
-                    "name": rt.name,
-                }
-                for rt in relation_types
-            ],
+            relation_types=[relation_type_record(rt) for rt in relation_types],
         )
 
     @staticmethod
@@ -60,14 +332,21 @@ class VersionService:
         description: Optional[str] = None,
         created_by: str = "system",
         current_user = None,
+        changes: Optional[Dict[str, Any]] = None,
+        snapshot: bool = False,
     ) -> Version:
-        """Create a new version with current snapshot for a specific user."""
+        """Create a new version for a specific user.
+
+        When ``changes`` describes the delta since the previous version, only
+        the delta is stored unless a full snapshot is due or ``snapshot`` is
+        set.  Without ``changes`` the current graph is always captured as a
+        full snapshot, and in-memory indexes and clients reload the graph.
+        """
         user_id = current_user.id if current_user else None
-        snapshot = VersionService.get_current_snapshot(db, user_id)
 
         # Get next version number for this user
         latest_version = (
-            db.query(Version)
+            db.query(Version.version_number, Version.entity_count, Version.relation_count)
             .filter(Version.user_id == user_id)
             .order_by(Version.version_number.desc())
             .first()
@@ -79,15 +358,155 @@ class VersionService:
         version = Version(
             version_number=next_version_number,
             description=description or f"Version {next_version_number}",
-            snapshot=snapshot.model_dump(),
+            changes=changes,
             created_by=created_by,
             user_id=user_id,
         )
+
+        last_snapshot_number = VersionService._last_snapshot_number(db, user_id)
+        if (
+            changes is None
+            or snapshot
+            or last_snapshot_number is None
+            or next_version_number - last_snapshot_number >= SNAPSHOT_INTERVAL
+        ):
+            if changes is None or last_snapshot_number is None:
+                snapshot = VersionService.get_current_snapshot(db, user_id).model_dump()
+            else:
+                # Automatic versions are written after later edits may have been
+                # committed, so rebuild this one from its predecessor instead of
+                # capturing the live graph
+                previous = (
+                    db.query(Version)
+                    .filter(Version.user_id == user_id, Version.version_number == latest_version.version_number)
+                    .one()
+                )
+                snapshot = apply_changes(VersionService.get_snapshot(db, previous), changes)
+            version.snapshot_blob = VersionService._write_snapshot(db, user_id, snapshot)
+            version.is_snapshot = True
+            version.entity_count = len(snapshot["entities"])
+            version.relation_count = len(snapshot["relations"])
+        else:
+            version.is_snapshot = False
+            version.entity_count = count_after(latest_version.entity_count, changes.get("entities"))
+            version.relation_count = count_after(latest_version.relation_count, changes.get("relations"))
+
         db.add(version)
         db.commit()
         db.refresh(version)
+        if changes is None:
+            # Imports, restores and resets carry no delta; reload the in-memory indexes on next use
+            graph_index.invalidate(user_id)
+            suggest_index.invalidate(user_id)
+        change_feed.publish(user_id, {
+            "type": "version",
+            "version_number": version.version_number,
+            "previous_version_number": latest_version.version_number if latest_version else 0,
+            "description": version.description,
+            "changes": changes,  # None: the client has to reload
+        })
         return version
 
+    @staticmethod
+    def _last_snapshot_number(db: Session, user_id: int) -> Optional[int]:
+        """Version number of the latest full snapshot for a user, if any."""
+        row = (
+            db.query(Version.version_number)
+            .filter(Version.user_id == user_id, Version.is_snapshot.is_(True))
+            .order_by(Version.version_number.desc())
+            .first()
+        )
+        return row[0] if row else None
+
+    @staticmethod
+    def _write_snapshot(db: Session, user_id: int, snapshot: Dict[str, Any]) -> bytes:
+        """Store a snapshot's records by content hash and return its compressed manifest."""
+        lock_snapshot_records(db, user_id)
+        manifest = {section: snapshot.get(section) or [] for section in SNAPSHOT_SECTIONS}
+        records = {}
+        for section in RECORD_SECTIONS:
+            hashes = []
+            for record in manifest[section]:
+                digest = record_hash(record)
+                records[digest] = record
+                hashes.append(digest)
+            manifest[section] = pack_hashes(hashes)
+
+        digests = list(records)
+        existing = set()
+        for start in range(0, len(digests), RECORD_LOOKUP_CHUNK):
+            chunk = digests[start:start + RECORD_LOOKUP_CHUNK]
+            existing.update(
+                row[0] for row in db.query(SnapshotRecord.hash).filter(
+                    SnapshotRecord.user_id == user_id, SnapshotRecord.hash.in_(chunk)
+                )
+            )
+        missing = [
+            {"user_id": user_id, "hash": digest, "data": encode_blob(record)}
+            for digest, record in records.items()
+            if digest not in existing
+        ]
+        if missing:
+            db.execute(insert(SnapshotRecord), missing)
+
+        return encode_blob(manifest)
+
+    @staticmethod
+    def _read_snapshot(db: Session, version: Version) -> Dict[str, Any]:
+        """Load the full snapshot stored on a snapshot version."""
+        if version.snapshot_blob is None:
+            # Written before snapshots were content-addressed
+            return version.snapshot
+
+        manifest = decode_blob(version.snapshot_blob)
+        for section in RECORD_SECTIONS:
+            manifest[section] = unpack_hashes(manifest[section])
+        digests = list({digest for section in RECORD_SECTIONS for digest in manifest[section]})
+        records = {}
+        for start in range(0, len(digests), RECORD_LOOKUP_CHUNK):
+            chunk = digests[start:start + RECORD_LOOKUP_CHUNK]
+            for digest, data in db.query(SnapshotRecord.hash, SnapshotRecord.data).filter(
+                SnapshotRecord.user_id == version.user_id, SnapshotRecord.hash.in_(chunk)
+            ):
+                records[digest] = decode_blob(data)
+
+        for section in RECORD_SECTIONS:
+            manifest[section] = [records[digest] for digest in manifest[section]]
+        return manifest
+
+    @staticmethod
+    def get_snapshot(db: Session, version: Version) -> Dict[str, Any]:
+        """Rebuild the full snapshot of a version from the nearest full snapshot and deltas."""
+        if version.is_snapshot:
+            return VersionService._read_snapshot(db, version)
+
+        base = (
+            db.query(Version)
+            .filter(
+                Version.user_id == version.user_id,
+                Version.is_snapshot.is_(True),
+                Version.version_number < version.version_number,
+            )
+            .order_by(Version.version_number.desc())
+            .first()
+        )
+        if base is None:
+            raise ValueError(f"No base snapshot found for version {version.id}")
+
+        deltas = (
+            db.query(Version.changes)
+            .filter(
+                Version.user_id == version.user_id,
+                Version.version_number > base.version_number,
+                Version.version_number <= version.version_number,
+            )
+            .order_by(Version.version_number.asc())
+            .all()
+        )
+        return apply_changes(
+            VersionService._read_snapshot(db, base), *(changes for (changes,) in deltas)
+        )
+
     @staticmethod
     def get_all_versions(db: Session, user_id: int) -> List[Version]:
         """Get all versions for a specific user in reverse chronological order."""
@@ -98,6 +517,93 @@ class VersionService:
             .all()
         )
 
+    @staticmethod
+    def list_versions(
+        db: Session,
+        user_id: int,
+        before: Optional[int] = None,
+        limit: Optional[int] = None,
+    ) -> List[Row]:
+        """List versions newest first without loading snapshots or deltas.
+
+        ``before`` is a version number; only older versions are returned, so
+        the last ``version_number`` of a page is the cursor for the next one.
+        """
+        query = db.query(*VERSION_LIST_COLUMNS).filter(Version.user_id == user_id)
+        if before is not None:
+            query = query.filter(Version.version_number < before)
+        query = query.order_by(Version.version_number.desc())
+        if limit is not None:
+            query = query.limit(limit)
+        return query.all()
+
+    @staticmethod
+    def diff_versions(db: Session, from_version: Version, to_version: Version) -> List[Dict[str, Any]]:
+        """Flattened changes (see flatten_changes) from one version of a user to another.
+
+        Going forward, the stored deltas in between are merged, so a record
+        edited and then edited back may still be listed as changed.  Otherwise,
+        or when a delta is unknown, both snapshots are rebuilt and compared.
+        Results are cached per pair, since versions never change once written.
+        """
+        cache_key = (from_version.user_id, from_version.id, to_version.id)
+        return VersionService._cached_diff(
+            cache_key, lambda: flatten_changes(VersionService._compute_diff(db, from_version, to_version))
+        )
+
+    @staticmethod
+    def changes_since(db: Session, user_id: int, since: int, latest: Version) -> Optional[Dict[str, Any]]:
+        """Net delta from version number ``since`` of a user to ``latest``.
+
+        Returns None when version ``since`` no longer exists (compacted away,
+        or never written), in which case the client has to reload everything.
+        """
+        if since == latest.version_number:
+            return {}
+        if since > latest.version_number:
+            return None
+        base = db.query(Version).filter(Version.user_id == user_id, Version.version_number == since).first()
+        if base is None:
+            return None
+        cache_key = ("delta", user_id, base.id, latest.id)
+        return VersionService._cached_diff(cache_key, lambda: VersionService._compute_diff(db, base, latest))
+
+    @staticmethod
+    def _cached_diff(cache_key: Tuple, compute: Callable[[], Any]) -> Any:
+        missing = object()
+        diff = _diff_cache.get(cache_key, missing)
+        if diff is missing:
+            diff = compute()
+            # A diff over the whole budget would evict everything else and still not fit
+            if diff_item_count(diff) <= VERSION_DIFF_CACHE_MAX_ITEMS:
+                _diff_cache.put(cache_key, diff)
+        return diff
+
+    @staticmethod
+    def _compute_diff(db: Session, from_version: Version, to_version: Version) -> Dict[str, Any]:
+        if from_version.version_number == to_version.version_number:
+            return {}
+        if from_version.version_number < to_version.version_number:
+            deltas = (
+                db.query(Version.changes)
+                .filter(
+                    Version.user_id == to_version.user_id,
+                    Version.version_number > from_version.version_number,
+                    Version.version_number <= to_version.version_number,
+                )
+                .order_by(Version.version_number.asc())
+                .all()
+            )
+            merged: Optional[Dict[str, Any]] = {}
+            for (changes,) in deltas:
+                merged = merge_changes(merged, changes)
+            if merged is not None:
+                return merged
+
+        return diff_snapshots(
+            VersionService.get_snapshot(db, from_version), VersionService.get_snapshot(db, to_version)
+        )
+
     @staticmethod
     def get_version(db: Session, version_id: int, user_id: int) -> Optional[Version]:
         """Get a specific version by ID for a specific user."""
@@ -105,6 +611,80 @@ class VersionService:
             (Version.id == version_id) & (Version.user_id == user_id)
         ).first()
 
+    @staticmethod
+    def _taken_ids(db: Session, model, ids: List[int], user_id: int) -> set:
+        """IDs from ``ids`` that are currently used by another user's rows."""
+        taken = set()
+        for start in range(0, len(ids), RESTORE_ID_CHECK_CHUNK):
+            chunk = ids[start:start + RESTORE_ID_CHECK_CHUNK]
+            taken.update(
+                row[0] for row in db.query(model.id).filter(model.id.in_(chunk), model.user_id != user_id)
+            )
+        return taken
+
+    @staticmethod
+    def _insert_snapshot(db: Session, user_id: int, snapshot: Dict[str, Any]) -> None:
+        """Bulk insert a snapshot's records for a user, keeping their original IDs.
+
+        Uses multi-row INSERTs and does not commit.  Rows whose ID has since been
+        taken by another user get a new ID, and relations are remapped to match.
+        """
+        entity_types = {t["name"] for t in snapshot.get("entity_types") or []}
+        if entity_types:
+            db.execute(insert(EntityType), [{"name": name, "user_id": user_id} for name in sorted(entity_types)])
+
+        relation_types = {t["name"] for t in snapshot.get("relation_types") or []}
+        if relation_types:
+            db.execute(insert(RelationType), [{"name": name, "user_id": user_id} for name in sorted(relation_types)])
+
+        entities = snapshot.get("entities") or []
+        taken = VersionService._taken_ids(db, Entity, [e["id"] for e in entities], user_id)
+        entity_rows = [
+            {
+                "id": e["id"],
+                "name": e["name"],
+                "type": e["type"],
+                "description": e.get("description"),
+                "user_id": user_id,
+            }
+            for e in entities
+        ]
+        if entity_rows and len(taken) < len(entity_rows):
+            db.execute(insert(Entity), [row for row in entity_rows if row["id"] not in taken])
+
+        id_map = {e["id"]: e["id"] for e in entities}
+        moved = [row for row in entity_rows if row["id"] in taken]
+        if moved:
+            old_ids = [row.pop("id") for row in moved]
+            new_ids = db.scalars(
+                insert(Entity).returning(Entity.id, sort_by_parameter_order=True), moved
+            ).all()
+            id_map.update(zip(old_ids, new_ids))
+
+        relations = [
+            r for r in snapshot.get("relations") or []
+            if r["source_id"] in id_map and r["target_id"] in id_map
+        ]
+        taken = VersionService._taken_ids(db, Relation, [r["id"] for r in relations], user_id)
+        relation_rows = []
+        for r in relations:
+            row = {
+                "source_id": id_map[r["source_id"]],
+                "target_id": id_map[r["target_id"]],
+                "relation_type": r["relation_type"],
+                "description": r.get("description"),
+                "user_id": user_id,
+            }
+            if r["id"] not in taken:
+                row["id"] = r["id"]
+            relation_rows.append(row)
+        # Rows with and without an explicit ID must go in separate statements
+        for keep_id in (True, False):
+            rows = [row for row in relation_rows if ("id" in row) == keep_id]
+            if rows:
+                db.execute(insert(Relation), rows)
+        recount_usage(db, user_id)
+
     @staticmethod
     def restore_version(
         db: Session,
@@ -127,51 +707,19 @@ class VersionService:
         if not target_version:
             raise ValueError(f"Version {version_id} not found")
 
-        snapshot = target_version.snapshot
-
-        # Delete existing data for this user only
-        db.query(Relation).filter(Relation.user_id == user_id).delete()
-        db.query(Entity).filter(Entity.user_id == user_id).delete()
-        db.query(EntityType).filter(EntityType.user_id == user_id).delete()
-        db.query(RelationType).filter(RelationType.user_id == user_id).delete()
-        db.commit()
-
-        # Restore entity types
-        for entity_type_data in snapshot.get("entity_types", []):
-            entity_type = EntityType(name=entity_type_data["name"], user_id=user_id)
-            db.add(entity_type)
-
-        # Restore relation types
-        for relation_type_data in snapshot.get("relation_types", []):
-            relation_type = RelationType(name=relation_type_data["name"], user_id=user_id)
-            db.add(relation_type)
-
-        db.commit()
-
-        # Restore entities
-        for entity_data in snapshot.get("entities", []):
-            entity = Entity(
-                name=entity_data["name"],
-                type=entity_data["type"],
-                description=entity_data.get("description"),
-                user_id=user_id,
-            )
-            db.add(entity)
-
-        db.commit()
-
-        # Restore relations
-        for relation_data in snapshot.get("relations", []):
-            relation = Relation(
-                source_id=relation_data["source_id"],
-                target_id=relation_data["target_id"],
-                relation_type=relation_data["relation_type"],
-                description=relation_data.get("description"),
-                user_id=user_id,
-            )
-            db.add(relation)
+        snapshot = VersionService.get_snapshot(db, target_version)
 
-        db.commit()
+        # Replace this user's graph in a single transaction
+        try:
+            db.query(Relation).filter(Relation.user_id == user_id).delete(synchronize_session=False)
+            db.query(Entity).filter(Entity.user_id == user_id).delete(synchronize_session=False)
+            db.query(EntityType).filter(EntityType.user_id == user_id).delete(synchronize_session=False)
+            db.query(RelationType).filter(RelationType.user_id == user_id).delete(synchronize_session=False)
+            VersionService._insert_snapshot(db, user_id, snapshot)
+            db.commit()
+        except Exception:
+            db.rollback()
+            raise
 
         # Create new version after restore
         restored_version = VersionService.create_version(
@@ -13,8 +13,7 @@ jest.mock('./AuthContext', () => ({
 }));
 
 jest.mock('./api', () => ({
-  useEntities: () => ({ entities: [], refetch: jest.fn() }),
-  useRelations: () => ({ relations: [], refetch: jest.fn() }),
+  useGraphReplica: () => ({ entities: [], relations: [], refetch: jest.fn() }),
   createEntity: jest.fn(),
   updateEntity: jest.fn(),
   deleteEntity: jest.fn(),
@@ -24,6 +23,7 @@ jest.mock('./api', () => ({
   resetAllData: jest.fn(),
   exportData: jest.fn(),
   importData: jest.fn(),
+  importFile: jest.fn(),
   fetchEntityTypes: jest.fn().mockResolvedValue([]),
   fetchRelationTypes: jest.fn().mockResolvedValue([]),
   fetchEntitiesList: jest.fn().mockResolvedValue([]),
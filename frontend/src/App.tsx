@@ -1,7 +1,7 @@
 import React, { useState, useEffect, useMemo, useRef } from 'react';
 import { flushSync } from 'react-dom';
 import { debounce } from 'lodash';
-import { useEntities, useRelations, Entity, Relation, createEntity, updateEntity, deleteEntity, createRelation, updateRelation, deleteRelation, resetAllData, exportData, importData, fetchEntityTypes, fetchRelationTypes, createEntityType, createRelationType, deleteEntityTypeOnly, deleteRelationTypeOnly, fetchEntitiesList, renameEntityType, renameRelationType } from './api';
+import { useGraphReplica, Entity, Relation, createEntity, updateEntity, deleteEntity, createRelation, updateRelation, deleteRelation, resetAllData, exportData, importFile, fetchEntityTypes, fetchRelationTypes, createEntityType, createRelationType, deleteEntityTypeOnly, deleteRelationTypeOnly, fetchEntitiesList, renameEntityType, renameRelationType } from './api';
 import { useAuth } from './AuthContext';
 import LoginPage from './LoginPage';
 import Graph from './Graph';
@@ -19,8 +19,10 @@ type ConfirmState = { open: false } | { open: true; type: 'deleteEntity' | 'dele
 
 function AppContent() {
   const { user, logout } = useAuth();
-  const { entities: apiEntities, refetch: refetchEntities } = useEntities();
-  const { relations: apiRelations, refetch: refetchRelations } = useRelations();
+  // Both refetches sync the same replica; after the first one the second is an empty delta
+  const { entities: apiEntities, relations: apiRelations, refetch: syncGraph } = useGraphReplica();
+  const refetchEntities = syncGraph;
+  const refetchRelations = syncGraph;
   const isMountedRef = useRef(true);
 
   // ローカルバックアップ状態
@@ -545,10 +547,7 @@ function AppContent() {
 
   const handleImport = async (file: File, mode: 'merge' | 'replace') => {
     try {
-      const text = await file.text();
-      const data = JSON.parse(text);
-      
-      const result = await importData(data, mode);
+      const result = await importFile(file, mode);
       
       await refetchEntities();
       await refetchRelations();
@@ -58,6 +58,37 @@ describe('HistoryPanel', () => {
     expect(screen.getByText('Added entity')).toBeInTheDocument();
   });
 
+  test('loads older versions on demand', async () => {
+    const page = Array.from({ length: 50 }, (_, i) => ({
+      id: 60 - i,
+      version_number: 60 - i,
+      created_at: '2024-01-15T10:00:00Z',
+      description: `Version ${60 - i}`,
+      created_by: 'system',
+      entity_count: 3,
+      relation_count: 1,
+    }));
+    (versionApi.fetchVersions as jest.Mock)
+      .mockResolvedValueOnce(page)
+      .mockResolvedValueOnce(mockVersions);
+
+    const user = userEvent.setup();
+    render(<HistoryPanel />);
+
+    await waitFor(() => {
+      expect(screen.getByText('Load more')).toBeInTheDocument();
+    });
+    expect(screen.getAllByText('3 entities, 1 relations')).toHaveLength(50);
+
+    await user.click(screen.getByText('Load more'));
+
+    await waitFor(() => {
+      expect(screen.getByText('Initial version')).toBeInTheDocument();
+    });
+    expect(versionApi.fetchVersions).toHaveBeenLastCalledWith({ before: 11, limit: 50 });
+    expect(screen.queryByText('Load more')).not.toBeInTheDocument();
+  });
+
   test('displays empty state when no versions', async () => {
     (versionApi.fetchVersions as jest.Mock).mockResolvedValue([]);
     
@@ -2,12 +2,16 @@ import React, { useState, useEffect, useRef } from 'react';
 import { fetchVersions, restoreVersion, createCheckpoint, VersionInfo } from './api';
 import './HistoryPanel.css';
 
+// Versions fetched per page; older ones are loaded on demand
+const VERSION_PAGE_SIZE = 50;
+
 interface HistoryPanelProps {
   onRefresh?: () => void;
 }
 
 const HistoryPanel: React.FC<HistoryPanelProps> = ({ onRefresh }) => {
   const [versions, setVersions] = useState<VersionInfo[]>([]);
+  const [hasMore, setHasMore] = useState(false);
   const [isLoading, setIsLoading] = useState(false);
   const [showInput, setShowInput] = useState(false);
   const [description, setDescription] = useState('');
@@ -20,9 +24,10 @@ const HistoryPanel: React.FC<HistoryPanelProps> = ({ onRefresh }) => {
       setError(null);
     }
     try {
-      const data = await fetchVersions();
+      const data = await fetchVersions({ limit: VERSION_PAGE_SIZE });
       if (isMountedRef.current) {
         setVersions(data);
+        setHasMore(data.length === VERSION_PAGE_SIZE);
       }
     } catch (err) {
       if (isMountedRef.current) {
@@ -35,6 +40,23 @@ const HistoryPanel: React.FC<HistoryPanelProps> = ({ onRefresh }) => {
     }
   };
 
+  const loadMoreVersions = async () => {
+    const oldest = versions[versions.length - 1];
+    if (!oldest) return;
+    setError(null);
+    try {
+      const data = await fetchVersions({ before: oldest.version_number, limit: VERSION_PAGE_SIZE });
+      if (isMountedRef.current) {
+        setVersions((current) => [...current, ...data]);
+        setHasMore(data.length === VERSION_PAGE_SIZE);
+      }
+    } catch (err) {
+      if (isMountedRef.current) {
+        setError(err instanceof Error ? err.message : 'Failed to load versions');
+      }
+    }
+  };
+
   useEffect(() => {
     loadVersions();
     
@@ -133,6 +155,11 @@ const HistoryPanel: React.FC<HistoryPanelProps> = ({ onRefresh }) => {
                   <span className="timestamp">
                     {new Date(version.created_at).toLocaleString()}
                   </span>
+                  {version.entity_count != null && (
+                    <span className="counts">
+                      {version.entity_count} entities, {version.relation_count ?? 0} relations
+                    </span>
+                  )}
                 </div>
                 <button
                   className="btn-restore"
@@ -144,6 +171,11 @@ const HistoryPanel: React.FC<HistoryPanelProps> = ({ onRefresh }) => {
               </div>
             ))
           )}
+          {hasMore && (
+            <button className="btn-small btn-load-more" onClick={loadMoreVersions}>
+              Load more
+            </button>
+          )}
         </div>
       )}
     </div>
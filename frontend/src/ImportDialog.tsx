@@ -43,7 +43,7 @@ export const ImportDialog: React.FC<ImportDialogProps> = ({ onImport, onClose })
           <label>ファイル選択:</label>
           <input 
             type="file" 
-            accept=".json" 
+            accept=".json,.ndjson,.jsonl" 
             onChange={handleFileChange}
             aria-label="JSONファイルを選択"
           />
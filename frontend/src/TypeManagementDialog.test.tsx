@@ -28,4 +28,34 @@ describe('TypeManagementDialog', () => {
     expect(screen.getByText(/エンティティタイプ/)).toBeInTheDocument();
     expect(screen.getByText('person')).toBeInTheDocument();
   });
+
+  it('shows usage counts from the server', async () => {
+    const originalFetch = global.fetch;
+    global.fetch = jest.fn().mockImplementation(async (url: string) => ({
+      ok: true,
+      status: 200,
+      json: async () => (url.includes('/api/entities/types') ? [{ name: 'person', count: 5 }] : []),
+    }));
+
+    render(
+      <TypeManagementDialog
+        entities={[{ id: 1, name: 'Alice', type: 'person' }]}
+        relations={[]}
+        manuallyAddedEntityTypes={[]}
+        manuallyAddedRelationTypes={[]}
+        onClose={jest.fn()}
+        onUpdate={jest.fn().mockResolvedValue(undefined)}
+        onRenameType={jest.fn().mockResolvedValue(undefined)}
+        onAddType={jest.fn().mockResolvedValue(undefined)}
+        onRemoveType={jest.fn().mockResolvedValue(undefined)}
+      />
+    );
+
+    expect(await screen.findByText('5件')).toBeInTheDocument();
+    expect(global.fetch).toHaveBeenCalledWith(
+      'http://localhost:8000/api/entities/types?with_counts=true',
+      expect.objectContaining({ cache: 'no-cache' })
+    );
+    global.fetch = originalFetch;
+  });
 });
@@ -1,5 +1,5 @@
 import React, { useState, useMemo, useEffect } from 'react';
-import { Entity, Relation, deleteEntityType, deleteRelationType, fetchEntityTypes, fetchRelationTypes } from './api';
+import { Entity, Relation, deleteEntityType, deleteRelationType, fetchEntityTypeCounts, fetchRelationTypeCounts } from './api';
 
 type Props = {
   entities: Entity[];
@@ -37,23 +37,31 @@ export function TypeManagementDialog({ entities, relations, manuallyAddedEntityT
   const [localEntityTypes, setLocalEntityTypes] = useState<string[]>(manuallyAddedEntityTypes);
   const [localRelationTypes, setLocalRelationTypes] = useState<string[]>(manuallyAddedRelationTypes);
 
-  // ダイアログが開いた時に最新のタイプを取得
+  // サーバーが集計したタイプごとの使用件数（未ログインで取得できない場合は null）
+  const [entityTypeCounts, setEntityTypeCounts] = useState<Map<string, number> | null>(null);
+  const [relationTypeCounts, setRelationTypeCounts] = useState<Map<string, number> | null>(null);
+
+  // ダイアログが開いた時とデータ・タイプの更新後に最新のタイプと使用件数を取得
   useEffect(() => {
-    const loadLatestTypes = async () => {
+    let cancelled = false;
+    const loadTypeCounts = async () => {
       try {
-        const [entityTypes, relationTypes] = await Promise.all([
-          fetchEntityTypes(),
-          fetchRelationTypes(),
+        const [entityCounts, relationCounts] = await Promise.all([
+          fetchEntityTypeCounts(),
+          fetchRelationTypeCounts(),
         ]);
-        console.log('[TypeManagementDialog] Loaded latest types:', { entityTypes, relationTypes });
-        setLocalEntityTypes(entityTypes);
-        setLocalRelationTypes(relationTypes);
+        if (cancelled) return;
+        setEntityTypeCounts(entityCounts && new Map(entityCounts.map(t => [t.name, t.count])));
+        setRelationTypeCounts(relationCounts && new Map(relationCounts.map(t => [t.name, t.count])));
       } catch (err) {
-        console.error('[TypeManagementDialog] Failed to load types:', err);
+        console.error('[TypeManagementDialog] Failed to load type counts:', err);
       }
     };
-    loadLatestTypes();
-  }, []); // マウント時のみ実行
+    loadTypeCounts();
+    return () => {
+      cancelled = true;
+    };
+  }, [entities, relations, manuallyAddedEntityTypes, manuallyAddedRelationTypes]);
 
   // 親コンポーネント側のタイプ変更をダイアログにも反映
   useEffect(() => {
@@ -64,12 +72,14 @@ export function TypeManagementDialog({ entities, relations, manuallyAddedEntityT
     setLocalRelationTypes(manuallyAddedRelationTypes);
   }, [manuallyAddedRelationTypes]);
 
-  // エンティティタイプの集計
+  // エンティティタイプの集計（サーバーの件数を使い、取得できない場合のみ手元のデータから数える）
   const entityTypeStats = useMemo(() => {
-    const stats = new Map<string, number>();
-    entities.forEach(e => {
-      stats.set(e.type, (stats.get(e.type) || 0) + 1);
-    });
+    const stats = new Map<string, number>(entityTypeCounts ?? []);
+    if (entityTypeCounts === null) {
+      entities.forEach(e => {
+        stats.set(e.type, (stats.get(e.type) || 0) + 1);
+      });
+    }
     // ダイアログ内で取得した最新のタイプを使用
     localEntityTypes.forEach(type => {
       if (!stats.has(type)) {
@@ -79,14 +89,16 @@ export function TypeManagementDialog({ entities, relations, manuallyAddedEntityT
     return Array.from(stats.entries())
       .map(([type, count]) => ({ type, count }))
       .sort((a, b) => b.count - a.count);
-  }, [entities, localEntityTypes]);
+  }, [entities, entityTypeCounts, localEntityTypes]);
 
-  // リレーションタイプの集計
+  // リレーションタイプの集計（サーバーの件数を使い、取得できない場合のみ手元のデータから数える）
   const relationTypeStats = useMemo(() => {
-    const stats = new Map<string, number>();
-    relations.forEach(r => {
-      stats.set(r.relation_type, (stats.get(r.relation_type) || 0) + 1);
-    });
+    const stats = new Map<string, number>(relationTypeCounts ?? []);
+    if (relationTypeCounts === null) {
+      relations.forEach(r => {
+        stats.set(r.relation_type, (stats.get(r.relation_type) || 0) + 1);
+      });
+    }
     // ダイアログ内で取得した最新のタイプを使用
     localRelationTypes.forEach(type => {
       if (!stats.has(type)) {
@@ -102,7 +114,7 @@ export function TypeManagementDialog({ entities, relations, manuallyAddedEntityT
       result 
     });
     return result;
-  }, [relations, localRelationTypes]);
+  }, [relations, relationTypeCounts, localRelationTypes]);
 
   const handleAddType = async () => {
     if (!addingType || !addingType.value.trim()) {
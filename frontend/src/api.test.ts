@@ -1,7 +1,10 @@
 import {
   createEntity,
   deleteEntityTypeOnly,
+  applyDelta,
+  fetchEntityTypeCounts,
   fetchEntityTypes,
+  fetchGraph,
   importData,
 } from './api';
 
@@ -58,6 +61,24 @@ describe('api client', () => {
     expect(result).toEqual(mockTypes);
   });
 
+  it('fetchEntityTypeCounts returns counts, or null when not logged in', async () => {
+    const mockCounts = [{ name: 'person', count: 2 }];
+    global.fetch = jest.fn().mockResolvedValue({
+      ok: true,
+      status: 200,
+      json: async () => mockCounts,
+    } as Response);
+
+    expect(await fetchEntityTypeCounts()).toEqual(mockCounts);
+    expect(global.fetch).toHaveBeenCalledWith(
+      'http://localhost:8000/api/entities/types?with_counts=true',
+      expect.objectContaining({ cache: 'no-cache' })
+    );
+
+    global.fetch = jest.fn().mockResolvedValue({ ok: false, status: 401 } as Response);
+    expect(await fetchEntityTypeCounts()).toBeNull();
+  });
+
   it('deleteEntityTypeOnly calls delete endpoint', async () => {
     global.fetch = jest.fn().mockResolvedValue({
       ok: true,
@@ -71,4 +92,45 @@ describe('api client', () => {
       { method: 'DELETE' }
     );
   });
+
+  it('fetchGraph decodes columns and reuses the graph on 304', async () => {
+    const body = {
+      version_number: 3,
+      entities: { id: [1, 2], name: ['Alice', 'Bob'], type: ['person', 'person'], description: [null, null] },
+      relations: { id: [5], source_id: [1], target_id: [2], relation_type: ['friend'], description: [null] },
+      entity_types: ['person'],
+      relation_types: ['friend'],
+    };
+    global.fetch = jest.fn()
+      .mockResolvedValueOnce({
+        ok: true,
+        status: 200,
+        headers: new Headers({ ETag: 'W/"graph-1-3-columnar"' }),
+        json: async () => body,
+      } as Response)
+      .mockResolvedValueOnce({ ok: false, status: 304, headers: new Headers() } as Response);
+
+    const first = await fetchGraph();
+    const second = await fetchGraph();
+
+    expect(first!.entities[1]).toEqual({ id: 2, name: 'Bob', type: 'person', description: null });
+    expect(first!.relations).toHaveLength(1);
+    expect(second).toBe(first);
+    expect((global.fetch as jest.Mock).mock.calls[1][1].headers['If-None-Match']).toBe('W/"graph-1-3-columnar"');
+  });
+
+  it('applyDelta removes, adds and replaces rows by id', () => {
+    const rows = [
+      { id: 1, name: 'Alice', type: 'person' },
+      { id: 2, name: 'Bob', type: 'person' },
+    ];
+
+    const result = applyDelta(rows, {
+      added: [{ id: 3, name: 'Carol', type: 'person' }],
+      changed: [{ id: 1, name: 'Alicia', type: 'person' }],
+      removed: [2],
+    });
+
+    expect(result.map((row) => row.name)).toEqual(['Alicia', 'Carol']);
+  });
 });
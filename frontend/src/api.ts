@@ -1,4 +1,4 @@
-import { useEffect, useState } from 'react';
+import { useEffect, useRef, useState } from 'react';
 
 export const AUTH_TOKEN_KEY = 'relation-map-token';
 
@@ -238,6 +238,50 @@ export async function deleteRelation(id: number): Promise<void> {
 }
 
 // Data management API
+// Batch operations: temp_id lets later operations reference rows created earlier in the batch
+export type BatchOperation =
+  | {
+      kind: 'entity';
+      op: 'create' | 'update' | 'delete';
+      id?: number | string;
+      temp_id?: string;
+      name?: string;
+      type?: string;
+      description?: string | null;
+    }
+  | {
+      kind: 'relation';
+      op: 'create' | 'update' | 'delete';
+      id?: number | string;
+      temp_id?: string;
+      source_id?: number | string;
+      target_id?: number | string;
+      relation_type?: string;
+      description?: string | null;
+    };
+
+export type BatchResult = {
+  ok: boolean;
+  id_map: Record<string, number>;
+  entities: Entity[];
+  relations: Relation[];
+  deleted_entity_ids: number[];
+  deleted_relation_ids: number[];
+};
+
+export async function runBatch(operations: BatchOperation[], description?: string): Promise<BatchResult> {
+  const response = await fetch(`${API_URL}/api/batch`, {
+    method: 'POST',
+    headers: buildAuthHeaders(true),
+    body: JSON.stringify({ operations, description }),
+  });
+  if (!response.ok) {
+    const error = await response.json();
+    throw new Error(error.detail || 'Failed to apply batch');
+  }
+  return response.json();
+}
+
 export async function resetAllData(): Promise<{ ok: boolean; message: string }> {
   const res = await fetch(`${API_URL}/api/reset`, {
     method: 'POST',
@@ -277,6 +321,26 @@ export async function importData(
 }
 
 // Type management API
+// Streams the file to the server, which parses and imports it incrementally
+export async function importFile(
+  file: File,
+  mode: 'merge' | 'replace' = 'merge'
+): Promise<{ ok: boolean; imported_entities: number; imported_relations: number; skipped: number }> {
+  const format = /\.(ndjson|jsonl)$/i.test(file.name) ? 'ndjson' : 'json';
+  const response = await fetch(`${API_URL}/api/import/stream?mode=${mode}&format=${format}`, {
+    method: 'POST',
+    headers: buildAuthHeaders(false),
+    body: file,
+  });
+
+  if (!response.ok) {
+    const error = await response.json();
+    throw new Error(error.detail || 'Import failed');
+  }
+
+  return response.json();
+}
+
 export async function renameEntityType(oldType: string, newType: string): Promise<{ ok: boolean; updated_count: number }> {
   const response = await fetch(
     `${API_URL}/api/entities/types/${encodeURIComponent(oldType)}?new_type=${encodeURIComponent(newType)}`,
@@ -316,6 +380,24 @@ export async function fetchEntityTypes(): Promise<string[]> {
   return response.json();
 }
 
+// タイプごとの使用件数（サーバー側で集計済み）
+export type TypeUsage = { name: string; count: number };
+
+export async function fetchEntityTypeCounts(): Promise<TypeUsage[] | null> {
+  const headers = buildAuthHeaders(false);
+  const response = headers
+    ? await fetch(`${API_URL}/api/entities/types?with_counts=true`, { headers, cache: 'no-cache' })
+    : await fetch(`${API_URL}/api/entities/types?with_counts=true`, { cache: 'no-cache' });
+  if (response.status === 401) {
+    return null;
+  }
+  if (!response.ok) {
+    const error = await response.json();
+    throw new Error(error.detail || 'Failed to fetch entity type counts');
+  }
+  return response.json();
+}
+
 export async function createEntityType(typeName: string): Promise<{ ok: boolean; name: string }> {
   const response = await fetch(`${API_URL}/api/entities/types`, {
     method: 'POST',
@@ -380,6 +462,22 @@ export async function fetchRelationTypes(): Promise<string[]> {
   return response.json();
 }
 
+
+export async function fetchRelationTypeCounts(): Promise<TypeUsage[] | null> {
+  const headers = buildAuthHeaders(false);
+  const response = headers
+    ? await fetch(`${API_URL}/api/relations/types?with_counts=true`, { headers, cache: 'no-cache' })
+    : await fetch(`${API_URL}/api/relations/types?with_counts=true`, { cache: 'no-cache' });
+  if (response.status === 401) {
+    return null;
+  }
+  if (!response.ok) {
+    const error = await response.json();
+    throw new Error(error.detail || 'Failed to fetch relation type counts');
+  }
+  return response.json();
+}
+
 export async function createRelationType(typeName: string): Promise<{ ok: boolean; name: string }> {
   const response = await fetch(`${API_URL}/api/relations/types`, {
     method: 'POST',
@@ -406,11 +504,13 @@ export async function deleteRelationTypeOnly(typeName: string): Promise<{ ok: bo
 }
 
 // Hooks with refetch capability
+// `all=true` returns every row in one streamed response; without it the
+// listings are paged by `after` and the X-Next-Cursor header (100 rows by default).
 export async function fetchEntitiesList(): Promise<Entity[]> {
   const headers = buildAuthHeaders(false);
   const res = headers
-    ? await fetch(`${API_URL}/api/entities/`, { headers })
-    : await fetch(`${API_URL}/api/entities/`);
+    ? await fetch(`${API_URL}/api/entities/?all=true`, { headers })
+    : await fetch(`${API_URL}/api/entities/?all=true`);
   if (!res.ok) throw new Error(`Failed to fetch entities: ${res.statusText}`);
   return res.json();
 }
@@ -425,8 +525,8 @@ export function useEntities(enabled: boolean = true) {
     }
     const headers = buildAuthHeaders(false);
     const res = headers
-      ? await fetch(`${API_URL}/api/entities/`, { headers })
-      : await fetch(`${API_URL}/api/entities/`);
+      ? await fetch(`${API_URL}/api/entities/?all=true`, { headers })
+      : await fetch(`${API_URL}/api/entities/?all=true`);
     if (res.status === 401) {
       setEntities([]);
       return;
@@ -453,8 +553,8 @@ export function useRelations(enabled: boolean = true) {
     }
     const headers = buildAuthHeaders(false);
     const res = headers
-      ? await fetch(`${API_URL}/api/relations/`, { headers })
-      : await fetch(`${API_URL}/api/relations/`);
+      ? await fetch(`${API_URL}/api/relations/?all=true`, { headers })
+      : await fetch(`${API_URL}/api/relations/?all=true`);
     if (res.status === 401) {
       setRelations([]);
       return;
@@ -471,6 +571,187 @@ export function useRelations(enabled: boolean = true) {
   return { relations, refetch: fetchRelations };
 }
 
+// Combined graph API
+export type GraphData = {
+  version_number: number;
+  entities: Entity[];
+  relations: Relation[];
+  entity_types: string[];
+  relation_types: string[];
+};
+
+type Columns = Record<string, unknown[]>;
+
+// Turn parallel arrays keyed by column name back into one object per row
+const fromColumns = <T,>(columns: Columns): T[] => {
+  const fields = Object.keys(columns);
+  const length = fields.length ? columns[fields[0]].length : 0;
+  const rows: T[] = [];
+  for (let i = 0; i < length; i++) {
+    const row: Record<string, unknown> = {};
+    for (const field of fields) row[field] = columns[field][i];
+    rows.push(row as T);
+  }
+  return rows;
+};
+
+let cachedGraph: { etag: string; data: GraphData } | null = null;
+
+// Entities, relations and types in one request; revalidated with the last ETag
+export async function fetchGraph(): Promise<GraphData | null> {
+  const headers: Record<string, string> = { ...((buildAuthHeaders(false) as Record<string, string>) || {}) };
+  if (cachedGraph) headers['If-None-Match'] = cachedGraph.etag;
+  const res = await fetch(`${API_URL}/api/graph?encoding=columnar`, { headers, cache: 'no-cache' });
+  if (res.status === 304 && cachedGraph) return cachedGraph.data;
+  if (res.status === 401) return null;
+  if (!res.ok) throw new Error(`Failed to fetch graph: ${res.statusText}`);
+  const body = await res.json();
+  const data: GraphData = {
+    version_number: body.version_number,
+    entities: fromColumns<Entity>(body.entities),
+    relations: fromColumns<Relation>(body.relations),
+    entity_types: body.entity_types,
+    relation_types: body.relation_types,
+  };
+  const etag = res.headers.get('ETag');
+  cachedGraph = etag ? { etag, data } : null;
+  return data;
+}
+
+// Incremental sync API
+type DeltaSection<T> = { added?: T[]; changed?: T[]; removed?: number[] };
+
+export type GraphChanges = {
+  entities?: DeltaSection<Entity>;
+  relations?: DeltaSection<Relation>;
+  entity_types?: { added?: { name: string }[]; removed?: string[] };
+  relation_types?: { added?: { id: number; name: string }[]; removed?: string[] };
+};
+
+export type ChangeSet = {
+  since: number;
+  version_number: number;
+  full_reload: boolean;
+  changes: GraphChanges | null;
+};
+
+export async function fetchChanges(since: number): Promise<ChangeSet> {
+  const res = await fetch(`${API_URL}/api/changes?since=${since}`, withAuthHeaders({ cache: 'no-cache' }));
+  if (!res.ok) throw new Error(`Failed to fetch changes: ${res.statusText}`);
+  return res.json();
+}
+
+// Apply one section of a delta to rows keyed by id, keeping id order
+export function applyDelta<T extends { id: number }>(rows: T[], delta?: DeltaSection<T>): T[] {
+  if (!delta) return rows;
+  const byId = new Map(rows.map((row) => [row.id, row]));
+  (delta.removed || []).forEach((id) => byId.delete(id));
+  [...(delta.added || []), ...(delta.changed || [])].forEach((row) => byId.set(row.id, row));
+  return Array.from(byId.values()).sort((a, b) => a.id - b.id);
+}
+
+// Local replica of the graph: loaded once with fetchGraph, then kept up to
+// date with /api/changes so a refetch only downloads what changed.
+export function useGraphReplica(enabled: boolean = true) {
+  const [entities, setEntities] = useState<Entity[]>([]);
+  const [relations, setRelations] = useState<Relation[]>([]);
+  const versionRef = useRef<number | null>(null);
+
+  const reload = async () => {
+    const graph = await fetchGraph();
+    versionRef.current = graph ? graph.version_number : null;
+    setEntities(graph ? graph.entities : []);
+    setRelations(graph ? graph.relations : []);
+  };
+
+  const sync = async () => {
+    if (!enabled) {
+      versionRef.current = null;
+      setEntities([]);
+      setRelations([]);
+      return;
+    }
+    if (versionRef.current === null) {
+      await reload();
+      return;
+    }
+    const changeSet = await fetchChanges(versionRef.current);
+    if (changeSet.full_reload || !changeSet.changes) {
+      await reload();
+      return;
+    }
+    const { changes } = changeSet;
+    versionRef.current = changeSet.version_number;
+    setEntities((current) => applyDelta(current, changes.entities));
+    setRelations((current) => applyDelta(current, changes.relations));
+  };
+
+  useEffect(() => {
+    versionRef.current = null;
+    sync();
+    if (!enabled) return undefined;
+    // Apply pushed versions that follow ours; anything else means we missed one
+    return subscribeToChanges((event) => {
+      const current = versionRef.current;
+      if (current === null || (event.version_number !== undefined && event.version_number <= current)) return;
+      if (event.type === 'version' && event.previous_version_number === current && event.changes) {
+        const changes = event.changes;
+        versionRef.current = event.version_number!;
+        setEntities((rows) => applyDelta(rows, changes.entities));
+        setRelations((rows) => applyDelta(rows, changes.relations));
+      } else {
+        sync();
+      }
+    });
+  }, [enabled]);
+
+  return { entities, relations, refetch: sync };
+}
+
+export type ChangeEvent = {
+  type: 'version' | 'changes' | 'resync';
+  version_number?: number;
+  previous_version_number?: number;
+  changes?: GraphChanges | null;
+};
+
+// Listen to /api/changes/stream (server-sent events read through fetch, so the
+// token can go in the Authorization header). Reconnects until unsubscribed.
+export function subscribeToChanges(onEvent: (event: ChangeEvent) => void): () => void {
+  const controller = new AbortController();
+
+  const listen = async () => {
+    while (!controller.signal.aborted) {
+      try {
+        const res = await fetch(`${API_URL}/api/changes/stream`, withAuthHeaders({ signal: controller.signal }));
+        if (res.status === 401 || !res.body) return;
+        const reader = res.body.getReader();
+        const decoder = new TextDecoder();
+        let buffer = '';
+        for (;;) {
+          const { done, value } = await reader.read();
+          if (done) break;
+          buffer += decoder.decode(value, { stream: true });
+          const blocks = buffer.split('\n\n');
+          buffer = blocks.pop() || '';
+          blocks.forEach((block) => {
+            const data = block.split('\n').find((line) => line.startsWith('data: '));
+            if (data) onEvent(JSON.parse(data.slice('data: '.length)));
+          });
+        }
+      } catch (error) {
+        if (controller.signal.aborted) return;
+      }
+      // Events may have been missed while disconnected
+      onEvent({ type: 'resync' });
+      await new Promise((resolve) => setTimeout(resolve, 3000));
+    }
+  };
+
+  if (typeof fetch !== 'undefined' && typeof TextDecoder !== 'undefined') listen();
+  return () => controller.abort();
+}
+
 // Version management API
 export type VersionInfo = {
   id: number;
@@ -478,6 +759,8 @@ export type VersionInfo = {
   created_at: string;
   description?: string;
   created_by: string;
+  entity_count?: number | null;
+  relation_count?: number | null;
 };
 
 export type VersionSnapshot = {
@@ -496,11 +779,15 @@ export type FullVersion = {
   created_by: string;
 };
 
-export async function fetchVersions(): Promise<VersionInfo[]> {
+export async function fetchVersions(options: { before?: number; limit?: number } = {}): Promise<VersionInfo[]> {
+  const params = new URLSearchParams();
+  if (options.before !== undefined) params.append('before', options.before.toString());
+  if (options.limit !== undefined) params.append('limit', options.limit.toString());
+  const query = params.toString() ? `?${params}` : '';
   const headers = buildAuthHeaders(false);
   const res = headers
-    ? await fetch(`${API_URL}/api/versions`, { headers })
-    : await fetch(`${API_URL}/api/versions`);
+    ? await fetch(`${API_URL}/api/versions${query}`, { headers })
+    : await fetch(`${API_URL}/api/versions${query}`);
   if (!res.ok) throw new Error(`Failed to fetch versions: ${res.statusText}`);
   return res.json();
 }
@@ -514,6 +801,37 @@ export async function fetchVersion(versionId: number): Promise<FullVersion> {
   return res.json();
 }
 
+export type VersionDiffItem = {
+  section: 'entities' | 'relations' | 'entity_types' | 'relation_types';
+  op: 'added' | 'changed' | 'removed';
+  key: number | string;
+  record?: Record<string, any> | null;
+};
+
+export type VersionDiff = {
+  from_version_id: number;
+  to_version_id: number;
+  summary: Record<string, Record<string, number>>;
+  total: number;
+  offset: number;
+  items: VersionDiffItem[];
+  next_offset?: number | null;
+};
+
+export async function fetchVersionDiff(
+  fromVersionId: number,
+  toVersionId: number,
+  offset: number = 0,
+  limit: number = 500
+): Promise<VersionDiff> {
+  const params = new URLSearchParams({ offset: offset.toString(), limit: limit.toString() });
+  const url = `${API_URL}/api/versions/${fromVersionId}/diff/${toVersionId}?${params}`;
+  const headers = buildAuthHeaders(false);
+  const res = headers ? await fetch(url, { headers }) : await fetch(url);
+  if (!res.ok) throw new Error(`Failed to fetch version diff: ${res.statusText}`);
+  return res.json();
+}
+
 export async function createCheckpoint(description?: string): Promise<VersionInfo> {
   const params = new URLSearchParams();
   if (description) params.append('description', description);